@@ -0,0 +1,46 @@
+"""add workout job idempotency
+
+Revision ID: 2c8f0e5a7b31
+Revises: 9e3d4b6a2f17
+Create Date: 2026-10-18 21:32:45.108266
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c8f0e5a7b31'
+down_revision: Union[str, Sequence[str], None] = '9e3d4b6a2f17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('workout_jobs', sa.Column('idempotency_key', sa.String(), nullable=True), schema='fitness')
+    op.create_index('uq_workout_jobs_user_id_idempotency_key', 'workout_jobs', ['user_id', 'idempotency_key'], unique=True, schema='fitness')
+    # duplicates queued before this revision would block the index, keep the oldest of each
+    op.execute("""
+        UPDATE fitness.workout_jobs AS job SET status = 'failed', error = 'Duplicate job', finished_at = now()
+        WHERE job.status IN ('queued', 'processing') AND job.priority = 0 AND job.profile_hash IS NOT NULL
+          AND EXISTS (
+            SELECT 1 FROM fitness.workout_jobs AS older
+            WHERE older.user_id = job.user_id AND older.profile_hash = job.profile_hash
+              AND older.status IN ('queued', 'processing') AND older.priority = 0
+              AND older.created_at < job.created_at
+          )
+    """)
+    op.create_index(
+        'uq_workout_jobs_active_profile', 'workout_jobs', ['user_id', 'profile_hash'], unique=True, schema='fitness',
+        postgresql_where=sa.text("status IN ('queued', 'processing') AND priority = 0")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_workout_jobs_active_profile', table_name='workout_jobs', schema='fitness')
+    op.drop_index('uq_workout_jobs_user_id_idempotency_key', table_name='workout_jobs', schema='fitness')
+    op.drop_column('workout_jobs', 'idempotency_key', schema='fitness')
@@ -0,0 +1,27 @@
+"""add workout program version
+
+Revision ID: 411130ffc0ff
+Revises: 8d57a8959368
+Create Date: 2026-10-18 14:05:31.402716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '411130ffc0ff'
+down_revision: Union[str, Sequence[str], None] = '8d57a8959368'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('workout_programs', sa.Column('version', sa.Integer(), server_default='1', nullable=False), schema='fitness')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('workout_programs', 'version', schema='fitness')
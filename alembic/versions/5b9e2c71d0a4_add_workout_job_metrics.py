@@ -0,0 +1,28 @@
+"""add workout job metrics
+
+Revision ID: 5b9e2c71d0a4
+Revises: c3f1a7d92b64
+Create Date: 2026-10-18 19:05:41.208316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e2c71d0a4'
+down_revision: Union[str, Sequence[str], None] = 'c3f1a7d92b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('workout_jobs', sa.Column('metrics', postgresql.JSONB(astext_type=sa.Text()), nullable=True), schema='fitness')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('workout_jobs', 'metrics', schema='fitness')
@@ -0,0 +1,30 @@
+"""add workout day date index
+
+Revision ID: 7d1b3f9c4e82
+Revises: 2c8f0e5a7b31
+Create Date: 2026-10-18 22:05:19.644871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d1b3f9c4e82'
+down_revision: Union[str, Sequence[str], None] = '2c8f0e5a7b31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_workout_days_workout_program_id_date', 'workout_days', ['workout_program_id', 'date'], unique=False, schema='fitness')
+    op.create_index('ix_workout_programs_user_id', 'workout_programs', ['user_id'], unique=False, schema='fitness')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_workout_programs_user_id', table_name='workout_programs', schema='fitness')
+    op.drop_index('ix_workout_days_workout_program_id_date', table_name='workout_days', schema='fitness')
@@ -0,0 +1,28 @@
+"""add workout job progress
+
+Revision ID: 8d57a8959368
+Revises: e5401a0a1d64
+Create Date: 2026-10-18 11:40:02.553961
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '8d57a8959368'
+down_revision: Union[str, Sequence[str], None] = 'e5401a0a1d64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('workout_jobs', sa.Column('progress', postgresql.JSONB(astext_type=sa.Text()), nullable=True), schema='fitness')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('workout_jobs', 'progress', schema='fitness')
@@ -0,0 +1,39 @@
+"""add speculative workout jobs
+
+Revision ID: 9e3d4b6a2f17
+Revises: 5b9e2c71d0a4
+Create Date: 2026-10-18 20:41:07.552913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3d4b6a2f17'
+down_revision: Union[str, Sequence[str], None] = '5b9e2c71d0a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a new enum value can't be used in the transaction that adds it
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE workoutjobstatus ADD VALUE IF NOT EXISTS 'cancelled'")
+    op.add_column('workout_jobs', sa.Column('priority', sa.Integer(), server_default='0', nullable=False), schema='fitness')
+    op.add_column('workout_jobs', sa.Column('profile_hash', sa.String(), nullable=True), schema='fitness')
+    op.drop_index('ix_workout_jobs_status_created_at', table_name='workout_jobs', schema='fitness')
+    op.create_index('ix_workout_jobs_status_priority_created_at', 'workout_jobs', ['status', 'priority', 'created_at'], unique=False, schema='fitness')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_workout_jobs_status_priority_created_at', table_name='workout_jobs', schema='fitness')
+    op.create_index('ix_workout_jobs_status_created_at', 'workout_jobs', ['status', 'created_at'], unique=False, schema='fitness')
+    op.drop_column('workout_jobs', 'profile_hash', schema='fitness')
+    op.drop_column('workout_jobs', 'priority', schema='fitness')
+    # postgres can't drop an enum value, cancelled jobs are kept as failed
+    op.execute("UPDATE fitness.workout_jobs SET status = 'failed' WHERE status = 'cancelled'")
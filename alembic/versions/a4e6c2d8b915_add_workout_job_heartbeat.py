@@ -0,0 +1,28 @@
+"""add workout job heartbeat
+
+Revision ID: a4e6c2d8b915
+Revises: 7d1b3f9c4e82
+Create Date: 2026-10-19 09:12:33.481920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e6c2d8b915'
+down_revision: Union[str, Sequence[str], None] = '7d1b3f9c4e82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('workout_jobs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True), schema='fitness')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('workout_jobs', 'heartbeat_at', schema='fitness')
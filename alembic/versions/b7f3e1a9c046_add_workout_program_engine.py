@@ -0,0 +1,28 @@
+"""add workout program engine
+
+Revision ID: b7f3e1a9c046
+Revises: a4e6c2d8b915
+Create Date: 2026-10-19 10:03:51.227604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f3e1a9c046'
+down_revision: Union[str, Sequence[str], None] = 'a4e6c2d8b915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('workout_programs', sa.Column('engine', sa.String(), nullable=True), schema='fitness')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('workout_programs', 'engine', schema='fitness')
@@ -0,0 +1,37 @@
+"""add plan cache
+
+Revision ID: c3f1a7d92b64
+Revises: 411130ffc0ff
+Create Date: 2026-10-18 16:22:09.517340
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f1a7d92b64'
+down_revision: Union[str, Sequence[str], None] = '411130ffc0ff'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('plan_cache',
+    sa.Column('fingerprint', sa.String(length=64), nullable=False),
+    sa.Column('profile', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('plan', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('hits', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('fingerprint'),
+    schema='fitness'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('plan_cache', schema='fitness')
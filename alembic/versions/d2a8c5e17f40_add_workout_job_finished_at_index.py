@@ -0,0 +1,28 @@
+"""add workout job finished_at index
+
+Revision ID: d2a8c5e17f40
+Revises: b7f3e1a9c046
+Create Date: 2026-10-19 14:12:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a8c5e17f40'
+down_revision: Union[str, Sequence[str], None] = 'b7f3e1a9c046'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_workout_jobs_finished_at', 'workout_jobs', ['finished_at'], unique=False, schema='fitness')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_workout_jobs_finished_at', table_name='workout_jobs', schema='fitness')
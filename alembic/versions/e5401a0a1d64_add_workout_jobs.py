@@ -0,0 +1,50 @@
+"""add workout jobs
+
+Revision ID: e5401a0a1d64
+Revises: 44763cb579d7
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5401a0a1d64'
+down_revision: Union[str, Sequence[str], None] = '44763cb579d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('workout_jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', postgresql.ENUM('queued', 'processing', 'completed', 'failed', name='workoutjobstatus'), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.String(), nullable=True),
+    sa.Column('workout_program_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['fitness.users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['workout_program_id'], ['fitness.workout_programs.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id'),
+    schema='fitness'
+    )
+    op.create_index('ix_workout_jobs_status_created_at', 'workout_jobs', ['status', 'created_at'], unique=False, schema='fitness')
+    op.create_index(op.f('ix_fitness_workout_jobs_user_id'), 'workout_jobs', ['user_id'], unique=False, schema='fitness')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_fitness_workout_jobs_user_id'), table_name='workout_jobs', schema='fitness')
+    op.drop_index('ix_workout_jobs_status_created_at', table_name='workout_jobs', schema='fitness')
+    op.drop_table('workout_jobs', schema='fitness')
+    postgresql.ENUM(name='workoutjobstatus').drop(op.get_bind(), checkfirst=True)
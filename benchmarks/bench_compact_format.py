@@ -0,0 +1,90 @@
+"""
+Completion size and time per 10-day part, verbose vs compact wire format.
+
+Offline (default) the sample plan split into its three parts stands in for
+the model's answers: each part is written in both formats and its
+completion tokens estimated (tiktoken's cl100k_base if installed, else
+about 4 characters per token), and the CPU time of expanding the compact
+part back into the verbose shape is measured. With --live every part is
+generated in both formats through SHERLOCK_AI_BACKEND (OpenRouter, or a
+replay/synthetic backend) and the completion tokens the API reported and
+the wall time of every call are printed.
+
+    python -m benchmarks.bench_compact_format
+    python -m benchmarks.bench_compact_format --live
+"""
+import argparse, asyncio, time
+
+from benchmarks.samples import SAMPLE_USER, load_sample_plan, split_plan_parts
+from sherlock_ai.backends import CompletionRequest
+from sherlock_ai.compact import WIRE_COMPACT, WIRE_FORMATS, compact_part, expand_part
+from sherlock_ai.model import SherlockAI, close_http_client, compact_json, parse_model_json
+
+try:
+    import tiktoken
+    encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    encoding = None
+
+PROMPT_NAMES = ("firstpart_workout_prompt", "secondpart_workout_prompt", "thirdpart_workout_prompt")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(encoding.encode(text)) if encoding else len(text) // 4
+
+
+def offline(repeat: int):
+    label = "tokens" if encoding else "~tokens"
+    for index, part in enumerate(split_plan_parts(load_sample_plan())):
+        compact = compact_part(part)
+        if expand_part(compact) != part:
+            raise SystemExit(f"part{index + 1} does not survive the round trip")
+        verbose_tokens = estimate_tokens(compact_json(part))
+        compact_tokens = estimate_tokens(compact_json(compact))
+
+        started = time.process_time()
+        for _ in range(repeat):
+            expand_part(compact)
+        expand_us = (time.process_time() - started) * 1_000_000 / repeat
+
+        print(
+            f"part{index + 1} verbose {verbose_tokens:6d} compact {compact_tokens:6d} {label} "
+            f"({compact_tokens / verbose_tokens:5.1%})  expand {expand_us:7.1f} us"
+        )
+
+
+async def live(ai: SherlockAI):
+    user_text = ai.convert_user_dict_to_text(SAMPLE_USER)
+    for wire_format in WIRE_FORMATS:
+        ai.wire_format = wire_format
+        compact = wire_format == WIRE_COMPACT
+        prompts = [ai.registry.render_parts(name, user_text, compact) for name in PROMPT_NAMES]
+        parts = []
+        for index in range(len(PROMPT_NAMES)):
+            messages = ai.part_messages(prompts, parts)
+            started = time.perf_counter()
+            completion = await ai.backend.complete(CompletionRequest(model=ai.router.route(f"part{index + 1}").model, messages=messages))
+            elapsed = time.perf_counter() - started
+            answer = parse_model_json(completion.content)
+            parts.append(expand_part(answer) if compact else answer)
+            print(
+                f"{wire_format:<8} part{index + 1} {elapsed:7.1f}s "
+                f"completion {completion.usage.get('completion_tokens', 0):6d} tokens, {len(parts[-1]['plan']):2d} days"
+            )
+    await close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="call the model instead of estimating")
+    parser.add_argument("--repeat", type=int, default=2000, help="expansions timed per part (offline)")
+    args = parser.parse_args()
+
+    if args.live:
+        asyncio.run(live(SherlockAI()))
+    else:
+        offline(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Prompt size and latency per part with full vs compact chat context.
+
+Offline (default) the sample plan stands in for the model's answers and
+prompt tokens are estimated (tiktoken's cl100k_base if installed, else
+about 4 characters per token). With --live each mode generates a real plan
+through OpenRouter and reports the prompt tokens the API billed and the
+wall time of every part (through SHERLOCK_AI_BACKEND, so a replay or
+synthetic backend works too).
+
+    python -m benchmarks.bench_context_compaction
+    python -m benchmarks.bench_context_compaction --live
+"""
+import argparse, asyncio, time
+
+from benchmarks.samples import SAMPLE_USER, load_sample_plan, split_plan_parts
+from sherlock_ai.backends import CompletionRequest, message_text
+from sherlock_ai.context import CONTEXT_MODES
+from sherlock_ai.model import SherlockAI, close_http_client, parse_model_json
+from sherlock_ai.prompt_registry import PromptParts
+from sherlock_ai.usage import cached_tokens
+
+try:
+    import tiktoken
+    encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    encoding = None
+
+PROMPT_NAMES = ("firstpart_workout_prompt", "secondpart_workout_prompt", "thirdpart_workout_prompt")
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    text = "".join(message_text(message) for message in messages)
+    return len(encoding.encode(text)) if encoding else len(text) // 4
+
+
+def part_prompts(ai: SherlockAI) -> list[PromptParts]:
+    user_text = ai.convert_user_dict_to_text(SAMPLE_USER)
+    return [ai.registry.render_parts(name, user_text) for name in PROMPT_NAMES]
+
+
+def offline(ai: SherlockAI):
+    prompts = part_prompts(ai)
+    answers = split_plan_parts(load_sample_plan())
+    label = "tokens" if encoding else "~tokens"
+    for mode in CONTEXT_MODES:
+        ai.context_mode = mode
+        sizes = [estimate_tokens(ai.part_messages(prompts, answers[:index])) for index in range(3)]
+        per_part = "  ".join(f"part{index + 1} {size:6d}" for index, size in enumerate(sizes))
+        print(f"{mode:<8} {per_part}  total {sum(sizes):6d} prompt {label}")
+
+
+async def live(ai: SherlockAI):
+    prompts = part_prompts(ai)
+    for mode in CONTEXT_MODES:
+        ai.context_mode = mode
+        parts = []
+        for index in range(3):
+            messages = ai.part_messages(prompts, parts)
+            started = time.perf_counter()
+            completion = await ai.backend.complete(CompletionRequest(model=ai.router.route(f"part{index + 1}").model, messages=messages))
+            elapsed = time.perf_counter() - started
+            parts.append(parse_model_json(completion.content))
+            usage = completion.usage
+            print(
+                f"{mode:<8} part{index + 1} {elapsed:7.1f}s "
+                f"prompt {usage.get('prompt_tokens', 0):6d} cached {cached_tokens(usage) or 0:6d} completion {usage.get('completion_tokens', 0):6d} tokens"
+            )
+    await close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="call the model instead of estimating")
+    args = parser.parse_args()
+
+    ai = SherlockAI()
+    if args.live:
+        asyncio.run(live(ai))
+    else:
+        offline(ai)
+
+
+if __name__ == "__main__":
+    main()
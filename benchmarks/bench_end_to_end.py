@@ -0,0 +1,268 @@
+"""
+End-to-end throughput and latency of plan generation and the read path.
+
+Drives the real app in-process (httpx over ASGI) against Postgres, with the
+synthetic LLM backend standing in for OpenRouter:
+
+  create     POST /workout/create-user-workout/{id}/ for every bench user
+  generate   in-process workers (as in worker.py) drain the job queue
+  read_cold  GET /workout/get-user-workout/{id}/ with the response cache empty
+  read_warm  the same read, served from the response cache
+  memory     a few more jobs, one at a time under tracemalloc
+
+Every phase reports throughput, p50/p99 latency and SQL statements per
+request (or job); the memory phase reports the peak allocation per job.
+Results are compared with the stored baseline: a slower, hungrier or
+chattier run fails with exit code 1, and a run without a baseline recorded
+with the same parameters fails with exit code 2. The committed baseline
+(benchmarks/baselines/end_to_end.json) was recorded with the first command
+below; record a new one on the reference machine with --update-baseline
+(and again after an intended change).
+
+Needs a Postgres with the migrations applied (DATABASE_URL). Bench users
+are deleted afterwards, their programs and jobs with them. The plan cache is
+off unless --plan-cache is given, so every job goes through generation.
+
+    DB_ECHO=false python -m benchmarks.bench_end_to_end --users 200
+    DB_ECHO=false python -m benchmarks.bench_end_to_end --users 200 --update-baseline
+"""
+import argparse, asyncio, json, os, sys, time, tracemalloc, uuid
+
+import httpx
+from sqlalchemy import delete, event, select
+
+import services.plan_cache as plan_cache
+import services.workouts as workouts
+import sherlock_ai.model as model
+from db.session_manager import session_manager
+from main import app
+from models.models import (
+    DayAvailability, EquipmentAvailability, FitnessGoal, FitnessLevel, Gender, User, WorkOutLocation, WorkoutJob
+)
+from services.workout_cache import workout_program_cache
+from sherlock_ai.backends import SyntheticBackend
+from utils.helpers import create_access_token
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "end_to_end.json")
+# metrics where a larger value is better, everything else should not grow
+HIGHER_IS_BETTER = ("throughput",)
+# SQL statement counts are exact, any extra statement is a regression
+EXACT_METRICS = ("queries",)
+EMAIL_PREFIX = "bench-e2e-"
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def phase_result(latencies: list[float], elapsed: float, queries: int) -> dict:
+    count = len(latencies)
+    return {
+        "throughput": round(count / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "queries": round(queries / count, 2) if count else 0.0,
+    }
+
+
+async def create_users(count: int) -> list[User]:
+    run = uuid.uuid4().hex[:8]
+    async with session_manager.async_session() as session:
+        users = [
+            User(
+                email=f"{EMAIL_PREFIX}{run}-{index}@example.com",
+                password="x",
+                name=f"bench {index}",
+                age=25 + index % 30,
+                gender=Gender.female if index % 2 else Gender.male,
+                height=160 + index % 30,
+                weight=55 + index % 40,
+                fitness_level=list(FitnessLevel)[index % len(FitnessLevel)],
+                fitness_goal=list(FitnessGoal)[index % len(FitnessGoal)],
+                work_out_location=list(WorkOutLocation)[index % len(WorkOutLocation)],
+                days_availability=[DayAvailability.monday, DayAvailability.wednesday, DayAvailability.friday],
+                equipment_availability=[list(EquipmentAvailability)[index % len(EquipmentAvailability)]],
+                notes="",
+            )
+            for index in range(count)
+        ]
+        session.add_all(users)
+        await session.commit()
+        return users
+
+
+async def delete_users():
+    async with session_manager.async_session() as session:
+        # programs, days and jobs go with their user (ON DELETE CASCADE)
+        await session.execute(delete(User).where(User.email.like(f"{EMAIL_PREFIX}%")))
+        await session.commit()
+
+
+async def timed_requests(client: httpx.AsyncClient, requests: list[tuple[str, str, str]], concurrency: int, counter: QueryCounter) -> tuple[dict, list]:
+    """(method, url, token) requests, `concurrency` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    responses: list = []
+
+    async def send(method: str, url: str, token: str):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, headers={"Authorization": f"Bearer {token}"})
+            latencies.append(time.perf_counter() - started)
+            responses.append(response)
+
+    before = counter.count
+    started = time.perf_counter()
+    await asyncio.gather(*(send(*request) for request in requests))
+    return phase_result(latencies, time.perf_counter() - started, counter.count - before), responses
+
+
+async def drain_jobs(jobs: int, workers: int, counter: QueryCounter) -> dict:
+    """Run queued jobs with `workers` concurrent loops, like worker.py, until `jobs` are done."""
+    latencies: list[float] = []
+
+    async def work(worker_id: str):
+        while len(latencies) < jobs:
+            started = time.perf_counter()
+            if not await workouts.run_next_job(worker_id):
+                return
+            latencies.append(time.perf_counter() - started)
+
+    before = counter.count
+    started = time.perf_counter()
+    await asyncio.gather(*(work(f"bench-{index}") for index in range(workers)))
+    return phase_result(latencies, time.perf_counter() - started, counter.count - before)
+
+
+async def measure_memory(client: httpx.AsyncClient, users: list[User], tokens: dict) -> dict:
+    """Peak traced allocation of one job at a time, averaged over the jobs."""
+    peaks = []
+    for user in users:
+        await client.post(f"/workout/create-user-workout/{user.id}/", headers={"Authorization": f"Bearer {tokens[user.id]}"})
+        tracemalloc.start()
+        await workouts.run_next_job("bench-memory")
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {"peak_kib": round(sum(peaks) / len(peaks) / 1024, 1) if peaks else 0.0}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for phase, metrics in results.items():
+        for metric, value in metrics.items():
+            expected = baseline.get(phase, {}).get(metric)
+            if expected is None:
+                continue
+            if metric in EXACT_METRICS:
+                worse = value > expected
+            elif metric in HIGHER_IS_BETTER:
+                worse = value < expected * (1 - tolerance)
+            else:
+                worse = value > expected * (1 + tolerance)
+            if worse:
+                regressions.append(f"{phase}.{metric}: {value} (baseline {expected})")
+    return regressions
+
+
+async def run(args) -> dict:
+    # the fake LLM, and no shortcuts past generation unless asked for
+    model._sherlock_ai = model.SherlockAI(backend=SyntheticBackend(args.llm_latency, args.llm_jitter, 0.0, seed=1))
+    plan_cache.PLAN_CACHE_ENABLED = args.plan_cache
+    # jobs are left to the bench's own workers instead of the request's background task
+    workouts.WORKOUT_JOB_INLINE = False
+
+    counter = QueryCounter()
+    event.listen(session_manager.engine.sync_engine, "before_cursor_execute", counter)
+
+    users = await create_users(args.users + args.memory_jobs)
+    tokens = {user.id: create_access_token({"sub": user.email}) for user in users}
+    bench_users, memory_users = users[:args.users], users[args.users:]
+
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            results["create"], responses = await timed_requests(
+                client, [("POST", f"/workout/create-user-workout/{user.id}/", tokens[user.id]) for user in bench_users], args.concurrency, counter
+            )
+            failed = [response.text for response in responses if response.json().get("status") != "success"]
+            if failed:
+                raise RuntimeError(f"{len(failed)} create requests failed, e.g. {failed[0]}")
+
+            results["generate"] = await drain_jobs(args.users, args.workers, counter)
+            async with session_manager.async_session() as session:
+                statuses = (await session.execute(
+                    select(WorkoutJob.status).where(WorkoutJob.user_id.in_([user.id for user in bench_users]))
+                )).scalars().all()
+            incomplete = [status for status in statuses if status.value != "completed"]
+            if incomplete:
+                raise RuntimeError(f"{len(incomplete)} of {len(statuses)} jobs did not complete")
+
+            reads = [("GET", f"/workout/get-user-workout/{user.id}/", tokens[user.id]) for user in bench_users]
+            workout_program_cache.bodies.clear()
+            results["read_cold"], _ = await timed_requests(client, reads, args.concurrency, counter)
+            results["read_warm"], _ = await timed_requests(client, reads * args.reads, args.concurrency, counter)
+
+            if memory_users:
+                results["memory"] = await measure_memory(client, memory_users, tokens)
+    finally:
+        await delete_users()
+        await session_manager.engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20, help="requests in flight")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent job loops")
+    parser.add_argument("--reads", type=int, default=5, help="warm reads per user")
+    parser.add_argument("--memory-jobs", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="lognormal sigma of the fake LLM latency")
+    parser.add_argument("--plan-cache", action="store_true", help="leave the plan cache on")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a timing counts as a regression")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for phase, metrics in results.items():
+        print(f"{phase:<10} " + "  ".join(f"{metric} {value:>9}" for metric, value in metrics.items()))
+
+    params = {key: getattr(args, key) for key in ("users", "concurrency", "workers", "reads", "memory_jobs", "llm_latency", "llm_jitter", "plan_cache")}
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as file:
+            json.dump({"params": params, "results": results}, file, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return
+
+    # a run that can't be compared fails too, so a missing or mismatched baseline can't pass unnoticed
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, record one with --update-baseline")
+        sys.exit(2)
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline["params"] != params:
+        print(f"baseline was recorded with {baseline['params']}, not {params}; run with those or --update-baseline")
+        sys.exit(2)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
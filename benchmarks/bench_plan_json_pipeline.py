@@ -0,0 +1,75 @@
+"""
+CPU time and memory per plan for the JSON handling around plan generation.
+
+Feeds three canned model answers (the sample plan split into 10-day parts,
+pretty-printed and wrapped in a ```json fence like real answers) through:
+
+  legacy   the string pipeline generate_workout_plan used to have: minify in
+           each _call_api*, json.loads per part, merge, json.dumps + minify
+           again, and json.loads once more in generate_plan_task
+  parsed   the current pipeline: parse each answer once, dump compact chat
+           context for parts 1 and 2, merge dicts
+
+No network or database needed.
+
+    python -m benchmarks.bench_plan_json_pipeline --plans 500
+"""
+import argparse, json, time, tracemalloc
+
+from benchmarks.samples import load_sample_plan, split_plan_parts
+from sherlock_ai.model import SherlockAI, compact_json, parse_model_json, strip_markdown_fence
+
+
+def model_answers(plan: dict) -> list[str]:
+    return ["```json\n" + json.dumps(part, indent=2) + "\n```" for part in split_plan_parts(plan)]
+
+
+def minify(content: str) -> str:
+    return json.dumps(json.loads(content), separators=(',', ':'), ensure_ascii=False)
+
+
+def legacy(answers: list[str]) -> dict:
+    raws = [minify(strip_markdown_fence(answer)) for answer in answers]
+    parts = [json.loads(raw) for raw in raws]
+    full_json = minify(json.dumps(SherlockAI.merge_workout_parts(*parts)))
+    return json.loads(full_json)
+
+
+def parsed(answers: list[str]) -> dict:
+    parts = [parse_model_json(answer) for answer in answers]
+    # chat context for the second and third calls
+    for part in parts[:2]:
+        compact_json(part)
+    return SherlockAI.merge_workout_parts(*parts)
+
+
+def run_case(name: str, pipeline, answers: list[str], plans: int):
+    started = time.process_time()
+    for _ in range(plans):
+        pipeline(answers)
+    cpu_ms = (time.process_time() - started) * 1000 / plans
+
+    tracemalloc.start()
+    pipeline(answers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<8} {cpu_ms:8.3f} ms cpu/plan {peak / 1024:10.1f} KiB peak allocated")
+    return cpu_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plans", type=int, default=200)
+    args = parser.parse_args()
+
+    answers = model_answers(load_sample_plan())
+    assert legacy(answers) == parsed(answers)
+
+    legacy_ms = run_case("legacy", legacy, answers, args.plans)
+    parsed_ms = run_case("parsed", parsed, answers, args.plans)
+    print(f"speedup  {legacy_ms / parsed_ms:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Rows/sec for persisting generated workout programs.
+
+Compares the old ORM unit-of-work path (add program, flush, add 30 days)
+with the multi-row INSERT path used by generate_plan_task, one program
+per transaction as in production, and with the batch-import paths
+(multi-row INSERT and COPY for many programs at once).
+
+Needs a Postgres with the migrations applied (DATABASE_URL). Each case
+runs in a transaction that is rolled back, so nothing is left behind.
+
+    DB_ECHO=false python -m benchmarks.bench_workout_day_insert --programs 200
+"""
+import argparse, asyncio, json, os, time, uuid
+
+from db.session_manager import session_manager
+from models.models import User, WorkoutProgram, WorkoutDay
+from services.workout_persistence import bulk_insert_workout_programs, workout_program_row, workout_day_rows
+
+SAMPLE_PLAN = os.path.join(os.path.dirname(__file__), "..", "sherlock_ai", "response_format", "sample-workout-program-res.json")
+
+
+async def orm_insert(session, user_id: int, plan: dict):
+    """The per-object path generate_plan_task used before the bulk insert."""
+    program = WorkoutProgram(**workout_program_row(user_id, plan))
+    session.add(program)
+    await session.flush()
+    for row in workout_day_rows(program.id, plan["plan"]):
+        session.add(WorkoutDay(**row))
+    await session.flush()
+
+
+async def run_case(name: str, plan: dict, programs: int, insert_fn):
+    async with session_manager.async_session() as session:
+        user = User(email=f"bench-{uuid.uuid4().hex}@example.com", password="x", name="bench")
+        session.add(user)
+        await session.flush()
+
+        started = time.perf_counter()
+        await insert_fn(session, user.id, plan, programs)
+        elapsed = time.perf_counter() - started
+
+        await session.rollback()
+
+    rows = programs * (1 + len(plan["plan"]))
+    print(f"{name:<28} {programs:>6} programs {rows:>8} rows {elapsed:8.3f}s {rows / elapsed:10.0f} rows/s")
+
+
+async def orm_each(session, user_id, plan, programs):
+    for _ in range(programs):
+        await orm_insert(session, user_id, plan)
+
+async def bulk_each(session, user_id, plan, programs):
+    for _ in range(programs):
+        await bulk_insert_workout_programs(session, [(user_id, plan)])
+
+async def bulk_batch(session, user_id, plan, programs):
+    await bulk_insert_workout_programs(session, [(user_id, plan)] * programs)
+
+async def copy_batch(session, user_id, plan, programs):
+    await bulk_insert_workout_programs(session, [(user_id, plan)] * programs, use_copy=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--programs", type=int, default=100)
+    args = parser.parse_args()
+
+    with open(SAMPLE_PLAN) as file:
+        plan = json.load(file)
+
+    await run_case("orm (per program)", plan, args.programs, orm_each)
+    await run_case("multi-row (per program)", plan, args.programs, bulk_each)
+    await run_case("multi-row (batch import)", plan, args.programs, bulk_batch)
+    await run_case("copy (batch import)", plan, args.programs, copy_batch)
+    await session_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+"""Canned inputs shared by the benchmarks."""
+import json, os
+
+SAMPLE_PLAN = os.path.join(os.path.dirname(__file__), "..", "sherlock_ai", "response_format", "sample-workout-program-res.json")
+
+# same profile as the /users/test-chain-prompt/ endpoint
+SAMPLE_USER = {
+    "id": 32,
+    "email": "name4@test.com",
+    "name": "name4",
+    "age": 29,
+    "height": 157.48,
+    "weight": 60,
+    "fitnessLevel": "intermediate",
+    "fitnessGoal": "general fitness",
+    "workoutLocation": "gym workout",
+    "daysAvailability": ["tuesday", "wednesday", "thursday", "friday", "saturday"],
+    "equipmentAvailability": ["full gym access", "yoga mat"],
+    "notes": "physically fit",
+    "start_date": "2025-11-18"
+}
+
+
+def load_sample_plan() -> dict:
+    with open(SAMPLE_PLAN) as file:
+        return json.load(file)
+
+
+def split_plan_parts(plan: dict) -> list[dict]:
+    """The sample plan as the three 10-day answers the model gives."""
+    parts = []
+    for index, days in enumerate(("1-10", "11-20", "21-30")):
+        part = {key: value for key, value in plan.items() if key != "plan"}
+        part["part_days"] = days
+        part["plan"] = plan["plan"][index * 10:(index + 1) * 10]
+        parts.append(part)
+    return parts
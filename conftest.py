@@ -0,0 +1,54 @@
+import copy
+import os
+
+import orjson
+import pytest
+
+from sherlock_ai.schema import response_schema
+
+# importing the models creates the engine (it doesn't connect), which needs a URL
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://localhost/fitness")
+
+RESPONSE_FORMAT_DIR = os.path.join(os.path.dirname(__file__), "sherlock_ai", "response_format")
+
+
+def _load(name: str) -> dict:
+    with open(os.path.join(RESPONSE_FORMAT_DIR, name), "rb") as f:
+        return orjson.loads(f.read())
+
+
+@pytest.fixture
+def part_schema() -> dict:
+    return response_schema(_load("workout_plan_schema.json"))
+
+
+@pytest.fixture
+def compact_schema() -> dict:
+    return response_schema(_load("workout_plan_compact_schema.json"))
+
+
+@pytest.fixture
+def day_schema(part_schema) -> dict:
+    return part_schema["properties"]["plan"]["items"]
+
+
+@pytest.fixture
+def part() -> dict:
+    """Days 1-10 of the sample plan, shaped like a first-part answer."""
+    sample = _load("sample-workout-program-res.json")
+    return {
+        "user_id": sample["user_id"],
+        "start_date": sample["start_date"],
+        "total_days": 30,
+        "part_days": "1-10",
+        "notes_from_coach": sample["notes_from_coach"],
+        "plan": copy.deepcopy(sample["plan"][:10]),
+    }
+
+
+@pytest.fixture
+def sherlock():
+    """SherlockAI on the synthetic backend (no network), in the default modes."""
+    from sherlock_ai.backends import SyntheticBackend
+    from sherlock_ai.model import SherlockAI
+    return SherlockAI(backend=SyntheticBackend(latency=0, jitter=0, failure_rate=0, seed=1))
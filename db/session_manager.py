@@ -5,11 +5,13 @@ from sqlalchemy.ext.declarative import declarative_base
 
 load_config()
 DATABASE_URL = os.getenv("DATABASE_URL")
+# log every SQL statement, turn off for load tests and production
+DB_ECHO = os.getenv("DB_ECHO", "true").lower() == "true"
 
 Base = declarative_base()
 
 class SessionManager:
-    def __init__(self, database_url: str = DATABASE_URL, echo: bool = True):
+    def __init__(self, database_url: str = DATABASE_URL, echo: bool = DB_ECHO):
         self.engine = create_async_engine(database_url, echo=echo)
         self.async_session = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
     
@@ -1,7 +1,10 @@
-import os, requests, json
-from fastapi import FastAPI
+import os, requests, json, asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config.my_logger import get_logger
 from config.env_vars import load_config
@@ -11,6 +14,13 @@ from routes.users import userRoutes
 from routes.authentticate import authRoutes
 from routes.workouts import workoutRoutes
 from routes.social_auth import socialAuthRoutes
+from sherlock_ai.model import close_http_client, get_sherlock_ai
+from db.session_manager import get_session
+from services.job_events import job_event_broker
+from routes.dependencies import require_operator
+from services.jobs import JOB_USAGE_MAX_HOURS, JobService
+from utils.metrics import collect_metrics
+from utils.passwords import password_hasher
 
 load_config()
 logger = get_logger(__name__, "main")
@@ -19,7 +29,19 @@ N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL")
 DATABASE_URL = os.getenv("DATABASE_URL")
 FRONTEND_URL = os.getenv("FRONTEND_URL")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # build the shared SherlockAI (and its template registry) before the first request
+    ai = get_sherlock_ai()
+    template_watcher = asyncio.create_task(ai.registry.watch())
+    await job_event_broker.start()
+    yield
+    await job_event_broker.stop()
+    template_watcher.cancel()
+    await close_http_client()
+    password_hasher.shutdown()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -44,6 +66,18 @@ def read_root():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics():
+    return collect_metrics()
+
+@app.get("/metrics/jobs", dependencies=[Depends(require_operator)])
+async def job_metrics(hours: float = Query(24, gt=0, le=JOB_USAGE_MAX_HOURS), session: AsyncSession = Depends(get_session)):
+    """
+    Generation time and LLM usage of the jobs finished in the last `hours`, across all workers.
+    Operators only (X-Operator-Token), as it aggregates over the jobs table.
+    """
+    return await JobService(session).usage_summary(hours)
+
 @app.get("/env")
 def environment_check():
     return {
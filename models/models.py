@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, Float, Text, ForeignKey, Date
+from sqlalchemy import String, Integer, Float, Text, ForeignKey, Date, DateTime, Index, func, text
 from sqlalchemy.types import ARRAY
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects.postgresql import ENUM
@@ -54,6 +54,14 @@ class WorkoutDayType(enum.Enum):
     workout = "workout"
     rest = "rest"
 
+class WorkoutJobStatus(enum.Enum):
+    queued = "queued"
+    processing = "processing"
+    completed = "completed"
+    failed = "failed"
+    # a speculative job whose profile changed before the user asked for the plan
+    cancelled = "cancelled"
+
 class User(Base):
     __tablename__ = "users"
     __table_args__ = {'schema': 'fitness'}
@@ -77,12 +85,20 @@ class User(Base):
     
 class WorkoutProgram(Base):
     __tablename__ = "workout_programs"
-    __table_args__ = {'schema': 'fitness'}
+    __table_args__ = (
+        # every read starts by finding the user's program
+        Index("ix_workout_programs_user_id", "user_id"),
+        {'schema': 'fitness'}
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     start_date: Mapped[Date] = mapped_column(Date, nullable=False)
     total_days: Mapped[int] = mapped_column(Integer, nullable=False)
     notes_from_coach: Mapped[str] = mapped_column(Text, nullable=True)
+    # bumped whenever the program or its days change, part of the response ETag
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
+    # what generated the plan: "ai", "local" or "local_fallback" (the local engine standing in for a failed LLM)
+    engine: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     # db relationship to plan days
     user_id: Mapped[int] = mapped_column(ForeignKey("fitness.users.id", ondelete="CASCADE"), nullable=False)
     # orm relationship to plan days
@@ -91,7 +107,11 @@ class WorkoutProgram(Base):
 
 class WorkoutDay(Base):
     __tablename__ = "workout_days"
-    __table_args__ = {'schema': 'fitness'}
+    __table_args__ = (
+        # day and date-range reads (today, this week) without touching the rest of the program
+        Index("ix_workout_days_workout_program_id_date", "workout_program_id", "date"),
+        {'schema': 'fitness'}
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     day_sequence: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -101,4 +121,62 @@ class WorkoutDay(Base):
     # postgresql jsonb column to store workout details
     workout_details: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
     # orm
-    workout_program: Mapped["WorkoutProgram"] = relationship(back_populates="days")
\ No newline at end of file
+    workout_program: Mapped["WorkoutProgram"] = relationship(back_populates="days")
+
+class WorkoutJob(Base):
+    __tablename__ = "workout_jobs"
+    __table_args__ = (
+        # workers claim the oldest queued job of the most urgent priority first
+        Index("ix_workout_jobs_status_priority_created_at", "status", "priority", "created_at"),
+        # a retried request finds the job it started
+        Index("uq_workout_jobs_user_id_idempotency_key", "user_id", "idempotency_key", unique=True),
+        # at most one requested generation per user and profile runs at a time, across all processes
+        Index(
+            "uq_workout_jobs_active_profile", "user_id", "profile_hash", unique=True,
+            postgresql_where=text("status IN ('queued', 'processing') AND priority = 0")
+        ),
+        # the usage summary reads the jobs finished in a recent window
+        Index("ix_workout_jobs_finished_at", "finished_at"),
+        {'schema': 'fitness'}
+    )
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("fitness.users.id", ondelete="CASCADE"), nullable=False, index=True)
+    status: Mapped[WorkoutJobStatus] = mapped_column(ENUM(WorkoutJobStatus), name='status', nullable=False, default=WorkoutJobStatus.queued)
+    # user profile snapshot the plan is generated from
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # latest progress reported by the generator, e.g. {"parts_completed": 2, "days_completed": 20, ...}
+    progress: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    # LLM calls, tokens, cost and time spent on the job (sherlock_ai.usage.PlanUsage.summary())
+    metrics: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # claimed in ascending order: 0 for requested plans, higher for speculative ones (services/jobs.py)
+    priority: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    # digest of the profile in payload, to tell whether a speculative plan still matches the user
+    profile_hash: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # client-chosen key (Idempotency-Key header) of the request that created the job
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    worker_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    workout_program_id: Mapped[Optional[int]] = mapped_column(ForeignKey("fitness.workout_programs.id", ondelete="SET NULL"), nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    started_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # bumped by the worker while it generates, a processing job whose heartbeat stops is requeued
+    heartbeat_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class PlanCacheEntry(Base):
+    """A generated plan shared by every profile with the same fingerprint (see services/plan_cache.py)."""
+    __tablename__ = "plan_cache"
+    __table_args__ = {'schema': 'fitness'}
+
+    fingerprint: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # normalized profile the fingerprint was computed from
+    profile: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    # plan as generated, dated from its own start_date; re-dated when served
+    plan: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    hits: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    last_used_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
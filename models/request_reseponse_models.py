@@ -16,6 +16,8 @@ class UserDetails(BaseModel):
     equipment_availability: Optional[list] = Field(None, alias="equipmentAvailability")
     notes: Optional[str] = None
     date_now: Optional[str] = None
+    # plan generator: "ai" or "local", the server default when omitted
+    engine: Optional[str] = None
     password: Optional[str] = None
     
     class Config:
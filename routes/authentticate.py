@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from passlib.context import CryptContext
-from fastapi.responses import JSONResponse
 import jwt, os
 
 from models.models import User
 from models.request_reseponse_models import UserLogin
+from routes.dependencies import get_current_user
+from services.user_cache import CachedUser
 from services.users import UserService
 from db.session_manager import get_session
 from utils.helpers import create_access_token, user_to_dict
+from utils.passwords import password_hasher, PasswordHasherBusy
+from utils.http_cache import content_etag, is_not_modified, not_modified, cache_headers
+from utils.responses import JSONResponse
 from config.env_vars import load_config
 from config.my_logger import get_logger
 
@@ -19,7 +22,6 @@ authRoutes = APIRouter(
     prefix="/auth",
     tags=["Authentication"]
 )
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 logger = get_logger(__name__, "authentticate")
 
 
@@ -33,9 +35,16 @@ async def login_user(credentials: UserLogin, session: AsyncSession = Depends(get
     try:
         user_service = UserService(session)     
         user = await user_service.get_user_by_email(credentials.email)
-        
-        if not user or not pwd_context.verify(credentials.password, user.password):
+        if not user:
+            return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid email or password"})
+
+        valid, new_hash = await password_hasher.verify_and_update(credentials.password, user.password)
+        if not valid:
             return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid email or password"})
+        if new_hash:
+            # stored hash used an old bcrypt cost, upgrade it now that we have the password
+            user.password = new_hash
+            await user_service.update_user(user)
         access_token = create_access_token(data={"sub": user.email})
         return JSONResponse(
             status_code=200,
@@ -45,6 +54,9 @@ async def login_user(credentials: UserLogin, session: AsyncSession = Depends(get
                 "user" : user_to_dict(user)
             }
         )
+    except PasswordHasherBusy:
+        logger.error("Login rejected: password hasher queue is full")
+        return JSONResponse(status_code=503, headers={"Retry-After": "1"}, content={"status": "error", "message": "Server busy, please try again"})
     except Exception as e:
         logger.error(f"Login error: {e}")
         return JSONResponse(status_code=500, content={"status": "error", "message": "Internal server error"})
@@ -60,7 +72,7 @@ async def check_token(authorization : str = Header(...), session: AsyncSession =
         email: str = payload.get("sub")
         
         user_service = UserService(session)
-        user = await user_service.get_user_by_email(email)
+        user = await user_service.get_cached_user_by_email(email)
         if user is None:
             return JSONResponse(status_code=200, content={"status": "error", "message": "No user found for this token"})
         
@@ -95,4 +107,19 @@ async def check_token(authorization : str = Header(...), session: AsyncSession =
         if isinstance(e, jwt.PyJWTError):
             return JSONResponse(status_code=200, content={"status": "error", "message": "Invalid Token"})
             
-        return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid token"})
\ No newline at end of file
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid token"})
+
+@authRoutes.get("/users/me")
+async def get_current_user_profile(request: Request, user: CachedUser | None = Depends(get_current_user)):
+    """
+    Profile of the token's user. Served from the user cache; a matching
+    If-None-Match gets a 304 with no body.
+    """
+    if user is None:
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid token"})
+
+    content = {"status": "success", "user": user_to_dict(user)}
+    etag = content_etag(content)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    return JSONResponse(status_code=200, headers=cache_headers(etag), content=content)
@@ -0,0 +1,42 @@
+"""
+Dependencies shared by the routers.
+"""
+import hmac, os
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.session_manager import get_session
+from services.user_cache import CachedUser
+from services.users import UserService
+from utils.helpers import get_email_from_token
+from config.env_vars import load_config
+
+load_config()
+# shared secret for the operator endpoints (job usage and cost); unset closes them
+OPERATOR_TOKEN = os.getenv("OPERATOR_TOKEN")
+
+
+async def get_current_user(
+    authorization: str = Header(...),
+    session: AsyncSession = Depends(get_session)
+) -> CachedUser | None:
+    """
+    User behind the bearer token, or None if the token is missing, invalid or
+    points at no user. Served from the user cache, so most requests skip the
+    users SELECT entirely. Routes decide how to answer a None.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    email = get_email_from_token(authorization.split(" ")[1])
+    if email is None:
+        return None
+    return await UserService(session).get_cached_user_by_email(email)
+
+
+async def require_operator(x_operator_token: str | None = Header(None)) -> None:
+    """
+    Guard for operator-only endpoints: the X-Operator-Token header must match
+    OPERATOR_TOKEN. With no token configured they are closed to everyone.
+    """
+    if not OPERATOR_TOKEN or x_operator_token is None or not hmac.compare_digest(x_operator_token, OPERATOR_TOKEN):
+        raise HTTPException(status_code=403, detail="Operator token required")
@@ -1,6 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Header, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi.responses import JSONResponse
 import firebase_admin
 from firebase_admin import auth, credentials
 import os
@@ -11,6 +10,8 @@ from models.models import User
 from services.users import UserService
 from db.session_manager import get_session
 from utils.helpers import create_access_token, user_to_dict
+from utils.passwords import password_hasher
+from utils.responses import JSONResponse
 from config.my_logger import get_logger
 
 # Initialize Firebase Admin
@@ -68,12 +69,8 @@ async def social_login(request: dict, session: AsyncSession = Depends(get_sessio
             # Create new user
             # Generate a dummy password since they use social login
             dummy_password = generate_random_password()
-            # Hash it if your User model expects hashed password (it usually does)
-            # Assuming you have a hashing utility, but for now we'll just store it 
-            # (In a real app, use the same hashing as your normal auth)
-            from passlib.context import CryptContext
-            pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-            hashed_password = pwd_context.hash(dummy_password)
+            # Hash it the same way as normal auth, off the event loop
+            hashed_password = await password_hasher.hash(dummy_password)
 
             new_user = User(
                 email=email,
@@ -121,16 +118,14 @@ async def delete_account(authorization: str = Header(...), session: AsyncSession
              return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid token"})
 
         user_service = UserService(session)
-        user = await user_service.get_user_by_email(email)
+        user = await user_service.get_cached_user_by_email(email)
 
         if not user:
             return JSONResponse(status_code=404, content={"status": "error", "message": "User not found"})
 
-        # Delete user
-        # Assuming UserService has a delete method or we do it manually
-        # If UserService doesn't have delete, we can add it or do it here
-        await session.delete(user)
-        await session.commit()
+        # Delete user (also drops them from the user cache)
+        if not await user_service.delete_user(user.id, user.email):
+            return JSONResponse(status_code=500, content={"status": "error", "message": "Internal server error"})
 
         return JSONResponse(status_code=200, content={"status": "success", "message": "Account deleted successfully"})
 
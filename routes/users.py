@@ -3,24 +3,27 @@ from fastapi import APIRouter, Depends, HTTPException, Header, BackgroundTasks
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from passlib.context import CryptContext
-from fastapi.responses import JSONResponse
 from sqlalchemy import select, and_
 import jwt, os
 
 from config.my_logger import get_logger
 from db.session_manager import get_session
 from models.models import User
-from sherlock_ai.model import SherlockAI
+from sherlock_ai.model import get_sherlock_ai
 from models.request_reseponse_models import UserDetails, UserLogin
+from routes.dependencies import get_current_user
+from services.jobs import JobService
+from services.user_cache import CachedUser, user_cache
 from services.users import UserService
-from utils.helpers import get_email_from_token, hash_password, create_access_token, user_to_dict, user_to_model
+from services.workouts import WorkoutService, WORKOUT_JOB_INLINE, INLINE_WORKER_ID, run_next_job
+from utils.helpers import get_email_from_token, create_access_token, is_user_done_onboarding, user_to_dict, user_to_model, workout_job_to_dict
+from utils.passwords import password_hasher, PasswordHasherBusy
+from utils.responses import JSONResponse
 
 logger = get_logger(__name__, "users")
 
 userRoutes = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-ai = SherlockAI()
+ai = get_sherlock_ai()
 
 @userRoutes.post("/create-user/")
 async def create_user(user: UserDetails, session: AsyncSession = Depends(get_session)):
@@ -36,7 +39,17 @@ async def create_user(user: UserDetails, session: AsyncSession = Depends(get_ses
             }
         )    
     
-    hashed_password = hash_password(user.password)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": "1"},
+            content={
+                "status":"error", 
+                "message":"Server busy, please try again"
+            }
+        )
     new_user = User(
         email=user.email,
         password=hashed_password,
@@ -81,26 +94,6 @@ async def create_user(user: UserDetails, session: AsyncSession = Depends(get_ses
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
     
-jobs = {}
-def generate_plan_task(job_id : str, user_details: UserDetails, ai : SherlockAI) -> None:
-    logger.info(f"GENERATE-PLAN-TASK:: START - Generating plan for job {job_id}")
-    try:
-        workout_program_text = ai.generate_workout_plan_test(user_details)
-        
-        # TODO: ADD A CLEANER FOR JOBS
-        jobs[job_id] = {"status": "completed", "workout_program": workout_program_text}
-        
-        # TODO : store workout plan
-        save_workout_program(user_details, workout_program_text)
-        
-        
-    except Exception as e:
-        jobs[job_id] = {"status": "error", "message": str(e)}
-        logger.error(f"GENERATE-PLAN-TASK::Error generating plan for job {job_id}: {e}")
-        
-def save_workout_program(user_details: UserDetails, workout_program_text: str):
-        pass
-    
 def update_user_details(user: User, user_details: UserDetails):
     if user_details.age is not None:
         user.age = user_details.age
@@ -128,6 +121,7 @@ def update_user_details(user: User, user_details: UserDetails):
 async def generate_30_day_plan(
     request_user_details: UserDetails, 
     authorization: str = Header(...), 
+    idempotency_key: str | None = Header(None),
     session: AsyncSession = Depends(get_session),
     backgroundTasks: BackgroundTasks = BackgroundTasks()
 ):
@@ -158,6 +152,7 @@ async def generate_30_day_plan(
         try:
             await session.commit()
             await session.refresh(user)
+            user_cache.invalidate(user_id=user.id, email=user.email)
         except IntegrityError as e:
             logger.error(f"GENERATE-30-DAY-PLAN::IntegrityError while updating user: {e}")
             await session.rollback()
@@ -183,27 +178,14 @@ async def generate_30_day_plan(
             logger.info(f"GENERATE-30-DAY-PLAN::User {user.email} has incomplete details.")
             return JSONResponse(status_code=400, content={"status": "error", "message": "All user details must be completed before generating a plan"})
         
-        # create 30 day plan
-        job_id = f"job_{user.id}_{int(datetime.utcnow().timestamp())}"
-        jobs[job_id] = {"status": "processing"}
-        
-        user_details_for_ai = UserDetails(
-            id=user.id,
-            email=user.email,
-            name=user.name,
-            age=user.age,
-            height=user.height,
-            weight=user.weight,
-            fitness_level=user.fitness_level,
-            fitness_goal=user.fitness_goal,
-            work_out_location=user.work_out_location,
-            days_availability=user.days_availability,
-            equipment_availability=user.equipment_availability,
-            notes=user.notes,
-            date_now=request_user_details.date_now  # Pass the date from the request
+        # create 30 day plan, starting on the date from the request
+        workout_service = WorkoutService(session)
+        job_id = await workout_service.create_user_workout(
+            user.id, backgroundTasks, start_date=request_user_details.date_now, engine=request_user_details.engine,
+            idempotency_key=idempotency_key
         )
-        
-        backgroundTasks.add_task(generate_plan_task, job_id, user_details_for_ai, ai)
+        if job_id is None:
+            return JSONResponse(status_code=500, content={"status": "error", "message": "Failed to create workout job."})
         
         return JSONResponse(
             status_code=200, 
@@ -217,22 +199,23 @@ async def generate_30_day_plan(
         return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid or expired token"})
 
 @userRoutes.get("/plan-status/{job_id}/")
-async def get_plan_status(job_id: str):
-    logger.info(f"PLAN-STATUS:: list of jobs: {jobs}")
-    job = jobs.get(job_id)
+async def get_plan_status(job_id: str, session: AsyncSession = Depends(get_session)):
+    job = await JobService(session).get_job(job_id)
     if not job:
         return JSONResponse(status_code=404, content={"status": "error", "message": "Job not found"})
-    return JSONResponse(status_code=200, content={"status": "success", "job": job})
+    return JSONResponse(status_code=200, content={"status": "success", "job": workout_job_to_dict(job)})
 
 @userRoutes.get("/plan-result/{job_id}/")
-async def plan_result(job_id: str):
-    job = jobs.get(job_id)
-    if not job:
+async def plan_result(job_id: str, session: AsyncSession = Depends(get_session)):
+    job = await WorkoutService(session).get_job_status(job_id)
+    if job["status"] == "not_found":
         return JSONResponse(status_code=404, content={"status": "error", "message": "Job not found"})
     if job["status"] == "completed":
-        return JSONResponse(status_code=200, content={"status": "success", "plan": job["plan"]})
-    elif job["status"] == "error":
-        return JSONResponse(status_code=500, content={"status": "error", "message": job["message"]})
+        return JSONResponse(status_code=200, content={"status": "success", "plan": job.get("workout_plan")})
+    elif job["status"] == "failed":
+        return JSONResponse(status_code=500, content={"status": "error", "message": job["error"]})
+    elif job["status"] == "cancelled":
+        return JSONResponse(status_code=409, content={"status": "error", "message": job["error"]})
     else:
         return JSONResponse(status_code=202, content={"status": "processing"})
     
@@ -251,19 +234,22 @@ async def chat_with_openai():
 async def update_user(
     user_id: int, 
     user_update_request: UserDetails, 
-    authorization: str = Header(...), 
-    session: AsyncSession = Depends(get_session)
+    current_user: CachedUser | None = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+    backgroundTasks: BackgroundTasks = BackgroundTasks()
     ):
 
     user_service = UserService(session)
     
-    token = authorization.split(" ")[1]
-    email = get_email_from_token(token)
-    user = await user_service.get_user_by_id(user_id)
+    if current_user is None or current_user.id != user_id:
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid User or expired token"})
 
-    if email is None or user is None or user.email != email:
+    # the row itself is needed (not the cached snapshot) to apply the update
+    user = await user_service.get_user_by_id(user_id)
+    if user is None:
         return JSONResponse(status_code=401, content={"status": "error", "message": "Invalid User or expired token"})
 
+    was_done_onboarding = is_user_done_onboarding(user)
     user_update = user_to_model(user_update_request)
     # use the request model to get the keys that were sent
     update_data_keys = user_update_request.model_dump(exclude_unset=True).keys()
@@ -288,6 +274,12 @@ async def update_user(
                 "message":f"Failed to update user {user.name}"
             }
         )
+
+    # start on the plan as soon as onboarding is done (or refresh the one started earlier)
+    if updated_user is not None and is_user_done_onboarding(updated_user):
+        await WorkoutService(session).speculate_user_workout(
+            updated_user, backgroundTasks, onboarding_finished=not was_done_onboarding
+        )
     
     return JSONResponse(
         status_code=200, 
@@ -298,43 +290,47 @@ async def update_user(
         })
     
 @userRoutes.post("/test-chain-prompt/")
-async def test_chain_prompt(backgroundTasks: BackgroundTasks = BackgroundTasks()):
+async def test_chain_prompt(
+    backgroundTasks: BackgroundTasks = BackgroundTasks(),
+    session: AsyncSession = Depends(get_session)
+):
     try:
-        job_id = f"job_{32}_{int(datetime.utcnow().timestamp())}"
-        jobs[job_id] = {"status": "processing"}
-        
-        user_details_for_ai = UserDetails(
-            id=32,
-            email="name4@test.com",
-            name="name4",
-            age=29,
-            height=157.48,
-            weight=60,
-            fitness_level="intermediate",
-            fitness_goal="general_fitness",
-            work_out_location="gym_workout",
-            days_availability=[
+        user_dict_for_ai = {
+            "id": 32,
+            "email": "name4@test.com",
+            "name": "name4",
+            "age": 29,
+            "height": 157.48,
+            "weight": 60,
+            "fitnessLevel": "intermediate",
+            "fitnessGoal": "general fitness",
+            "workoutLocation": "gym workout",
+            "daysAvailability": [
                 "tuesday",
                 "wednesday",
                 "thursday",
                 "friday",
                 "saturday"
             ],
-            equipment_availability=[
-                "full_gym_access",
-                "yoga_mat"
+            "equipmentAvailability": [
+                "full gym access",
+                "yoga mat"
             ],
-            notes="physically fit",
-            date_now="2025-11-18"
-        )
+            "notes": "physically fit",
+            "start_date": "2025-11-18"
+        }
         
-        backgroundTasks.add_task(generate_plan_task, job_id, user_details_for_ai, ai)
+        job = await JobService(session).create_job(user_dict_for_ai["id"], user_dict_for_ai)
+        if job is None:
+            raise Exception("job could not be queued")
+        if WORKOUT_JOB_INLINE:
+            backgroundTasks.add_task(run_next_job, INLINE_WORKER_ID, job.id)
         
         return JSONResponse(
             status_code=200, 
             content={
                 "status": "success", 
-                "plan_id": job_id
+                "plan_id": job.id
             }
         )
     except Exception as e:
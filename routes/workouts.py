@@ -2,18 +2,33 @@
 """
 Routes for workout management.
 """
-from fastapi import APIRouter, Header, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, BackgroundTasks, Header, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, timedelta
+import asyncio, json, os
 
 from config.env_vars import load_config
 from config.my_logger import get_logger
-from db.session_manager import get_session
-from services.users import UserService
-from services.workouts import WorkoutService
-from utils.helpers import get_email_from_token, is_user_done_onboarding, workout_program_to_dict
+from db.session_manager import get_session, session_manager
+from services.job_events import job_event_broker
+from routes.dependencies import get_current_user
+from services.jobs import JobService
+from services.user_cache import CachedUser
+from services.workout_cache import workout_program_cache, serialize_workout_response
+from services.workouts import WorkoutExists, WorkoutService
+from utils.helpers import is_user_done_onboarding, workout_job_to_dict
+from utils.http_cache import workout_program_etag, workout_days_etag, is_not_modified, not_modified, cache_headers
+from utils.responses import JSONResponse, RawJSONResponse
 
 load_config()
+# seconds between SSE keep-alive comments
+JOB_EVENTS_KEEPALIVE = float(os.getenv("JOB_EVENTS_KEEPALIVE", "15"))
+# seconds between re-reads of the job row, in case a notification was missed
+JOB_EVENTS_RESYNC = float(os.getenv("JOB_EVENTS_RESYNC", "60"))
+JOB_TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+# days returned by /get-user-workout-days/ when no end date is given (a week)
+WORKOUT_DAYS_DEFAULT_RANGE = int(os.getenv("WORKOUT_DAYS_DEFAULT_RANGE", "7"))
 
 workoutRoutes = APIRouter(
     prefix="/workout",
@@ -23,21 +38,17 @@ workoutRoutes = APIRouter(
 logger = get_logger(__name__, "workouts")
 
 
-@workoutRoutes.post("/get-user-workout/{user_id}/")
+@workoutRoutes.api_route("/get-user-workout/{user_id}/", methods=["GET", "POST"])
 async def get_user_workout(
-    authorization: str = Header(...),
+    request: Request,
+    user: CachedUser | None = Depends(get_current_user),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Get the workout details for a specific user.
+    Responses carry an ETag; a GET with a matching If-None-Match gets a 304
+    without the program's days being loaded.
     """
-
-    token = authorization.split(" ")[1]
-    email = get_email_from_token(token)
-
-    # first get user
-    user_service = UserService(session)
-    user = await user_service.get_user_by_email(email)
     if user is None:
         return JSONResponse(
             status_code=200,
@@ -52,27 +63,137 @@ async def get_user_workout(
 
     # check if user has workout data
     workout_service = WorkoutService(session)
-    workout = await workout_service.get_user_workout(user.id)
-    if workout is None:
+    workout_version = await workout_service.get_user_workout_version(user.id)
+    if workout_version is None:
         return JSONResponse(status_code=200, content={"status":"error", "message":"No workout found."})
 
+    etag = workout_program_etag(*workout_version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    body = workout_program_cache.get(*workout_version)
+    if body is None:
+        workout = await workout_service.get_user_workout(user.id)
+        if workout is None:
+            return JSONResponse(status_code=200, content={"status":"error", "message":"No workout found."})
+        workout_version = (workout.id, workout.version)
+        etag = workout_program_etag(*workout_version)
+        body = serialize_workout_response(workout)
+        workout_program_cache.put(*workout_version, body)
 
     # return workout
-    return JSONResponse(status_code=200, content={"status":"success", "workout": workout_program_to_dict(workout)})
+    return RawJSONResponse(content=body, status_code=200, headers=cache_headers(etag))
+
+async def workout_days_response(
+    request: Request,
+    user: CachedUser | None,
+    session: AsyncSession,
+    start: date,
+    end: date,
+    details: bool
+):
+    """
+    A range of the user's program days. The ETag is known from the program's
+    version alone, so a matching If-None-Match gets a 304 without the days
+    being read.
+    """
+    if user is None:
+        return JSONResponse(
+            status_code=200,
+            content={"status":"error", "message":"No user found."}
+        )
+
+    if not is_user_done_onboarding(user):
+        return JSONResponse(
+            status_code=200,
+            content={"status": "error", "message": "User not complete details. "}
+        )
+
+    workout_service = WorkoutService(session)
+    workout_version = await workout_service.get_user_workout_version(user.id)
+    if workout_version is None:
+        return JSONResponse(status_code=200, content={"status":"error", "message":"No workout found."})
+
+    etag = workout_days_etag(*workout_version, start, end, details)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    days = await workout_service.get_workout_days(workout_version[0], start, end, details)
+    if days is None:
+        return JSONResponse(status_code=200, content={"status":"error", "message":"Failed to get workout days."})
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "status": "success",
+            "workout_program_id": workout_version[0],
+            "version": workout_version[1],
+            "days": days
+        },
+        headers=cache_headers(etag)
+    )
+
+def parse_day(value: str | None, default: date) -> date | None:
+    """YYYY-MM-DD query parameter, `default` when omitted, None when malformed."""
+    if value is None:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+@workoutRoutes.get("/get-user-workout-days/{user_id}/")
+async def get_user_workout_days(
+    request: Request,
+    start: str | None = None,
+    end: str | None = None,
+    details: bool = False,
+    user: CachedUser | None = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    The user's workout days from `start` (default today) to `end` (default a
+    week later), inclusive, as YYYY-MM-DD. Days are summaries (no exercises)
+    unless `details` is true, so a week view is one small read.
+    """
+    start_day = parse_day(start, date.today())
+    end_day = parse_day(end, start_day + timedelta(days=WORKOUT_DAYS_DEFAULT_RANGE - 1)) if start_day else None
+    if start_day is None or end_day is None or end_day < start_day:
+        return JSONResponse(status_code=200, content={"status":"error", "message":"Invalid date range."})
+    return await workout_days_response(request, user, session, start_day, end_day, details)
+
+@workoutRoutes.get("/get-user-workout-today/{user_id}/")
+async def get_user_workout_today(
+    request: Request,
+    day: str | None = None,
+    details: bool = True,
+    user: CachedUser | None = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    The user's workout for one day: `day` as YYYY-MM-DD, default today (the
+    server's date, so clients in other timezones should send theirs).
+    `days` is empty when the program has no such day.
+    """
+    today = parse_day(day, date.today())
+    if today is None:
+        return JSONResponse(status_code=200, content={"status":"error", "message":"Invalid date."})
+    return await workout_days_response(request, user, session, today, today, details)
 
 @workoutRoutes.post("/create-user-workout/{user_id}/")
 async def create_user_workout(
-    authorization: str = Header(...),
+    engine: str | None = None,
+    idempotency_key: str | None = Header(None),
+    user: CachedUser | None = Depends(get_current_user),
     background_tasks: BackgroundTasks = BackgroundTasks(),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Create a new workout for a specific user.
+    `engine` picks the plan generator: "ai" or "local" (rule-based, instant).
+    A retry carrying the same Idempotency-Key header gets the same job back,
+    and concurrent requests share one generation.
     """
-    token = authorization.split(" ")[1]
-    email = get_email_from_token(token)
-    user_service = UserService(session)
-    user = await user_service.get_user_by_email(email)
     if user is None:
         return JSONResponse(
             status_code=200,
@@ -87,14 +208,15 @@ async def create_user_workout(
     
     workout_service = WorkoutService(session)
 
-    # check first if user has workout data
-    # when testing comment this out
-    workout = await workout_service.get_user_workout(user.id)
-    if workout is not None:
+    # create workout job, unless the user already has a workout
+    # (checked under the user's job lock; a plan pre-generated at onboarding is handed over or replaced)
+    # when testing pass only_if_no_workout=False
+    try:
+        workout_job_id = await workout_service.create_user_workout(
+            user.id, background_tasks, engine=engine, idempotency_key=idempotency_key, only_if_no_workout=True
+        )
+    except WorkoutExists:
         return JSONResponse(status_code=200, content={"status":"error", "message":"User already has a workout."})
-
-    # create workout job
-    workout_job_id = await workout_service.create_user_workout(user.id, background_tasks)
     
     if workout_job_id is None:
         return JSONResponse(status_code=200, content={"status":"error", "message":"Failed to create workout job."})
@@ -105,16 +227,12 @@ async def create_user_workout(
 @workoutRoutes.get("/job-status/{job_id}/")
 async def get_job_status(
     job_id: str,
-    authorization: str = Header(...),
+    user: CachedUser | None = Depends(get_current_user),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Get the status of a workout generation job.
     """
-    token = authorization.split(" ")[1]
-    email = get_email_from_token(token)
-    user_service = UserService(session)
-    user = await user_service.get_user_by_email(email)
     if user is None:
         return JSONResponse(
             status_code=200,
@@ -122,6 +240,77 @@ async def get_job_status(
         )
     
     workout_service = WorkoutService(session)
-    job_status = workout_service.get_job_status(job_id)
+    job_status = await workout_service.get_job_status(job_id, user.id)
     
-    return JSONResponse(status_code=200, content={"status":"success", "job_status": job_status})
\ No newline at end of file
+    return JSONResponse(status_code=200, content={"status":"success", "job_status": job_status})
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+async def read_job_snapshot(job_id: str) -> dict | None:
+    async with session_manager.async_session() as session:
+        job = await JobService(session).get_job(job_id)
+        return workout_job_to_dict(job) if job else None
+
+async def job_event_stream(job_id: str, snapshot: dict):
+    """
+    Yields SSE frames for one job: the current state first, then every pushed
+    transition until the job completes or fails.
+    """
+    async with job_event_broker.subscribe(job_id) as queue:
+        # the subscription is open before this re-read, so nothing can slip in between
+        snapshot = await read_job_snapshot(job_id) or snapshot
+        yield format_sse("status", snapshot)
+        if snapshot["status"] in JOB_TERMINAL_STATUSES:
+            return
+
+        loop = asyncio.get_running_loop()
+        last_sync = loop.time()
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=JOB_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                if loop.time() - last_sync < JOB_EVENTS_RESYNC:
+                    yield ": keep-alive\n\n"
+                    continue
+                last_sync = loop.time()
+                event = await read_job_snapshot(job_id)
+                if event is None:
+                    return
+            if event.get("truncated"):
+                # too big for NOTIFY, the row has the whole of it
+                event = await read_job_snapshot(job_id) or event
+
+            yield format_sse("progress" if event.get("progress") and event["status"] == "processing" else "status", event)
+            if event["status"] in JOB_TERMINAL_STATUSES:
+                return
+
+@workoutRoutes.get("/job-events/{job_id}/")
+async def stream_job_events(
+    job_id: str,
+    user: CachedUser | None = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Server-sent events for a workout generation job. Replaces polling
+    /job-status/: one connection per job, auth checked once.
+    """
+    if user is None:
+        return JSONResponse(
+            status_code=200,
+            content={"status":"error", "message":"No user found."}
+        )
+
+    job = await JobService(session).get_job(job_id)
+    if job is None or job.user_id != user.id:
+        return JSONResponse(status_code=200, content={"status":"error", "message":"Job not found."})
+    snapshot = workout_job_to_dict(job)
+
+    # give the connection back to the pool, the stream itself doesn't need one
+    await session.close()
+
+    return StreamingResponse(
+        job_event_stream(job_id, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
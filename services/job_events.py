@@ -0,0 +1,125 @@
+import asyncio
+import json
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.my_logger import get_logger
+from db.session_manager import session_manager
+
+# Postgres NOTIFY channel carrying job status and progress changes
+JOB_EVENTS_CHANNEL = "workout_job_events"
+# Postgres rejects payloads of 8000 bytes or more, and the whole transaction with them
+JOB_EVENT_MAX_BYTES = 4000
+# characters of a job's error carried in its event, the row keeps all of it
+JOB_EVENT_ERROR_CHARS = 500
+
+logger = get_logger(__name__, "job_events")
+
+
+async def publish_job_event(session: AsyncSession, job_id: str, event: dict) -> None:
+    """
+    Queue a NOTIFY for `event` on the session's transaction. Postgres delivers it
+    to every listening API process when the transaction commits, so it's sent
+    together with the row change it describes (and dropped on rollback).
+
+    Payloads are kept small: a long error is cut short, and an event still
+    over JOB_EVENT_MAX_BYTES is sent as its status alone, marked "truncated"
+    so subscribers re-read the row.
+    """
+    if isinstance(event.get("error"), str) and len(event["error"]) > JOB_EVENT_ERROR_CHARS:
+        event = {**event, "error": event["error"][:JOB_EVENT_ERROR_CHARS] + "..."}
+    payload = json.dumps({"job_id": job_id, **event}, separators=(',', ':'), default=str)
+    if len(payload.encode()) > JOB_EVENT_MAX_BYTES:
+        payload = json.dumps({"job_id": job_id, "status": event.get("status"), "truncated": True}, separators=(',', ':'))
+    await session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": JOB_EVENTS_CHANNEL, "payload": payload}
+    )
+
+
+class JobEventBroker:
+    """
+    Fans job events out to SSE subscribers in this process.
+
+    Holds a single LISTEN connection per process no matter how many clients
+    are waiting; each subscriber gets its own asyncio.Queue for one job id.
+    """
+
+    def __init__(self):
+        self.subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self.connection = None
+        self.driver_connection = None
+        self.listening = False
+        self.stopped = False
+
+    async def start(self):
+        self.stopped = False
+        try:
+            self.connection = await session_manager.engine.connect()
+            raw_connection = await self.connection.get_raw_connection()
+            self.driver_connection = raw_connection.driver_connection
+            await self.driver_connection.add_listener(JOB_EVENTS_CHANNEL, self._on_notify)
+            self.driver_connection.add_termination_listener(self._on_terminate)
+            self.listening = True
+            logger.info(f"JOB-EVENTS:: listening on {JOB_EVENTS_CHANNEL}")
+        except Exception as e:
+            # subscribers still get periodic resyncs from the table, just not instant pushes
+            logger.error(f"JOB-EVENTS:: could not start listener: {e}")
+            await self._close_connection()
+
+    async def stop(self):
+        self.stopped = True
+        await self._close_connection()
+
+    async def _close_connection(self):
+        self.listening = False
+        if self.driver_connection is not None:
+            self.driver_connection.remove_termination_listener(self._on_terminate)
+            self.driver_connection = None
+        if self.connection is not None:
+            try:
+                # invalidate rather than close so a connection with LISTEN state never goes back to the pool
+                await self.connection.invalidate()
+                await self.connection.close()
+            except Exception as e:
+                logger.error(f"JOB-EVENTS:: error closing listener: {e}")
+            self.connection = None
+
+    def _on_terminate(self, connection):
+        if self.stopped:
+            return
+        logger.error("JOB-EVENTS:: listener connection lost, reconnecting")
+        self.listening = False
+        asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self, delay: float = 2.0):
+        await self._close_connection()
+        while not self.listening and not self.stopped:
+            await asyncio.sleep(delay)
+            await self.start()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.error(f"JOB-EVENTS:: bad payload: {payload}")
+            return
+        for queue in self.subscribers.get(event.get("job_id"), ()):
+            queue.put_nowait(event)
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str):
+        queue: asyncio.Queue = asyncio.Queue()
+        self.subscribers[job_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers[job_id].discard(queue)
+            if not self.subscribers[job_id]:
+                del self.subscribers[job_id]
+
+
+# one broker per API process
+job_event_broker = JobEventBroker()
@@ -0,0 +1,424 @@
+from datetime import datetime, timedelta, timezone
+import os
+import uuid
+from typing import NamedTuple
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.env_vars import load_config
+from config.my_logger import get_logger
+from models.models import WorkoutJob, WorkoutJobStatus
+from services.job_events import publish_job_event
+
+load_config()
+# a processing job without a heartbeat for this many seconds is assumed orphaned by a dead worker
+WORKOUT_JOB_STALE_AFTER = int(os.getenv("WORKOUT_JOB_STALE_AFTER", "180"))
+# seconds between heartbeats of a running job, well under WORKOUT_JOB_STALE_AFTER
+WORKOUT_JOB_HEARTBEAT_INTERVAL = float(os.getenv("WORKOUT_JOB_HEARTBEAT_INTERVAL", "30"))
+WORKOUT_JOB_MAX_ATTEMPTS = int(os.getenv("WORKOUT_JOB_MAX_ATTEMPTS", "3"))
+
+# claim order, lowest first: plans a user asked for go before speculative ones
+JOB_PRIORITY_REQUESTED = 0
+JOB_PRIORITY_SPECULATIVE = 10
+# statuses of a speculative job that may still be handed to the user
+SPECULATIVE_LIVE_STATUSES = (WorkoutJobStatus.queued, WorkoutJobStatus.processing, WorkoutJobStatus.completed)
+ACTIVE_STATUSES = (WorkoutJobStatus.queued, WorkoutJobStatus.processing)
+# first key of the per-user advisory lock on job creation (the user id is the second)
+JOB_LOCK_NAMESPACE = 0x574A
+# longest window, in hours, the usage summary aggregates over
+JOB_USAGE_MAX_HOURS = 24 * 7
+
+
+class JobClaim(NamedTuple):
+    """
+    One claim of a job. A job requeued by the stale sweep is claimed again
+    with a higher attempt number, so every write of a generation checks its
+    claim is still the job's current one.
+    """
+    job_id: str
+    worker_id: str
+    attempt: int
+
+    @classmethod
+    def of(cls, job: WorkoutJob) -> "JobClaim":
+        return cls(job.id, job.worker_id, job.attempts)
+
+
+def owned_by(claim: JobClaim):
+    """WHERE clause: the job is processing under this claim."""
+    return (
+        (WorkoutJob.id == claim.job_id)
+        & (WorkoutJob.status == WorkoutJobStatus.processing)
+        & (WorkoutJob.worker_id == claim.worker_id)
+        & (WorkoutJob.attempts == claim.attempt)
+    )
+
+
+class JobCancelled(BaseException):
+    """
+    Raised into a running generation whose job was cancelled. A BaseException,
+    like asyncio.CancelledError, so the generator's own error handling and
+    fallbacks don't swallow it.
+    """
+
+class JobService:
+    """
+    Persistent queue of workout plan jobs in fitness.workout_jobs.
+
+    Any number of API and worker processes can share the table: workers
+    claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, so a job is handed
+    to exactly one of them. Speculative jobs (plans generated before the
+    user asked for one) have a higher priority number and are claimed only
+    when no requested job is waiting.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.logger = get_logger(__name__, self.__class__.__name__)
+
+    async def create_job(
+        self, user_id: int, payload: dict, priority: int = JOB_PRIORITY_REQUESTED,
+        profile_hash: str | None = None, idempotency_key: str | None = None
+    ) -> WorkoutJob | None:
+        job = WorkoutJob(
+            id=f"job_{user_id}_{uuid.uuid4().hex}",
+            user_id=user_id,
+            status=WorkoutJobStatus.queued,
+            payload=payload,
+            attempts=0,
+            priority=priority,
+            profile_hash=profile_hash,
+            idempotency_key=idempotency_key
+        )
+        self.session.add(job)
+        try:
+            await self.session.commit()
+            await self.session.refresh(job)
+            return job
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error creating job for user {user_id}: {e}")
+            return None
+
+    async def get_job(self, job_id: str) -> WorkoutJob | None:
+        try:
+            return await self.session.get(WorkoutJob, job_id)
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error fetching job {job_id}: {e}")
+            return None
+
+    async def lock_user_jobs(self, user_id: int) -> None:
+        """
+        Postgres advisory lock on creating the user's jobs, held until the
+        session's transaction ends (create_job commits). Every API process
+        takes it, so a check for an existing job and the insert of a new one
+        can't interleave with another request's.
+        """
+        await self.session.execute(select(func.pg_advisory_xact_lock(JOB_LOCK_NAMESPACE, user_id)))
+
+    async def get_job_by_idempotency_key(self, user_id: int, idempotency_key: str) -> WorkoutJob | None:
+        try:
+            result = await self.session.execute(
+                select(WorkoutJob).where(WorkoutJob.user_id == user_id, WorkoutJob.idempotency_key == idempotency_key)
+            )
+            return result.scalar_one_or_none()
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error fetching job of user {user_id} by idempotency key: {e}")
+            return None
+
+    async def get_generation(self, user_id: int, profile_hash: str) -> WorkoutJob | None:
+        """
+        The user's requested job for this profile that is queued, running, or
+        completed with its program still there (the newest, if several).
+        """
+        try:
+            result = await self.session.execute(
+                select(WorkoutJob)
+                .where(
+                    WorkoutJob.user_id == user_id,
+                    WorkoutJob.profile_hash == profile_hash,
+                    WorkoutJob.priority == JOB_PRIORITY_REQUESTED,
+                    WorkoutJob.status.in_(ACTIVE_STATUSES)
+                    | ((WorkoutJob.status == WorkoutJobStatus.completed) & WorkoutJob.workout_program_id.is_not(None))
+                )
+                .order_by(WorkoutJob.created_at.desc())
+                .limit(1)
+            )
+            return result.scalar_one_or_none()
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error fetching plan generation of user {user_id}: {e}")
+            return None
+
+    async def claim_job(self, worker_id: str, job_id: str | None = None) -> WorkoutJob | None:
+        """
+        Lock the oldest queued job of the lowest priority number (or `job_id`
+        if given), mark it processing and commit. Returns None when there is
+        nothing to claim.
+        """
+        query = (
+            select(WorkoutJob)
+            .where(WorkoutJob.status == WorkoutJobStatus.queued)
+            .order_by(WorkoutJob.priority, WorkoutJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if job_id is not None:
+            query = query.where(WorkoutJob.id == job_id)
+
+        try:
+            result = await self.session.execute(query)
+            job = result.scalar_one_or_none()
+            if job is None:
+                await self.session.rollback()
+                return None
+
+            job.status = WorkoutJobStatus.processing
+            job.worker_id = worker_id
+            job.attempts += 1
+            job.started_at = datetime.now(timezone.utc)
+            job.heartbeat_at = job.started_at
+            await publish_job_event(self.session, job.id, {"status": job.status.value})
+            await self.session.commit()
+            return job
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error claiming job: {e}")
+            return None
+
+    async def update_progress(self, claim: JobClaim, progress: dict) -> bool:
+        """
+        Store the job's progress (and heartbeat). False if the claim is no
+        longer the job's: it was cancelled, or requeued and claimed again.
+        """
+        try:
+            result = await self.session.execute(
+                update(WorkoutJob)
+                .where(owned_by(claim))
+                .values(progress=progress, heartbeat_at=datetime.now(timezone.utc))
+            )
+            if result.rowcount == 0:
+                await self.session.rollback()
+                return False
+            await publish_job_event(self.session, claim.job_id, {"status": WorkoutJobStatus.processing.value, "progress": progress})
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error updating progress of job {claim.job_id}: {e}")
+        return True
+
+    async def heartbeat(self, claim: JobClaim) -> bool:
+        """Mark the job alive. False if the claim is no longer the job's."""
+        try:
+            result = await self.session.execute(
+                update(WorkoutJob)
+                .where(owned_by(claim))
+                .values(heartbeat_at=datetime.now(timezone.utc))
+            )
+            await self.session.commit()
+            return result.rowcount == 1
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error updating heartbeat of job {claim.job_id}: {e}")
+            return True
+
+    async def lock_if_owned(self, claim: JobClaim) -> bool:
+        """
+        Lock the job row until the session's transaction ends, if the job is
+        still processing under this claim. A cancellation or a second claim
+        waits for the lock, so a result saved under it can't race one.
+        """
+        result = await self.session.execute(
+            select(WorkoutJob.id)
+            .where(owned_by(claim))
+            .with_for_update()
+        )
+        return result.scalar_one_or_none() is not None
+
+    async def speculative_jobs(self, user_id: int) -> list[WorkoutJob]:
+        """The user's speculative jobs that may still be handed over, newest first."""
+        try:
+            result = await self.session.execute(
+                select(WorkoutJob)
+                .where(
+                    WorkoutJob.user_id == user_id,
+                    WorkoutJob.priority == JOB_PRIORITY_SPECULATIVE,
+                    WorkoutJob.status.in_(SPECULATIVE_LIVE_STATUSES)
+                )
+                .order_by(WorkoutJob.created_at.desc())
+            )
+            return list(result.scalars().all())
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error fetching speculative jobs of user {user_id}: {e}")
+            return []
+
+    async def promote_job(self, job_id: str, payload: dict | None = None, idempotency_key: str | None = None) -> bool:
+        """Turn a speculative job into a requested one (optionally with a new payload, while it's queued)."""
+        values = {"priority": JOB_PRIORITY_REQUESTED, "idempotency_key": idempotency_key}
+        if payload is not None:
+            values["payload"] = payload
+        try:
+            result = await self.session.execute(
+                update(WorkoutJob)
+                .where(
+                    WorkoutJob.id == job_id,
+                    WorkoutJob.priority == JOB_PRIORITY_SPECULATIVE,
+                    WorkoutJob.status.in_((WorkoutJobStatus.queued,) if payload is not None else SPECULATIVE_LIVE_STATUSES)
+                )
+                .values(**values)
+            )
+            await self.session.commit()
+            return result.rowcount == 1
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error promoting job {job_id}: {e}")
+            return False
+
+    async def cancel_speculative_jobs(self, user_id: int, keep: str | None = None) -> list[int]:
+        """
+        Cancel the user's speculative jobs (all but `keep`). Running ones stop
+        at their next progress report and don't save their plan. Returns the
+        ids of the programs finished ones had already saved, for the caller
+        to delete.
+        """
+        try:
+            query = (
+                update(WorkoutJob)
+                .where(
+                    WorkoutJob.user_id == user_id,
+                    WorkoutJob.priority == JOB_PRIORITY_SPECULATIVE,
+                    WorkoutJob.status.in_(SPECULATIVE_LIVE_STATUSES)
+                )
+                .values(status=WorkoutJobStatus.cancelled, error="Profile changed", finished_at=datetime.now(timezone.utc))
+                .returning(WorkoutJob.id, WorkoutJob.workout_program_id)
+            )
+            if keep is not None:
+                query = query.where(WorkoutJob.id != keep)
+            rows = (await self.session.execute(query)).all()
+            for job_id, _ in rows:
+                await publish_job_event(self.session, job_id, {"status": WorkoutJobStatus.cancelled.value})
+            await self.session.commit()
+            if rows:
+                self.logger.info(f"Cancelled {len(rows)} speculative jobs of user {user_id}")
+            return [program_id for _, program_id in rows if program_id is not None]
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error cancelling speculative jobs of user {user_id}: {e}")
+            return []
+
+    async def complete_job(self, claim: JobClaim, workout_program_id: int, metrics: dict | None = None) -> bool:
+        return await self._finish(claim, WorkoutJobStatus.completed, workout_program_id=workout_program_id, error=None, metrics=metrics)
+
+    async def fail_job(self, claim: JobClaim, error: str, metrics: dict | None = None) -> bool:
+        return await self._finish(claim, WorkoutJobStatus.failed, error=error, metrics=metrics)
+
+    async def _finish(self, claim: JobClaim, status: WorkoutJobStatus, **values) -> bool:
+        """
+        Finish the job, unless the claim is no longer its own (cancelled, or
+        claimed again). Whatever else the session wrote is rolled back with it.
+        """
+        job_id = claim.job_id
+        try:
+            result = await self.session.execute(
+                update(WorkoutJob)
+                .where(owned_by(claim))
+                .values(status=status, finished_at=datetime.now(timezone.utc), **values)
+            )
+            if result.rowcount == 0:
+                await self.session.rollback()
+                self.logger.warning(f"Job {job_id} is no longer claimed by {claim.worker_id} (attempt {claim.attempt}), not setting it to {status.value}")
+                return False
+            # metrics stay on the row, subscribers only need the outcome
+            event = {key: value for key, value in values.items() if key != "metrics"}
+            await publish_job_event(self.session, job_id, {"status": status.value, **event})
+            await self.session.commit()
+            return True
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error setting job {job_id} to {status.value}: {e}")
+            return False
+
+    async def requeue_stale_jobs(self, stale_after: int = WORKOUT_JOB_STALE_AFTER) -> int:
+        """
+        Put jobs orphaned by a crashed worker (no heartbeat for `stale_after`
+        seconds) back in the queue, or fail them once out of attempts. Each
+        affected job's subscribers get a status event with the commit.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=stale_after)
+        last_seen = func.coalesce(WorkoutJob.heartbeat_at, WorkoutJob.started_at)
+        stale = (WorkoutJob.status == WorkoutJobStatus.processing) & (last_seen < cutoff)
+        try:
+            failed = (await self.session.execute(
+                update(WorkoutJob)
+                .where(stale & (WorkoutJob.attempts >= WORKOUT_JOB_MAX_ATTEMPTS))
+                .values(status=WorkoutJobStatus.failed, error="Job timed out", finished_at=datetime.now(timezone.utc))
+                .returning(WorkoutJob.id)
+            )).scalars().all()
+            requeued = (await self.session.execute(
+                update(WorkoutJob)
+                .where(stale & (WorkoutJob.attempts < WORKOUT_JOB_MAX_ATTEMPTS))
+                .values(status=WorkoutJobStatus.queued, worker_id=None)
+                .returning(WorkoutJob.id)
+            )).scalars().all()
+            for job_id in failed:
+                await publish_job_event(self.session, job_id, {"status": WorkoutJobStatus.failed.value, "error": "Job timed out"})
+            for job_id in requeued:
+                await publish_job_event(self.session, job_id, {"status": WorkoutJobStatus.queued.value})
+            await self.session.commit()
+            if failed or requeued:
+                self.logger.info(f"Stale jobs: {len(requeued)} requeued, {len(failed)} failed")
+            return len(requeued)
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error requeueing stale jobs: {e}")
+            return 0
+
+    async def usage_summary(self, hours: float = 24) -> dict:
+        """
+        Per finished status over the last `hours`: job count, generation time
+        percentiles and the LLM tokens (cached ones too), cost and retries recorded on the jobs.
+        The window is capped at JOB_USAGE_MAX_HOURS.
+        """
+        since = datetime.now(timezone.utc) - timedelta(hours=min(hours, JOB_USAGE_MAX_HOURS))
+        duration = func.extract("epoch", WorkoutJob.finished_at - WorkoutJob.started_at)
+        query = (
+            select(
+                WorkoutJob.status,
+                func.count(),
+                func.percentile_cont(0.5).within_group(duration),
+                func.percentile_cont(0.95).within_group(duration),
+                func.sum(WorkoutJob.metrics["calls"].as_integer()),
+                func.sum(WorkoutJob.metrics["retries"].as_integer()),
+                func.sum(WorkoutJob.metrics["prompt_tokens"].as_integer()),
+                func.sum(WorkoutJob.metrics["cached_tokens"].as_integer()),
+                func.sum(WorkoutJob.metrics["completion_tokens"].as_integer()),
+                func.sum(WorkoutJob.metrics["cost"].as_float()),
+                func.sum(WorkoutJob.metrics["llm_seconds"].as_float())
+            )
+            .where(WorkoutJob.finished_at >= since)
+            .group_by(WorkoutJob.status)
+        )
+        try:
+            rows = (await self.session.execute(query)).all()
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error summarizing job usage: {e}")
+            return {}
+        return {
+            status.value: {
+                "jobs": jobs,
+                "p50_seconds": round(p50 or 0, 3),
+                "p95_seconds": round(p95 or 0, 3),
+                "llm_calls": calls or 0,
+                "retries": retries or 0,
+                "prompt_tokens": prompt_tokens or 0,
+                "cached_tokens": cached or 0,
+                "completion_tokens": completion_tokens or 0,
+                "cost": round(cost or 0, 6),
+                "llm_seconds": round(llm_seconds or 0, 3)
+            }
+            for status, jobs, p50, p95, calls, retries, prompt_tokens, cached, completion_tokens, cost, llm_seconds in rows
+        }
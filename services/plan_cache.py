@@ -0,0 +1,191 @@
+"""
+Content-addressed cache of generated plans.
+
+Plans depend on a handful of profile fields, so users whose normalized
+profiles match can share one generated plan. The fingerprint covers the enum
+fields, bucketed age/weight/height, normalized notes, the weekday the plan
+starts on (workouts are scheduled on weekdays) and the prompt templates in
+use. A hit is re-dated to the requested start date and skips the LLM.
+
+Plans are shared between users, so nothing personal is stored: the coach
+notes (which state the user's BMI) are dropped on the way in and written
+afresh for the requesting user on every hit.
+"""
+from datetime import date, datetime, timedelta, timezone
+import hashlib, math, os, re
+import orjson
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.env_vars import load_config
+from config.my_logger import get_logger
+from models.models import PlanCacheEntry
+from sherlock_ai.local_engine import bmi_summary
+from utils.metrics import register_metrics_source
+
+load_config()
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "true").lower() == "true"
+# bucket widths for numeric profile fields, 0 leaves the field out of the fingerprint
+PLAN_CACHE_AGE_BUCKET = float(os.getenv("PLAN_CACHE_AGE_BUCKET", "5"))
+PLAN_CACHE_WEIGHT_BUCKET = float(os.getenv("PLAN_CACHE_WEIGHT_BUCKET", "5"))
+PLAN_CACHE_HEIGHT_BUCKET = float(os.getenv("PLAN_CACHE_HEIGHT_BUCKET", "5"))
+# notes in the fingerprint: "normalize" (case/punctuation-insensitive match), "ignore", or "bypass" (never cache profiles with notes)
+PLAN_CACHE_NOTES = os.getenv("PLAN_CACHE_NOTES", "normalize").lower()
+# cached plans older than this many days are generated afresh
+PLAN_CACHE_MAX_AGE_DAYS = int(os.getenv("PLAN_CACHE_MAX_AGE_DAYS", "30"))
+
+# notes that say nothing
+EMPTY_NOTES = {"", "none", "n a", "na", "no", "nothing", "no notes provided"}
+
+
+class PlanCacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stored = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "stored": self.stored,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+plan_cache_stats = PlanCacheStats()
+register_metrics_source("plan_cache", plan_cache_stats.stats)
+
+
+def bucket(value, width: float):
+    if value is None or width <= 0:
+        return None
+    return math.floor(float(value) / width) * width
+
+
+def normalize_notes(notes: str | None) -> str:
+    text = re.sub(r"[^a-z0-9]+", " ", (notes or "").lower()).strip()
+    return "" if text in EMPTY_NOTES else text
+
+
+def normalized_profile(user_dict: dict, prompt_version: str) -> dict | None:
+    """The profile fields a plan depends on, or None if this profile must not be cached."""
+    notes = normalize_notes(user_dict.get("notes"))
+    if notes and PLAN_CACHE_NOTES == "bypass":
+        return None
+    return {
+        "gender": user_dict.get("gender"),
+        "fitness_level": user_dict.get("fitnessLevel"),
+        "fitness_goal": user_dict.get("fitnessGoal"),
+        "workout_location": user_dict.get("workoutLocation"),
+        "days": sorted(user_dict.get("daysAvailability") or []),
+        "equipment": sorted(user_dict.get("equipmentAvailability") or []),
+        "age": bucket(user_dict.get("age"), PLAN_CACHE_AGE_BUCKET),
+        "weight": bucket(user_dict.get("weight"), PLAN_CACHE_WEIGHT_BUCKET),
+        "height": bucket(user_dict.get("height"), PLAN_CACHE_HEIGHT_BUCKET),
+        "notes": notes if PLAN_CACHE_NOTES == "normalize" else None,
+        "start_weekday": date.fromisoformat(user_dict["start_date"]).weekday(),
+        "prompts": prompt_version
+    }
+
+
+def plan_fingerprint(user_dict: dict, prompt_version: str) -> tuple[str | None, dict | None]:
+    """(fingerprint, normalized profile), or (None, None) when the cache doesn't apply."""
+    if not PLAN_CACHE_ENABLED:
+        return None, None
+    profile = normalized_profile(user_dict, prompt_version)
+    if profile is None:
+        plan_cache_stats.bypassed += 1
+        return None, None
+    return hashlib.sha256(orjson.dumps(profile, option=orjson.OPT_SORT_KEYS)).hexdigest(), profile
+
+
+def shareable_plan(plan: dict) -> dict:
+    """The plan without the parts written for the user it was generated for."""
+    return {key: value for key, value in plan.items() if key not in ("user_id", "notes_from_coach")}
+
+
+def split_summary(plan: dict) -> str:
+    """'Mon Push, Wed Pull, ...' from the plan's first week."""
+    split = {}
+    for day in plan["plan"][:7]:
+        if day.get("type") == "workout" and day.get("workout"):
+            weekday = date.fromisoformat(day["date"]).strftime("%a")
+            split.setdefault(weekday, day["workout"].get("focus", ""))
+    return ", ".join(f"{weekday} {focus}" for weekday, focus in split.items())
+
+
+def redate_plan(plan: dict, user_dict: dict) -> dict:
+    """
+    Copy of a cached plan for the requesting user: moved to their start date
+    (days keep their offsets, and weekdays) with coach notes from their own
+    profile.
+    """
+    start_date = user_dict["start_date"]
+    shift = date.fromisoformat(start_date) - date.fromisoformat(plan["start_date"])
+    redated = {
+        **plan,
+        "user_id": user_dict["id"],
+        "start_date": start_date,
+        "plan": [
+            {**day, "date": (date.fromisoformat(day["date"]) + shift).isoformat()}
+            for day in plan["plan"]
+        ]
+    }
+    redated["notes_from_coach"] = (
+        f"{bmi_summary(user_dict)}Split: {split_summary(redated)}. "
+        "Log actuals and add weight when you hit the top of the rep range. "
+        "Recovery: sleep 7-9h, stay hydrated, stretch after every session."
+    )
+    return redated
+
+
+class PlanCacheService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.logger = get_logger(__name__, self.__class__.__name__)
+
+    async def get(self, fingerprint: str) -> dict | None:
+        """The cached plan for a fingerprint (as generated, not re-dated), counting the hit."""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=PLAN_CACHE_MAX_AGE_DAYS)
+        try:
+            result = await self.session.execute(
+                select(PlanCacheEntry.plan)
+                .where(PlanCacheEntry.fingerprint == fingerprint, PlanCacheEntry.created_at >= cutoff)
+            )
+            plan = result.scalar_one_or_none()
+            if plan is None:
+                plan_cache_stats.misses += 1
+                return None
+
+            await self.session.execute(
+                update(PlanCacheEntry)
+                .where(PlanCacheEntry.fingerprint == fingerprint)
+                .values(hits=PlanCacheEntry.hits + 1, last_used_at=datetime.now(timezone.utc))
+            )
+            await self.session.commit()
+            plan_cache_stats.hits += 1
+            return plan
+        except Exception as e:
+            await self.session.rollback()
+            plan_cache_stats.misses += 1
+            self.logger.error(f"Error reading plan cache {fingerprint}: {e}")
+            return None
+
+    async def put(self, fingerprint: str, profile: dict, plan: dict) -> None:
+        statement = insert(PlanCacheEntry).values(fingerprint=fingerprint, profile=profile, plan=shareable_plan(plan), hits=0)
+        try:
+            # an expired entry for the same profile is replaced
+            await self.session.execute(statement.on_conflict_do_update(
+                index_elements=[PlanCacheEntry.fingerprint],
+                set_={"profile": statement.excluded.profile, "plan": statement.excluded.plan, "hits": 0, "created_at": datetime.now(timezone.utc)}
+            ))
+            await self.session.commit()
+            plan_cache_stats.stored += 1
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error storing plan cache {fingerprint}: {e}")
@@ -0,0 +1,106 @@
+from dataclasses import dataclass
+import os
+from cachetools import TTLCache
+
+from config.env_vars import load_config
+from models.models import User
+from utils.metrics import register_metrics_source
+
+load_config()
+# users kept in memory per process
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# seconds a cached user is trusted; bounds staleness from changes made by other processes
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """
+    Read-only snapshot of a User row, safe to share between requests.
+    Has the same attributes as User (minus the password hash), so helpers like
+    user_to_dict and is_user_done_onboarding accept either.
+    """
+    id: int
+    email: str
+    name: str
+    age: int | None
+    gender: object
+    height: int | None
+    weight: float | None
+    fitness_level: object
+    fitness_goal: object
+    work_out_location: object
+    days_availability: tuple | None
+    equipment_availability: tuple | None
+    notes: str | None
+
+    @classmethod
+    def from_user(cls, user: User) -> "CachedUser":
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.name,
+            age=user.age,
+            gender=user.gender,
+            height=user.height,
+            weight=user.weight,
+            fitness_level=user.fitness_level,
+            fitness_goal=user.fitness_goal,
+            work_out_location=user.work_out_location,
+            days_availability=tuple(user.days_availability) if user.days_availability is not None else None,
+            equipment_availability=tuple(user.equipment_availability) if user.equipment_availability is not None else None,
+            notes=user.notes
+        )
+
+
+class UserCache:
+    """Bounded LRU + TTL cache of user snapshots, looked up by email or id."""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.by_email: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.by_id: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, cache: TTLCache, key) -> CachedUser | None:
+        user = cache.get(key)
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+
+    def get_by_email(self, email: str) -> CachedUser | None:
+        return self._lookup(self.by_email, email)
+
+    def get_by_id(self, user_id: int) -> CachedUser | None:
+        return self._lookup(self.by_id, user_id)
+
+    def put(self, user: User) -> CachedUser:
+        cached = CachedUser.from_user(user)
+        self.by_email[cached.email] = cached
+        self.by_id[cached.id] = cached
+        return cached
+
+    def invalidate(self, user_id: int | None = None, email: str | None = None) -> None:
+        cached = self.by_id.pop(user_id, None) if user_id is not None else None
+        if cached is not None:
+            self.by_email.pop(cached.email, None)
+        if email is not None:
+            cached = self.by_email.pop(email, None)
+            if cached is not None:
+                self.by_id.pop(cached.id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.by_id),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# one cache per process
+user_cache = UserCache()
+register_metrics_source("user_cache", user_cache.stats)
@@ -1,8 +1,9 @@
-from sqlalchemy import select
+from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.models import User
 from config.my_logger import get_logger
+from services.user_cache import CachedUser, user_cache
 
 class UserService:
     def __init__(self, session: AsyncSession):
@@ -20,6 +21,16 @@ class UserService:
             self.logger.error(f"Error fetching user by email: {e}")
             return None
         
+    async def get_cached_user_by_email(self, email: str) -> CachedUser | None:
+        """Read-only user snapshot, served from the process cache when possible."""
+        if email is None:
+            return None
+        cached = user_cache.get_by_email(email)
+        if cached is not None:
+            return cached
+        user = await self.get_user_by_email(email)
+        return user_cache.put(user) if user is not None else None
+
     async def get_user_by_id(self, user_id: int) -> User | None:
         try:
             result = await self.session.execute(
@@ -36,6 +47,7 @@ class UserService:
         try:
             await self.session.commit()
             await self.session.refresh(user)
+            user_cache.invalidate(user_id=user.id, email=user.email)
             return user
         except Exception as e:
             await self.session.rollback()
@@ -46,8 +58,21 @@ class UserService:
         try:
             await self.session.commit()
             await self.session.refresh(user)
+            user_cache.invalidate(user_id=user.id, email=user.email)
             return user
         except Exception as e:
             await self.session.rollback()
             self.logger.error(f"Error updating user: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    async def delete_user(self, user_id: int, email: str | None = None) -> bool:
+        """Delete a user; their programs, days and jobs go with it via ON DELETE CASCADE."""
+        try:
+            await self.session.execute(delete(User).where(User.id == user_id))
+            await self.session.commit()
+            user_cache.invalidate(user_id=user_id, email=email)
+            return True
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error deleting user {user_id}: {e}")
+            return False
\ No newline at end of file
@@ -0,0 +1,63 @@
+import os
+from cachetools import LRUCache
+
+from config.env_vars import load_config
+from utils.helpers import workout_program_to_dict
+from utils.metrics import register_metrics_source
+from utils.responses import dump_json
+
+load_config()
+# memory budget for serialized program responses, per process
+WORKOUT_CACHE_MAX_BYTES = int(os.getenv("WORKOUT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def serialize_workout_response(workout_program) -> bytes:
+    """The exact get-user-workout success body for a program."""
+    return dump_json({"status": "success", "workout": workout_program_to_dict(workout_program)})
+
+
+class WorkoutProgramCache:
+    """
+    LRU of ready-to-send get-user-workout response bodies, keyed by
+    (program id, version). A program that changes gets a new version and
+    therefore a new key, so stale bodies are never served; evict() frees
+    the old entry early.
+    """
+
+    def __init__(self, max_bytes: int = WORKOUT_CACHE_MAX_BYTES):
+        self.bodies: LRUCache = LRUCache(maxsize=max_bytes, getsizeof=len)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, workout_program_id: int, version: int) -> bytes | None:
+        body = self.bodies.get((workout_program_id, version))
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def put(self, workout_program_id: int, version: int, body: bytes) -> None:
+        # a single body bigger than the whole budget is simply not cached
+        if len(body) <= self.bodies.maxsize:
+            self.bodies[(workout_program_id, version)] = body
+
+    def evict(self, workout_program_id: int) -> None:
+        for key in [key for key in self.bodies.keys() if key[0] == workout_program_id]:
+            self.bodies.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.bodies),
+            "bytes": self.bodies.currsize,
+            "max_bytes": self.bodies.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# one cache per process
+workout_program_cache = WorkoutProgramCache()
+register_metrics_source("workout_program_cache", workout_program_cache.stats)
@@ -0,0 +1,112 @@
+"""
+Bulk persistence of generated workout programs.
+
+Writes a program and all of its days with set-based statements instead of
+one ORM object per day, for both plan generation and batch imports.
+"""
+from datetime import datetime
+from types import SimpleNamespace
+import json
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import WorkoutProgram, WorkoutDay, WorkoutDayType
+
+WORKOUT_DAY_COLUMNS = ("workout_program_id", "day_sequence", "date", "workout_day_type", "workout_details")
+
+
+def workout_program_row(user_id: int, workout_plan: dict, engine: str | None = None) -> dict:
+    return {
+        "user_id": int(user_id),
+        "start_date": datetime.strptime(workout_plan["start_date"], "%Y-%m-%d").date(),
+        "total_days": workout_plan["total_days"],
+        "notes_from_coach": workout_plan.get("notes_from_coach", ""),
+        "engine": engine
+    }
+
+
+def workout_day_rows(workout_program_id: int, plan_days: list[dict]) -> list[dict]:
+    rows = []
+    for day_data in plan_days:
+        day_type = WorkoutDayType.workout if day_data["type"].lower() == "workout" else WorkoutDayType.rest
+        rows.append({
+            "workout_program_id": workout_program_id,
+            "day_sequence": day_data["day"],
+            "date": datetime.strptime(day_data["date"], "%Y-%m-%d").date(),
+            "workout_day_type": day_type,
+            "workout_details": day_data.get("workout") if day_type == WorkoutDayType.workout else None
+        })
+    return rows
+
+
+def workout_program_snapshot(workout_program_id: int, user_id: int, workout_plan: dict, version: int = 1, engine: str | None = None) -> SimpleNamespace:
+    """
+    Stand-in for a freshly inserted WorkoutProgram (with days) built from the
+    plan itself, for serializing it without reading it back.
+    """
+    return SimpleNamespace(
+        id=workout_program_id,
+        version=version,
+        days=[SimpleNamespace(**row) for row in workout_day_rows(workout_program_id, workout_plan["plan"])],
+        **workout_program_row(user_id, workout_plan, engine)
+    )
+
+
+async def bulk_insert_workout_programs(
+    session: AsyncSession,
+    workout_plans: list[tuple[int, dict]],
+    use_copy: bool = False,
+    engine: str | None = None
+) -> list[int]:
+    """
+    Insert programs for `(user_id, workout_plan)` pairs and return their ids in input order.
+    `engine` records what generated the plans ("ai", "local" or "local_fallback").
+
+    Programs go in with one multi-row INSERT ... RETURNING. Days go in with one
+    multi-row INSERT, or with asyncpg's COPY when `use_copy` is set (faster for
+    large imports). Runs on the session's transaction; the caller commits.
+    """
+    if not workout_plans:
+        return []
+
+    result = await session.execute(
+        insert(WorkoutProgram).returning(WorkoutProgram.id, sort_by_parameter_order=True),
+        [workout_program_row(user_id, plan, engine) for user_id, plan in workout_plans]
+    )
+    program_ids = list(result.scalars())
+
+    day_rows = []
+    for program_id, (_, plan) in zip(program_ids, workout_plans):
+        day_rows.extend(workout_day_rows(program_id, plan["plan"]))
+
+    if not day_rows:
+        return program_ids
+
+    if use_copy:
+        await copy_workout_days(session, day_rows)
+    else:
+        await session.execute(insert(WorkoutDay), day_rows)
+    return program_ids
+
+
+async def copy_workout_days(session: AsyncSession, day_rows: list[dict]) -> None:
+    """Stream day rows into fitness.workout_days with COPY on the session's own connection."""
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    records = [
+        (
+            row["workout_program_id"],
+            row["day_sequence"],
+            row["date"],
+            # enum columns store the member name, jsonb is sent as text
+            row["workout_day_type"].name,
+            json.dumps(row["workout_details"]) if row["workout_details"] is not None else None
+        )
+        for row in day_rows
+    ]
+    await raw_connection.driver_connection.copy_records_to_table(
+        WorkoutDay.__tablename__,
+        schema_name=WorkoutDay.__table__.schema,
+        columns=WORKOUT_DAY_COLUMNS,
+        records=records
+    )
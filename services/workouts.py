@@ -1,26 +1,122 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import BackgroundTasks
-from datetime import datetime
-import asyncio
-import json
-from sqlalchemy import select
+from datetime import date, datetime
+import asyncio, hashlib, os, socket
+import orjson
+from sqlalchemy import delete, func, select
 from sqlalchemy.orm import selectinload
 
+from config.env_vars import load_config
 from config.my_logger import get_logger
-from models.models import WorkoutProgram, User, WorkoutDay, WorkoutDayType
-from utils.helpers import user_to_dict
-from sherlock_ai.model import SherlockAI
+from models.models import WorkoutDay, WorkoutProgram, User, WorkoutJobStatus
+from utils.helpers import (
+    user_to_dict, workout_day_summary_to_dict, workout_day_to_dict, workout_job_to_dict, workout_program_to_dict
+)
+from sherlock_ai.local_engine import generate_local_plan
+from sherlock_ai.model import WorkoutPlan, get_sherlock_ai
+from sherlock_ai.usage import PlanUsage
 from db.session_manager import session_manager
-from concurrent.futures import ThreadPoolExecutor
+from services.jobs import JOB_PRIORITY_SPECULATIVE, WORKOUT_JOB_HEARTBEAT_INTERVAL, JobCancelled, JobClaim, JobService
+from services.plan_cache import PlanCacheService, plan_fingerprint, redate_plan
+from services.workout_cache import workout_program_cache, serialize_workout_response
+from services.workout_persistence import bulk_insert_workout_programs, workout_program_snapshot
+from utils.metrics import register_metrics_source
+
+load_config()
+# run queued jobs inside the API process too. set to false once dedicated workers (worker.py) are running
+WORKOUT_JOB_INLINE = os.getenv("WORKOUT_JOB_INLINE", "true").lower() == "true"
+# plan generator for requests that don't pick one: "ai" (the LLM) or "local" (rule-based, instant)
+PLAN_ENGINE = os.getenv("PLAN_ENGINE", "ai").lower()
+# seconds the LLM gets before the local engine answers instead, 0 waits for the LLM
+PLAN_LLM_LATENCY_BUDGET = float(os.getenv("PLAN_LLM_LATENCY_BUDGET", "0"))
+# when the local engine answers instead of the LLM: "timeout" (only past PLAN_LLM_LATENCY_BUDGET),
+# "always" (on LLM errors too) or "off". the plan records which engine made it
+PLAN_LOCAL_FALLBACK = os.getenv("PLAN_LOCAL_FALLBACK", "timeout").lower()
+PLAN_ENGINES = ("ai", "local")
+# engine of a program the local engine made because the LLM didn't answer
+FALLBACK_ENGINE = "local_fallback"
+# pre-generate a low-priority plan as soon as a user finishes onboarding
+WORKOUT_SPECULATIVE_JOBS = os.getenv("WORKOUT_SPECULATIVE_JOBS", "true").lower() == "true"
+
+
+class PlanEngineStats:
+    def __init__(self):
+        self.local = 0
+        self.fallback_timeouts = 0
+        self.fallback_errors = 0
+
+    def stats(self) -> dict:
+        return {
+            "local": self.local,
+            "fallback_timeouts": self.fallback_timeouts,
+            "fallback_errors": self.fallback_errors
+        }
+
+
+plan_engine_stats = PlanEngineStats()
+register_metrics_source("plan_engine", plan_engine_stats.stats)
+
+
+class SpeculativeJobStats:
+    def __init__(self):
+        self.queued = 0
+        self.deduplicated = 0
+        self.adopted = 0
+        self.cancelled = 0
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "deduplicated": self.deduplicated,
+            "adopted": self.adopted,
+            "cancelled": self.cancelled
+        }
+
+
+speculative_job_stats = SpeculativeJobStats()
+register_metrics_source("speculative_jobs", speculative_job_stats.stats)
+
+
+class WorkoutExists(Exception):
+    """The user already has a program and the caller asked not to generate another."""
+
+
+class PlanRequestStats:
+    def __init__(self):
+        self.replayed = 0
+        self.attached = 0
+
+    def stats(self) -> dict:
+        return {
+            "replayed": self.replayed,
+            "attached": self.attached
+        }
+
+
+plan_request_stats = PlanRequestStats()
+register_metrics_source("plan_requests", plan_request_stats.stats)
+
+
+def plan_payload(user: User, start_date: str | None = None, engine: str | None = None) -> dict:
+    """Job payload for the user's plan: their details plus start date (today unless given) and plan generator."""
+    user_dict = user_to_dict(user)
+    user_dict["start_date"] = start_date or datetime.now().strftime("%Y-%m-%d")
+    # plan generator picked by the client, if it's one we know
+    user_dict["engine"] = engine if engine in PLAN_ENGINES else PLAN_ENGINE
+    return user_dict
+
+
+def profile_hash(user_dict: dict) -> str:
+    """Hash of the profile fields a plan is generated from, to tell whether a speculative plan is still current."""
+    profile = {key: value for key, value in user_dict.items() if key not in ("email", "start_date", "engine")}
+    return hashlib.sha256(orjson.dumps(profile, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
 
 class WorkoutService:
-    # Class-level dictionary to share job status across instances
-    jobs = {}
-    
     def __init__(self, session: AsyncSession):
         self.session = session
         self.logger = get_logger(__name__, self.__class__.__name__)
-        self.ai = SherlockAI()
+        self.ai = get_sherlock_ai()
 
     async def get_user_workout(self, user_id: int):
         try:
@@ -29,6 +125,7 @@ class WorkoutService:
                 select(WorkoutProgram)
                 .options(selectinload(WorkoutProgram.days))
                 .where(WorkoutProgram.user_id == user_id)
+                .order_by(WorkoutProgram.id)
             )
             workout = result.scalars().first()
             return workout
@@ -36,9 +133,77 @@ class WorkoutService:
             self.logger.error(f"Error getting workout for user {user_id}: {e}")
             return None
 
-    async def create_user_workout(self, user_id: int, backgroundTasks: BackgroundTasks):
+    async def get_user_workout_version(self, user_id: int) -> tuple[int, int] | None:
+        """(program id, version) of the user's program, without loading any days."""
+        try:
+            result = await self.session.execute(
+                select(WorkoutProgram.id, WorkoutProgram.version)
+                .where(WorkoutProgram.user_id == user_id)
+                .order_by(WorkoutProgram.id)
+                .limit(1)
+            )
+            row = result.first()
+            return (row.id, row.version) if row else None
+        except Exception as e:
+            self.logger.error(f"Error getting workout version for user {user_id}: {e}")
+            return None
+
+    async def get_workout_days(self, workout_program_id: int, start: date, end: date, details: bool = True) -> list[dict] | None:
+        """
+        The program's days from `start` to `end` (inclusive), in date order.
+        With details=False each day is a summary (focus, duration, number of
+        exercises) read out of the JSONB in the query, so the full workout
+        details never leave the database.
+        """
+        try:
+            in_range = (
+                (WorkoutDay.workout_program_id == workout_program_id)
+                & (WorkoutDay.date >= start)
+                & (WorkoutDay.date <= end)
+            )
+            if details:
+                result = await self.session.execute(select(WorkoutDay).where(in_range).order_by(WorkoutDay.date))
+                return [workout_day_to_dict(day) for day in result.scalars().all()]
+
+            workout = WorkoutDay.workout_details
+            result = await self.session.execute(
+                select(
+                    WorkoutDay.day_sequence,
+                    WorkoutDay.date,
+                    WorkoutDay.workout_day_type,
+                    workout["focus"].astext.label("focus"),
+                    workout["estimated_duration"].astext.label("estimated_duration"),
+                    func.jsonb_array_length(workout["exercises"]).label("exercise_count")
+                )
+                .where(in_range)
+                .order_by(WorkoutDay.date)
+            )
+            return [workout_day_summary_to_dict(row) for row in result.all()]
+        except Exception as e:
+            self.logger.error(f"Error getting days {start}..{end} of workout program {workout_program_id}: {e}")
+            return None
+
+    async def create_user_workout(
+        self, user_id: int, backgroundTasks: BackgroundTasks, start_date: str | None = None,
+        engine: str | None = None, idempotency_key: str | None = None, only_if_no_workout: bool = False
+    ):
+        """
+        Queue a plan for the user and return the job id. Creation is idempotent:
+        a request repeating an earlier one's `idempotency_key` gets that job
+        back, and a request for a profile that already has a plan (on the way,
+        or generated and saved) gets that plan's job instead of starting
+        another generation. With `only_if_no_workout`, raises WorkoutExists
+        when the user already has any other program.
+        """
         try:
             self.logger.info(f"Creating workout for user {user_id}")
+            jobs = JobService(self.session)
+
+            if idempotency_key is not None:
+                job = await jobs.get_job_by_idempotency_key(user_id, idempotency_key)
+                if job is not None:
+                    plan_request_stats.replayed += 1
+                    return job.id
             
             user = await self.session.get(User, user_id)
             
@@ -46,85 +211,276 @@ class WorkoutService:
                 self.logger.error(f"User {user_id} not found")
                 return None
 
-            user_dict = user_to_dict(user)
-
-            # add date today to user_dict
-            user_dict["start_date"] = datetime.now().strftime("%Y-%m-%d")
+            user_dict = plan_payload(user, start_date, engine)
             self.logger.info(f"CREATING WORKOUT FOR USER: {user_dict['name']} DATE: {user_dict['start_date']}")
 
             self.logger.info(f"User {user_id} found: {user_dict}")
 
-            job_id = f"job_{user.id}_{int(datetime.utcnow().timestamp())}"
-            WorkoutService.jobs[job_id] = {"status": "processing"}
-            self.logger.info(f"Created job {job_id} for user {user_id}")
+            # a plan pre-generated at onboarding for this same profile is handed over instead
+            adopted_job_id = await self.adopt_speculative_job(user_dict, idempotency_key)
+            if adopted_job_id is not None:
+                return adopted_job_id
 
-            backgroundTasks.add_task(self.generate_plan_task, job_id, user_dict)
+            # check-then-create under the user's lock; create_job's commit releases it
+            profile = profile_hash(user_dict)
+            await jobs.lock_user_jobs(user_id)
+            job = await jobs.get_job_by_idempotency_key(user_id, idempotency_key) if idempotency_key is not None else None
+            if job is not None:
+                plan_request_stats.replayed += 1
+                await self.session.commit()
+                return job.id
+            job = await jobs.get_generation(user_id, profile)
+            if job is not None:
+                plan_request_stats.attached += 1
+                self.logger.info(f"Attached request to job {job.id} ({job.status.value}) for user {user_id}")
+                await self.session.commit()
+                return job.id
+            if only_if_no_workout and await self.get_user_workout_version(user_id) is not None:
+                await self.session.commit()
+                raise WorkoutExists(user_id)
 
-            return job_id
+            job = await jobs.create_job(user.id, user_dict, profile_hash=profile, idempotency_key=idempotency_key)
+            if job is None:
+                # the unique indexes turned away a job that raced past the lock (a promoted speculative one)
+                job = await jobs.get_generation(user_id, profile)
+                return job.id if job is not None else None
+            self.logger.info(f"Created job {job.id} for user {user_id}")
+
+            if WORKOUT_JOB_INLINE:
+                backgroundTasks.add_task(run_next_job, INLINE_WORKER_ID, job.id)
+
+            return job.id
+        except WorkoutExists:
+            raise
         except Exception as e:
+            await self.session.rollback()
             self.logger.error(f"Error creating workout for user {user_id}: {e}")
             return None
 
-    def get_job_status(self, job_id: str):
+    async def speculate_user_workout(self, user: User, backgroundTasks: BackgroundTasks, onboarding_finished: bool) -> str | None:
+        """
+        Queue a low-priority plan for a user who just finished onboarding, so
+        it is ready (or under way) by the time they ask for one. Later profile
+        updates replace it: the old speculative job is cancelled and its plan,
+        if already saved, deleted. An update that leaves the plan's inputs
+        unchanged keeps the job. Returns the speculative job's id, if any.
+        """
+        if not WORKOUT_SPECULATIVE_JOBS:
+            return None
+        try:
+            jobs = JobService(self.session)
+            speculative = await jobs.speculative_jobs(user.id)
+            if not onboarding_finished and not speculative:
+                return None
+
+            user_dict = plan_payload(user)
+            profile = profile_hash(user_dict)
+            if speculative and speculative[0].profile_hash == profile:
+                speculative_job_stats.deduplicated += 1
+                return speculative[0].id
+            # a plan the user asked for themselves is never replaced
+            if not speculative and await self.get_user_workout_version(user.id) is not None:
+                return None
+
+            speculative_job_stats.cancelled += len(speculative)
+            await self.cancel_speculative_jobs(user.id)
+            job = await jobs.create_job(user.id, user_dict, priority=JOB_PRIORITY_SPECULATIVE, profile_hash=profile)
+            if job is None:
+                return None
+            speculative_job_stats.queued += 1
+            self.logger.info(f"Queued speculative job {job.id} for user {user.id}")
+
+            if WORKOUT_JOB_INLINE:
+                # no job id: claim whatever is most urgent, a plan someone asked for goes first
+                backgroundTasks.add_task(run_next_job, INLINE_WORKER_ID)
+            return job.id
+        except Exception as e:
+            self.logger.error(f"Error queueing speculative workout for user {user.id}: {e}")
+            return None
+
+    async def adopt_speculative_job(self, user_dict: dict, idempotency_key: str | None = None) -> str | None:
+        """
+        Hand the user's speculative job over as the plan they asked for, if it
+        was generated from the same profile. A queued job takes the request's
+        start date and engine; a started or finished one is only kept if they
+        match. Anything that doesn't fit is cancelled. Returns the job id.
+        """
+        if not WORKOUT_SPECULATIVE_JOBS:
+            return None
+        user_id = int(user_dict["id"])
+        jobs = JobService(self.session)
+        speculative = await jobs.speculative_jobs(user_id)
+        if not speculative:
+            return None
+
+        job = speculative[0]
+        if job.profile_hash == profile_hash(user_dict):
+            if job.status == WorkoutJobStatus.queued:
+                adopted = await jobs.promote_job(job.id, payload=user_dict, idempotency_key=idempotency_key)
+            else:
+                same_plan = all(job.payload.get(key) == user_dict[key] for key in ("start_date", "engine"))
+                adopted = same_plan and await jobs.promote_job(job.id, idempotency_key=idempotency_key)
+            if adopted:
+                speculative_job_stats.adopted += 1
+                self.logger.info(f"Adopted speculative job {job.id} for user {user_id}")
+                return job.id
+
+        speculative_job_stats.cancelled += len(speculative)
+        await self.cancel_speculative_jobs(user_id)
+        return None
+
+    async def cancel_speculative_jobs(self, user_id: int) -> None:
+        """Cancel the user's speculative jobs and delete the plans they already saved."""
+        program_ids = await JobService(self.session).cancel_speculative_jobs(user_id)
+        if not program_ids:
+            return
+        try:
+            # days go with the program (ON DELETE CASCADE)
+            await self.session.execute(delete(WorkoutProgram).where(WorkoutProgram.id.in_(program_ids)))
+            await self.session.commit()
+            for program_id in program_ids:
+                workout_program_cache.evict(program_id)
+        except Exception as e:
+            await self.session.rollback()
+            self.logger.error(f"Error deleting speculative programs {program_ids} of user {user_id}: {e}")
+
+    async def get_job_status(self, job_id: str, user_id: int | None = None) -> dict:
         """Get the status of a workout generation job"""
-        return WorkoutService.jobs.get(job_id, {"status": "not_found"})
+        job = await JobService(self.session).get_job(job_id)
+        if job is None or (user_id is not None and job.user_id != user_id):
+            return {"status": "not_found"}
 
-    async def generate_plan_task(self, job_id: str, user_dict: dict):
+        job_status = workout_job_to_dict(job)
+        if job.status == WorkoutJobStatus.completed and job.workout_program_id is not None:
+            result = await self.session.execute(
+                select(WorkoutProgram)
+                .options(selectinload(WorkoutProgram.days))
+                .where(WorkoutProgram.id == job.workout_program_id)
+            )
+            job_status["workout_plan"] = workout_program_to_dict(result.scalar_one_or_none())
+        return job_status
+
+    async def report_progress(self, claim: JobClaim, progress: dict):
+        async with session_manager.async_session() as session:
+            running = await JobService(session).update_progress(claim, progress)
+        if not running:
+            # stops the generation at its next progress report
+            raise JobCancelled(claim.job_id)
+
+    async def keep_alive(self, claim: JobClaim):
+        """Heartbeat of a running job, so the stale sweep leaves it alone. Ends once the claim is lost."""
+        while True:
+            await asyncio.sleep(WORKOUT_JOB_HEARTBEAT_INTERVAL)
+            async with session_manager.async_session() as session:
+                if not await JobService(session).heartbeat(claim):
+                    return
+
+    async def generate_llm_plan(self, claim: JobClaim, user_dict: dict, usage: PlanUsage | None = None) -> tuple[WorkoutPlan, str | None]:
+        """
+        (plan, None) from the LLM, or (local plan, reason) when the LLM ran over
+        PLAN_LLM_LATENCY_BUDGET or failed and PLAN_LOCAL_FALLBACK allows
+        answering with the local engine. The LLM calls are recorded in `usage`.
+        """
+        # FOR ACTUAL AI CALL
+        # runs on the event loop, concurrency is bounded inside SherlockAI
+        generation = self.ai.generate_workout_plan(
+            user_dict,
+            on_progress=lambda progress: self.report_progress(claim, progress),
+            usage=usage
+        )
+        try:
+            return await asyncio.wait_for(generation, PLAN_LLM_LATENCY_BUDGET or None), None
+        except Exception as e:
+            timed_out = isinstance(e, asyncio.TimeoutError)
+            if PLAN_LOCAL_FALLBACK != "always" and not (timed_out and PLAN_LOCAL_FALLBACK == "timeout"):
+                raise
+            if timed_out:
+                plan_engine_stats.fallback_timeouts += 1
+                reason = f"no plan within {PLAN_LLM_LATENCY_BUDGET:g}s"
+            else:
+                plan_engine_stats.fallback_errors += 1
+                reason = str(e)
+            self.logger.warning(f"GENERATE_PLAN_TASK - LOCAL FALLBACK:: USER_ID: {user_dict['id']} :: {reason}")
+            return generate_local_plan(user_dict), reason
+
+    async def generate_plan_task(self, claim: JobClaim, user_dict: dict):
+        job_id = claim.job_id
+        usage = PlanUsage()
+        heartbeat = asyncio.create_task(self.keep_alive(claim))
         try:
             self.logger.info(f"GENERATE_PLAN_TASK - START:: USER_ID: {user_dict['id']}")
             
-            # FOR ACTUAL AI CALL
-            # Asign another thread to do ai tasks 
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor() as pool:
-                workout_plan_str = await loop.run_in_executor(pool, self.ai.generate_workout_plan, user_dict)
+            engine = user_dict.get("engine", PLAN_ENGINE)
+            fingerprint, workout_plan, fallback_reason = None, None, None
+            if engine == "local":
+                workout_plan = generate_local_plan(user_dict)
+                plan_engine_stats.local += 1
+            else:
+                # an equivalent profile may already have a plan: re-date it and skip the LLM
+                fingerprint, profile = plan_fingerprint(user_dict, self.ai.registry.version)
+            if fingerprint is not None:
+                async with session_manager.async_session() as session:
+                    cached_plan = await PlanCacheService(session).get(fingerprint)
+                if cached_plan is not None:
+                    self.logger.info(f"GENERATE_PLAN_TASK - PLAN CACHE HIT:: USER_ID: {user_dict['id']}")
+                    workout_plan = redate_plan(cached_plan, user_dict)
+
+            if workout_plan is None:
+                workout_plan, fallback_reason = await self.generate_llm_plan(claim, user_dict, usage)
+                if fallback_reason is not None:
+                    engine = FALLBACK_ENGINE
+                # only LLM plans are shared, a fallback must not stand in for one on later requests
+                elif fingerprint is not None:
+                    async with session_manager.async_session() as session:
+                        await PlanCacheService(session).put(fingerprint, profile, workout_plan)
             
             # FOR TESTING 
             # use this when testing 
-            # workout_plan_str = await self.ai.get_sample_ai_json_response()
-            
-            workout_plan = json.loads(workout_plan_str)
+            # workout_plan = orjson.loads(await self.ai.get_sample_ai_json_response())
 
             async with session_manager.async_session() as session:
-                # Create WorkoutProgram
-                # Parse start_date
-                start_date = datetime.strptime(workout_plan["start_date"], "%Y-%m-%d").date()
-                
-                program = WorkoutProgram(
-                    user_id=int(user_dict['id']),
-                    start_date=start_date,
-                    total_days=workout_plan["total_days"],
-                    notes_from_coach=workout_plan.get("notes_from_coach", "")
-                )
-                session.add(program)
-                await session.flush() # Flush to get the program ID
-
-                # Create WorkoutDays
-                for day_data in workout_plan["plan"]:
-                    day_date = datetime.strptime(day_data["date"], "%Y-%m-%d").date()
-                    day_type_str = day_data["type"].lower()
-                    day_type = WorkoutDayType.workout if day_type_str == "workout" else WorkoutDayType.rest
-                    
-                    workout_details = day_data.get("workout") if day_type == WorkoutDayType.workout else None
-
-                    day = WorkoutDay(
-                        workout_program_id=program.id,
-                        day_sequence=day_data["day"],
-                        date=day_date,
-                        workout_day_type=day_type,
-                        workout_details=workout_details
-                    )
-                    session.add(day)
-                
-                await session.commit()
-                self.logger.info(f"Saved workout program {program.id} with {len(workout_plan['plan'])} days to DB")
-
-            WorkoutService.jobs[job_id] = {"status": "completed", "workout_plan": workout_plan}
+                jobs = JobService(session)
+                # the job row stays locked until the program is saved and the job completed, so a
+                # cancellation or a second claim either comes first (nothing is saved) or sees the program
+                if not await jobs.lock_if_owned(claim):
+                    raise JobCancelled(job_id)
+
+                # program + all days in two statements, committed with the job
+                program_ids = await bulk_insert_workout_programs(session, [(int(user_dict['id']), workout_plan)], engine=engine)
+                program_id = program_ids[0]
+                metrics = {**usage.summary(), "engine": engine}
+                if fallback_reason is not None:
+                    metrics["fallback_reason"] = fallback_reason
+                if not await jobs.complete_job(claim, program_id, metrics=metrics):
+                    raise JobCancelled(job_id)
+                self.logger.info(f"Saved workout program {program_id} with {len(workout_plan['plan'])} days to DB")
+
+                # warm the response cache so the first read after generation is a hit
+                snapshot = workout_program_snapshot(program_id, int(user_dict["id"]), workout_plan, engine=engine)
+                workout_program_cache.put(program_id, snapshot.version, serialize_workout_response(snapshot))
 
             self.logger.info(f"GENERATE_PLAN_TASK - END:: USER_ID: {user_dict['id']}")
-            self.logger.info(f"WORKOUT_PLAN:: USER_ID: {user_dict['id']} :: WORKOUT-DETAILS :: {workout_plan}")
+            self.logger.debug("WORKOUT_PLAN:: USER_ID: %s :: WORKOUT-DETAILS :: %s", user_dict['id'], workout_plan)
+        except JobCancelled:
+            self.logger.info(f"GENERATE_PLAN_TASK - CANCELLED:: USER_ID: {user_dict['id']} :: JOB: {job_id}")
         except Exception as e:
             self.logger.error(f"Error generating workout plan for user {user_dict['id']}: {e}")
-            WorkoutService.jobs[job_id] = {"status": "failed", "error": str(e)}
-            
-        
\ No newline at end of file
+            async with session_manager.async_session() as session:
+                await JobService(session).fail_job(claim, str(e), metrics=usage.summary())
+        finally:
+            heartbeat.cancel()
+
+INLINE_WORKER_ID = f"api-{socket.gethostname()}-{os.getpid()}"
+
+async def run_next_job(worker_id: str, job_id: str | None = None) -> bool:
+    """
+    Claim one queued job (the oldest, or `job_id`) and generate its plan.
+    Returns False when there was nothing to claim. Used by worker.py and by
+    the API itself when WORKOUT_JOB_INLINE is on.
+    """
+    async with session_manager.async_session() as session:
+        job = await JobService(session).claim_job(worker_id, job_id)
+        if job is None:
+            return False
+        await WorkoutService(session).generate_plan_task(JobClaim.of(job), job.payload)
+        return True
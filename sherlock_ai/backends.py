@@ -0,0 +1,426 @@
+"""
+Completion backends behind SherlockAI.
+
+OpenRouterBackend is the real thing. The others stand in for it so the
+whole generation pipeline can run without network access, e.g. for load tests
+and offline development:
+
+- record: OpenRouter, saving every exchange (request, answer, timing) as a
+  JSON file;
+- replay: answers from saved exchanges, at the recorded pace. A request that
+  was never recorded gets a recording of the same prompt template, with its
+  dates moved to the requested start date;
+- synthetic: plans from the local engine, with lognormal latency and a
+  configurable failure rate.
+"""
+import asyncio, hashlib, math, os, random, re, time
+from abc import ABC, abstractmethod
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import AsyncIterator
+import openai
+import orjson
+
+from config.my_logger import get_logger
+from sherlock_ai.compact import COMPACT_MARKER, compact_part
+from sherlock_ai.context import summarize_parts
+
+logger = get_logger(__name__, "sherlock_ai")
+
+BACKEND_OPENROUTER = "openrouter"
+BACKEND_RECORD = "record"
+BACKEND_REPLAY = "replay"
+BACKEND_SYNTHETIC = "synthetic"
+BACKENDS = (BACKEND_OPENROUTER, BACKEND_RECORD, BACKEND_REPLAY, BACKEND_SYNTHETIC)
+
+# characters per chunk when a stand-in streams an answer
+STREAM_CHUNK_CHARS = 64
+# share of the latency spent before the first chunk of a stand-in stream
+FIRST_CHUNK_SHARE = 0.1
+# simulated prompt caching: cache granularity and smallest cacheable prefix (128 and 1024 tokens)
+CACHE_BLOCK_CHARS = 512
+CACHE_MIN_CHARS = 4096
+
+START_DATE = re.compile(r"Start Date: (\d{4}-\d{2}-\d{2})")
+ISO_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+USER_PROFILE = re.compile(r"<user_profile>(.*?)</user_profile>", re.S)
+PART_DAYS = re.compile(r"DAYS (\d+)-(\d+)")
+REPAIR_DAY = re.compile(r"^- day (\d+): ", re.M)
+
+# SherlockAI.convert_user_dict_to_text() labels -> user dict keys
+PROFILE_LABELS = {
+    "id": "id",
+    "Age": "age",
+    "Gender": "gender",
+    "Weight": "weight",
+    "Height": "height",
+    "Fitness Level": "fitnessLevel",
+    "Fitness Goal": "fitnessGoal",
+    "Workout Location": "workoutLocation",
+    "Days Available": "daysAvailability",
+    "Equipment": "equipmentAvailability",
+    "Notes": "notes",
+    "Start Date": "start_date",
+}
+LIST_FIELDS = ("daysAvailability", "equipmentAvailability")
+NUMBER_FIELDS = ("age", "weight", "height")
+# HTTP statuses worth another attempt (the OpenAI client's own retry policy)
+RETRYABLE_STATUSES = (408, 409, 429)
+
+
+class BackendError(Exception):
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient failures: lost connections, timeouts, rate limits and server errors."""
+    if isinstance(error, BackendError):
+        return error.retryable
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUSES or error.status_code >= 500
+    return False
+
+
+@dataclass
+class CompletionRequest:
+    model: str
+    messages: list[dict]
+    temperature: float = 0.1
+
+
+@dataclass
+class Completion:
+    content: str
+    # token counts as reported by the API, e.g. prompt_tokens / completion_tokens
+    usage: dict = field(default_factory=dict)
+
+
+class LLMBackend(ABC):
+    name = ""
+
+    @abstractmethod
+    async def complete(self, request: CompletionRequest) -> Completion:
+        """The whole answer at once."""
+
+    @abstractmethod
+    def stream(self, request: CompletionRequest, usage: dict | None = None) -> AsyncIterator[str]:
+        """
+        Answer text as it's generated. Close the iterator (aclosing) to stop
+        generation early. Token counts, when known, are put in `usage`.
+        """
+
+
+class OpenRouterBackend(LLMBackend):
+    name = BACKEND_OPENROUTER
+
+    def __init__(self, client):
+        self.client = client
+
+    async def complete(self, request: CompletionRequest) -> Completion:
+        response = await self.client.chat.completions.create(
+            model=request.model,
+            messages=request.messages,
+            # response_format=self.registry.get("json_response_schema"),  # ENABLED!
+            temperature=request.temperature,
+            # OpenRouter adds the call's cost to usage
+            extra_body={"usage": {"include": True}}
+        )
+        # the full object repeats the whole answer, only format it when debugging
+        logger.debug("Full response object: %s", response)
+        usage = response.usage.model_dump(exclude_none=True) if response.usage else {}
+        return Completion(response.choices[0].message.content, usage)
+
+    async def stream(self, request: CompletionRequest, usage: dict | None = None) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=request.model,
+            messages=request.messages,
+            temperature=request.temperature,
+            stream=True,
+            # usage arrives in a last chunk without choices
+            stream_options={"include_usage": True},
+            extra_body={"usage": {"include": True}}
+        )
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None and usage is not None:
+                    usage.update(chunk.usage.model_dump(exclude_none=True))
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+
+def request_key(messages: list[dict]) -> str:
+    """Identifies an exact request, whatever model it's sent to."""
+    return hashlib.sha256(orjson.dumps(messages)).hexdigest()
+
+
+def message_text(message: dict) -> str:
+    """Content of a chat message, whether a plain string or a list of text parts."""
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content)
+
+
+def last_prompt(messages: list[dict]) -> str:
+    return next((message_text(message) for message in reversed(messages) if message["role"] == "user"), "")
+
+
+def request_shape(messages: list[dict]) -> str:
+    """Identifies the prompt template of a request: the first line of its last prompt."""
+    first_line = last_prompt(messages).strip().split("\n", 1)[0]
+    return hashlib.sha256(first_line.encode()).hexdigest()[:16]
+
+
+def start_date_of(messages: list[dict]) -> date | None:
+    match = START_DATE.search(last_prompt(messages))
+    return date.fromisoformat(match.group(1)) if match else None
+
+
+def shift_dates(text: str, days: int) -> str:
+    if not days:
+        return text
+    shift = timedelta(days=days)
+    return ISO_DATE.sub(lambda match: (date.fromisoformat(match.group()) + shift).isoformat(), text)
+
+
+async def paced_chunks(content: str, latency: float) -> AsyncIterator[str]:
+    """`content` in small chunks, spread over `latency` seconds like a model stream."""
+    chunks = [content[start:start + STREAM_CHUNK_CHARS] for start in range(0, len(content), STREAM_CHUNK_CHARS)] or [""]
+    await asyncio.sleep(latency * FIRST_CHUNK_SHARE)
+    gap = latency * (1 - FIRST_CHUNK_SHARE) / len(chunks)
+    for chunk in chunks:
+        yield chunk
+        await asyncio.sleep(gap)
+
+
+class RecordingBackend(LLMBackend):
+    """Another backend, saving each completed exchange under `directory`."""
+    name = BACKEND_RECORD
+
+    def __init__(self, inner: LLMBackend, directory: str):
+        self.inner = inner
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    async def complete(self, request: CompletionRequest) -> Completion:
+        started = time.perf_counter()
+        completion = await self.inner.complete(request)
+        await self._save(request, completion.content, completion.usage, time.perf_counter() - started, None)
+        return completion
+
+    async def stream(self, request: CompletionRequest, usage: dict | None = None) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        first_chunk = None
+        parts = []
+        usage = {} if usage is None else usage
+        async with aclosing(self.inner.stream(request, usage)) as chunks:
+            async for chunk in chunks:
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+                parts.append(chunk)
+                yield chunk
+        # only complete answers are recorded, a stream closed early never gets here
+        await self._save(request, "".join(parts), usage, time.perf_counter() - started, first_chunk)
+
+    async def _save(self, request: CompletionRequest, content: str, usage: dict, latency: float, first_chunk: float | None):
+        key = request_key(request.messages)
+        record = {
+            "key": key,
+            "shape": request_shape(request.messages),
+            "model": request.model,
+            "messages": request.messages,
+            "temperature": request.temperature,
+            "content": content,
+            "usage": usage,
+            "latency": round(latency, 3),
+            "first_chunk": round(first_chunk, 3) if first_chunk is not None else None,
+        }
+        path = os.path.join(self.directory, f"{key[:16]}-{time.time_ns()}.json")
+        try:
+            await asyncio.to_thread(write_record, path, record)
+        except OSError as e:
+            logger.error(f"Could not record exchange to {path}: {e}")
+
+
+def write_record(path: str, record: dict):
+    with open(path, "wb") as file:
+        file.write(orjson.dumps(record, option=orjson.OPT_INDENT_2))
+
+
+class ReplayBackend(LLMBackend):
+    """Answers from exchanges saved by RecordingBackend, without any network."""
+    name = BACKEND_REPLAY
+
+    def __init__(self, directory: str, speed: float = 1.0):
+        self.speed = speed
+        self.by_key: dict[str, list[dict]] = {}
+        self.by_shape: dict[str, list[dict]] = {}
+        self.turns: dict[str, int] = {}
+        for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+            if name.endswith(".json"):
+                with open(os.path.join(directory, name), "rb") as file:
+                    record = orjson.loads(file.read())
+                self.by_key.setdefault(record["key"], []).append(record)
+                self.by_shape.setdefault(record["shape"], []).append(record)
+        logger.info(f"Replay backend: {sum(map(len, self.by_key.values()))} recordings from {directory}")
+
+    def _next(self, records: list[dict], pool: str) -> dict:
+        # round-robin over the recordings of a request or template
+        turn = self.turns.get(pool, 0)
+        self.turns[pool] = turn + 1
+        return records[turn % len(records)]
+
+    def _answer(self, request: CompletionRequest) -> tuple[str, dict]:
+        key = request_key(request.messages)
+        if key in self.by_key:
+            record = self._next(self.by_key[key], key)
+            return record["content"], record
+        shape = request_shape(request.messages)
+        if shape not in self.by_shape:
+            raise BackendError(f"replay: no recording for this request or its prompt template ({shape})")
+        record = self._next(self.by_shape[shape], shape)
+        recorded, wanted = start_date_of(record["messages"]), start_date_of(request.messages)
+        days = (wanted - recorded).days if recorded and wanted else 0
+        return shift_dates(record["content"], days), record
+
+    async def complete(self, request: CompletionRequest) -> Completion:
+        content, record = self._answer(request)
+        await asyncio.sleep(record["latency"] * self.speed)
+        return Completion(content, record.get("usage") or {})
+
+    async def stream(self, request: CompletionRequest, usage: dict | None = None) -> AsyncIterator[str]:
+        content, record = self._answer(request)
+        if usage is not None:
+            usage.update(record.get("usage") or {})
+        async with aclosing(paced_chunks(content, record["latency"] * self.speed)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+
+def parse_profile(prompt: str) -> dict:
+    """The user dict back from the profile block convert_user_dict_to_text() put in a prompt."""
+    match = USER_PROFILE.search(prompt)
+    user: dict = {}
+    for line in (match.group(1) if match else "").splitlines():
+        label, _, value = line.strip().partition(": ")
+        key = PROFILE_LABELS.get(label)
+        if key is None:
+            continue
+        value = value.strip()
+        if key in LIST_FIELDS:
+            user[key] = [item for item in value.split(", ") if item]
+        elif key in NUMBER_FIELDS:
+            try:
+                user[key] = float(value)
+            except ValueError:
+                user[key] = None
+        else:
+            user[key] = None if value == "None" else value
+    return user
+
+
+def estimated_usage(request: CompletionRequest, content: str, cached_chars: int = 0) -> dict:
+    """Token counts at about 4 characters per token, for answers no API counted."""
+    prompt_chars = sum(len(message_text(message)) for message in request.messages)
+    usage = {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4}
+    if cached_chars:
+        usage["prompt_tokens_details"] = {"cached_tokens": cached_chars // 4}
+    return usage
+
+
+class PromptCacheSimulator:
+    """
+    Provider-side prompt caching as OpenAI-style APIs do it: the longest
+    prefix already seen, in blocks of CACHE_BLOCK_CHARS and from
+    CACHE_MIN_CHARS on, is reported as cached.
+    """
+
+    def __init__(self, max_entries: int = 200_000):
+        self.prefixes: set[bytes] = set()
+        self.max_entries = max_entries
+
+    def cached_chars(self, messages: list[dict]) -> int:
+        text = "".join(f"{message['role']}:{message_text(message)}" for message in messages)
+        if len(self.prefixes) > self.max_entries:
+            self.prefixes.clear()
+        cached = 0
+        digest = hashlib.sha256()
+        for start in range(0, len(text) - CACHE_BLOCK_CHARS + 1, CACHE_BLOCK_CHARS):
+            digest.update(text[start:start + CACHE_BLOCK_CHARS].encode())
+            key = digest.digest()
+            if key in self.prefixes:
+                cached = start + CACHE_BLOCK_CHARS
+            self.prefixes.add(key)
+        return cached if cached >= CACHE_MIN_CHARS else 0
+
+
+class SyntheticBackend(LLMBackend):
+    """
+    Plausible answers for every prompt template, built by the local engine
+    from the profile in the prompt. Latency is lognormal around `latency`
+    seconds; `failure_rate` of the calls fail like an unavailable API.
+    Prompt prefixes seen before are reported as cached tokens. Prompts asking
+    for the compact wire format are answered in it.
+    """
+    name = BACKEND_SYNTHETIC
+
+    def __init__(self, latency: float, jitter: float, failure_rate: float, seed: int | None = None):
+        # imported here, the engine itself imports sherlock_ai.model
+        from sherlock_ai.local_engine import generate_local_plan
+        self.generate_plan = generate_local_plan
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.prompt_cache = PromptCacheSimulator()
+
+    def _latency(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        return self.random.lognormvariate(math.log(self.latency), self.jitter)
+
+    def _answer(self, request: CompletionRequest) -> str:
+        if self.random.random() < self.failure_rate:
+            raise BackendError("synthetic: Error code: 503 - service unavailable", retryable=True)
+        prompt = last_prompt(request.messages)
+        user = parse_profile(prompt)
+        user.setdefault("start_date", date.today().isoformat())
+        plan = self.generate_plan(user)
+        first_line = prompt.strip().split("\n", 1)[0]
+
+        if "outlin" in first_line:
+            outline = summarize_parts([plan])
+            answer = {key: outline[key] for key in ("start_date", "notes_from_coach", "split", "rest_weekdays", "exercises")}
+        elif REPAIR_DAY.search(prompt):
+            wanted = {int(number) for number in REPAIR_DAY.findall(prompt)}
+            answer = {"plan": [day for day in plan["plan"] if day["day"] in wanted]}
+        elif match := PART_DAYS.search(first_line):
+            first, last = int(match.group(1)), int(match.group(2))
+            answer = {**plan, "part_days": f"{first}-{last}", "plan": plan["plan"][first - 1:last]}
+        else:
+            answer = plan
+        if COMPACT_MARKER in prompt and "plan" in answer:
+            answer = compact_part(answer)
+        return orjson.dumps(answer).decode()
+
+    async def complete(self, request: CompletionRequest) -> Completion:
+        latency = self._latency()
+        await asyncio.sleep(latency)
+        content = self._answer(request)
+        return Completion(content, estimated_usage(request, content, self.prompt_cache.cached_chars(request.messages)))
+
+    async def stream(self, request: CompletionRequest, usage: dict | None = None) -> AsyncIterator[str]:
+        latency = self._latency()
+        content = self._answer(request)
+        if usage is not None:
+            usage.update(estimated_usage(request, content, self.prompt_cache.cached_chars(request.messages)))
+        async with aclosing(paced_chunks(content, latency)) as chunks:
+            async for chunk in chunks:
+                yield chunk
@@ -0,0 +1,144 @@
+"""
+Compact wire format for plan answers.
+
+A verbose answer repeats every key and every full exercise name on each
+day, which is most of a part's completion tokens. In the compact format the
+model lists each name once in "names" and writes the days as short-keyed
+objects whose rows refer to those names by index:
+
+    {"user_id": "7", "start_date": "2025-11-18", "total_days": 30, "part_days": "1-10",
+     "notes_from_coach": "...", "names": ["Arm Circles", "Barbell Back Squat", "Quad Stretch"],
+     "plan": [{"d": 1, "f": "Lower Body", "m": "55 min", "wu": [[0, "2 min"]],
+               "x": [[1, 4, "8-12", "90s", "40-50kg", "Drop set on the last set"]], "cd": [[2, "1 min"]]},
+              {"d": 2}]}
+
+A day without "x" is a rest day and dates follow from start_date.
+expand_part() turns such an answer back into the verbose shape that
+validation, repair and storage work with. Verbose days pass through
+unchanged, so a model that ignores the format still produces a plan.
+"""
+from config.my_logger import get_logger
+from sherlock_ai.repair import expected_date
+from sherlock_ai.schema import SchemaViolation
+
+logger = get_logger(__name__, "sherlock_ai")
+
+WIRE_VERBOSE = "verbose"
+WIRE_COMPACT = "compact"
+WIRE_FORMATS = (WIRE_VERBOSE, WIRE_COMPACT)
+
+# heading of response_format/compact_format.txt, how stand-in backends tell a compact request
+COMPACT_MARKER = "COMPACT ANSWER FORMAT"
+
+
+def _name(row: list, names: list, path: tuple) -> str:
+    index = row[0]
+    if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < len(names):
+        raise SchemaViolation(path, f"name index {index!r} is not in names")
+    return names[index]
+
+
+def _timed(rows, names: list, path: tuple) -> list[dict]:
+    """[name index, duration] rows as warm-up/cooldown items."""
+    items = []
+    for position, row in enumerate(rows or []):
+        if not isinstance(row, list) or len(row) != 2:
+            raise SchemaViolation(path + (position,), "expected [name index, duration]")
+        items.append({"name": _name(row, names, path + (position,)), "duration": row[1]})
+    return items
+
+
+def _exercise(row, names: list, path: tuple) -> dict:
+    if not isinstance(row, list) or not 5 <= len(row) <= 6:
+        raise SchemaViolation(path, "expected [name index, sets, reps, rest, estimated_weight, notes]")
+    exercise = {"name": _name(row, names, path), "sets": row[1], "reps": row[2], "rest": row[3], "estimated_weight": row[4]}
+    if len(row) == 6 and row[5]:
+        exercise["notes"] = row[5]
+    return exercise
+
+
+def expand_day(day: dict, names: list, start_date: str) -> dict:
+    """Verbose day object from a compact one. Raises SchemaViolation on a malformed day."""
+    if "day" in day:
+        return day
+    number = day.get("d")
+    path = ("plan", number)
+    if not isinstance(number, int) or isinstance(number, bool):
+        raise SchemaViolation(path, "day without a day number")
+    expanded = {"day": number, "date": expected_date(start_date, number), "type": "rest"}
+    if "x" in day:
+        expanded["type"] = "workout"
+        expanded["workout"] = {
+            "warm_up": _timed(day.get("wu"), names, path + ("wu",)),
+            "exercises": [_exercise(row, names, path + ("x", position)) for position, row in enumerate(day["x"] or [])],
+            "cooldown": _timed(day.get("cd"), names, path + ("cd",)),
+            "estimated_duration": day.get("m", ""),
+            "focus": day.get("f", ""),
+        }
+    return expanded
+
+
+def expand_part(answer: dict, start_date: str | None = None) -> dict:
+    """
+    Verbose part (or repair answer) from a compact one. Days that can't be
+    expanded are dropped for the repair stage to ask for again.
+    """
+    names = answer.get("names") or []
+    start_date = answer.get("start_date") or start_date
+    expanded = {key: value for key, value in answer.items() if key not in ("names", "plan")}
+    expanded["plan"] = []
+    for day in answer.get("plan", []):
+        try:
+            expanded["plan"].append(expand_day(day, names, start_date))
+        except (SchemaViolation, TypeError, ValueError, AttributeError) as e:
+            logger.info(f"COMPACT:: dropping day that can't be expanded: {e}")
+    return expanded
+
+
+def stream_day_expander(day: dict, header: dict) -> dict:
+    """expand_day for StreamingPlanParser, taking names and start_date from the values streamed before "plan"."""
+    if "day" in day:
+        return day
+    if "names" not in header or not header.get("start_date"):
+        raise SchemaViolation(("plan",), '"start_date" and "names" must come before "plan"')
+    return expand_day(day, header["names"], header["start_date"])
+
+
+def _named(items) -> list[dict]:
+    """The items of a warm-up, exercise or cooldown list that have a name to refer to."""
+    return [item for item in items or [] if isinstance(item, dict) and isinstance(item.get("name"), str)]
+
+
+def compact_part(part: dict) -> dict:
+    """
+    A verbose part in the compact format, as the model would send it.
+    Days without a day number and items without a name are left out.
+    """
+    names: list[str] = []
+    indexes: dict[str, int] = {}
+
+    def ref(name: str) -> int:
+        if name not in indexes:
+            indexes[name] = len(names)
+            names.append(name)
+        return indexes[name]
+
+    days = []
+    for day in part.get("plan", []):
+        if not isinstance(day, dict) or "day" not in day:
+            continue
+        compact = {"d": day["day"]}
+        workout = day.get("workout")
+        if day.get("type") == "workout" and isinstance(workout, dict):
+            compact["f"] = workout.get("focus", "")
+            compact["m"] = workout.get("estimated_duration", "")
+            compact["wu"] = [[ref(item["name"]), item.get("duration", "")] for item in _named(workout.get("warm_up"))]
+            compact["x"] = [
+                [ref(item["name"]), item.get("sets"), item.get("reps"), item.get("rest"), item.get("estimated_weight")]
+                + ([item["notes"]] if item.get("notes") else [])
+                for item in _named(workout.get("exercises"))
+            ]
+            compact["cd"] = [[ref(item["name"]), item.get("duration", "")] for item in _named(workout.get("cooldown"))]
+        days.append(compact)
+    header = {key: value for key, value in part.items() if key != "plan"}
+    return {**header, "names": names, "plan": days}
@@ -0,0 +1,96 @@
+"""
+Compact chat context for the chained plan parts.
+
+In "full" mode parts 2 and 3 get every earlier prompt and answer verbatim,
+so prompt tokens grow with each part. In "compact" mode the earlier answers
+are replaced by a short summary holding what the next part actually needs
+to continue the plan: the weekly split, where the rotation stopped, and
+the last prescription of every exercise in each progression phase.
+"""
+from datetime import date
+
+# progression phases used by the part prompts (name, first day, last day)
+PHASES = (
+    ("base", 1, 7),
+    ("increase", 8, 14),
+    ("peak", 15, 20),
+    ("maintain", 21, 28),
+    ("deload", 29, 30),
+)
+
+CONTEXT_FULL = "full"
+CONTEXT_COMPACT = "compact"
+CONTEXT_MODES = (CONTEXT_FULL, CONTEXT_COMPACT)
+
+# workouts listed to show where the rotation stopped
+RECENT_WORKOUTS = 3
+
+SUMMARY_HEADER = "Summary of the plan generated so far (continue it, do not repeat these days):"
+# parallel mode: every part gets the same outline instead of the earlier parts
+SKELETON_HEADER = "Plan outline shared by all three segments, which are written in parallel (follow its split, exercises and per-phase prescriptions exactly):"
+
+
+def phase_of(day_number: int) -> str:
+    for name, first, last in PHASES:
+        if first <= day_number <= last:
+            return name
+    return PHASES[-1][0]
+
+
+def prescription(exercise: dict) -> str:
+    return f"{exercise.get('sets')}x{exercise.get('reps')} @ {exercise.get('estimated_weight')}"
+
+
+def weekday_of(day) -> str | None:
+    """Short weekday name of a day object, or None when it has no usable day number or date."""
+    if not isinstance(day, dict) or not isinstance(day.get("day"), int):
+        return None
+    try:
+        return date.fromisoformat(day.get("date")).strftime("%a")
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize_parts(parts: list[dict]) -> dict:
+    """
+    Condense the days of earlier parts into the context the next part needs.
+    Days without a day number or date are skipped, and so are exercises
+    without a name; the caller is expected to have dropped invalid days
+    already (they are left to the repair stage).
+    """
+    days = sorted(
+        (day for part in parts for day in part.get("plan", []) if weekday_of(day) is not None),
+        key=lambda day: day["day"]
+    )
+    split: dict[str, str] = {}
+    rest_weekdays: list[str] = []
+    workouts: list[list] = []
+    exercises: dict[str, dict[str, dict[str, str]]] = {}
+
+    for day in days:
+        weekday = weekday_of(day)
+        workout = day.get("workout")
+        if day.get("type") != "workout" or not isinstance(workout, dict):
+            if weekday not in rest_weekdays:
+                rest_weekdays.append(weekday)
+            continue
+        focus = workout.get("focus", "")
+        split[weekday] = focus
+        workouts.append([day["day"], weekday, focus])
+        phase = phase_of(day["day"])
+        for exercise in workout.get("exercises") or []:
+            if not isinstance(exercise, dict) or not exercise.get("name"):
+                continue
+            # later days overwrite earlier ones, leaving the last prescription per phase
+            exercises.setdefault(focus, {}).setdefault(exercise["name"], {})[phase] = prescription(exercise)
+
+    header = parts[0] if parts else {}
+    return {
+        "start_date": header.get("start_date"),
+        "days_done": f"1-{days[-1]['day']}" if days else "",
+        "notes_from_coach": header.get("notes_from_coach", ""),
+        "split": split,
+        "rest_weekdays": rest_weekdays,
+        "last_workouts": workouts[-RECENT_WORKOUTS:],
+        "exercises": exercises,
+    }
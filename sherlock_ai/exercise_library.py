@@ -0,0 +1,235 @@
+"""
+Exercise library used by the local plan engine.
+
+Every exercise carries the muscle-group tags a session slot can ask for, the
+one piece of equipment it needs, the lowest fitness level it's programmed
+for and a starting load. Loads are for an intermediate man in the base phase
+and get scaled per user and phase by the engine. Within a tag, exercises are
+listed in order of preference: loadable gym movements first, bodyweight last.
+"""
+from typing import NamedTuple
+
+# equipment values as stored on the user (models.enums.EquipmentAvailability)
+BODYWEIGHT = "bodyweight"
+DUMBBELLS = "dumbells"
+BANDS = "resistance bands"
+KETTLEBELLS = "kettleballs"
+PULL_UP_BAR = "pull-up bars"
+YOGA_MAT = "yoga mat"
+GYM = "full gym access"
+
+# equipment that comes with a gym membership
+GYM_EQUIPMENT = frozenset({GYM, DUMBBELLS, BANDS, KETTLEBELLS, PULL_UP_BAR, YOGA_MAT})
+
+LEVELS = ("beginner", "intermediate", "advance")
+
+# restriction tags, matched against keywords in the user's notes
+KNEE = "knee"
+SPINE = "spine"
+OVERHEAD = "overhead"
+# how the coach notes refer to each restriction
+RESTRICTION_LABELS = {KNEE: "knees", SPINE: "lower back", OVERHEAD: "shoulders"}
+
+# load kinds
+KG = "kg"            # one implement or a machine stack, e.g. "40-50kg"
+KG_PAIR = "kg DBs"   # a pair of dumbbells, e.g. "8-10kg DBs"
+BAND = "band"
+NONE = "bodyweight"
+HOLD = "hold"        # timed bodyweight hold, reps are seconds
+
+
+class Exercise(NamedTuple):
+    name: str
+    tags: frozenset
+    equipment: str
+    level: int          # index into LEVELS
+    load: str           # one of the load kinds above
+    base_kg: float = 0
+    compound: bool = False
+    restrictions: frozenset = frozenset()
+
+
+def exercise(name, tags, equipment, level=0, load=NONE, base_kg=0, compound=False, restrictions=()) -> Exercise:
+    return Exercise(name, frozenset(tags.split()), equipment, level, load, base_kg, compound, frozenset(restrictions))
+
+
+EXERCISES = (
+    # chest
+    exercise("Barbell Bench Press", "chest", GYM, 1, KG, 50, True),
+    exercise("Machine Chest Press", "chest", GYM, 0, KG, 35, True),
+    exercise("Dumbbell Bench Press", "chest", DUMBBELLS, 0, KG_PAIR, 16, True),
+    exercise("Incline Dumbbell Press", "chest", DUMBBELLS, 0, KG_PAIR, 14, True),
+    exercise("Cable Chest Fly", "chest", GYM, 1, KG, 10),
+    exercise("Dumbbell Floor Press", "chest", DUMBBELLS, 0, KG_PAIR, 14, True),
+    exercise("Resistance Band Chest Press", "chest", BANDS, 0, BAND, compound=True),
+    exercise("Decline Push-Up", "chest", BODYWEIGHT, 2, compound=True),
+    exercise("Push-Up", "chest", BODYWEIGHT, 1, compound=True),
+    exercise("Incline Push-Up", "chest", BODYWEIGHT, 0, compound=True),
+    # shoulders
+    exercise("Barbell Overhead Press", "shoulders", GYM, 1, KG, 35, True, (OVERHEAD, SPINE)),
+    exercise("Seated Dumbbell Shoulder Press", "shoulders", DUMBBELLS, 0, KG_PAIR, 12, True, (OVERHEAD,)),
+    exercise("Kettlebell Overhead Press", "shoulders", KETTLEBELLS, 1, KG, 12, True, (OVERHEAD,)),
+    exercise("Landmine Press", "shoulders", GYM, 0, KG, 20, True),
+    exercise("Cable Lateral Raise", "shoulders", GYM, 1, KG, 5),
+    exercise("Dumbbell Lateral Raise", "shoulders", DUMBBELLS, 0, KG_PAIR, 6),
+    exercise("Resistance Band Lateral Raise", "shoulders", BANDS, 0, BAND),
+    exercise("Pike Push-Up", "shoulders", BODYWEIGHT, 1, compound=True, restrictions=(OVERHEAD,)),
+    # triceps
+    exercise("Cable Triceps Pushdown", "triceps", GYM, 0, KG, 20),
+    exercise("Overhead Dumbbell Triceps Extension", "triceps", DUMBBELLS, 0, KG, 14, restrictions=(OVERHEAD,)),
+    exercise("Dumbbell Triceps Kickback", "triceps", DUMBBELLS, 0, KG_PAIR, 6),
+    exercise("Resistance Band Triceps Pushdown", "triceps", BANDS, 0, BAND),
+    exercise("Diamond Push-Up", "triceps", BODYWEIGHT, 1),
+    exercise("Bench Dip", "triceps", BODYWEIGHT, 0),
+    # back
+    exercise("Lat Pulldown", "back", GYM, 0, KG, 45, True),
+    exercise("Seated Cable Row", "back", GYM, 0, KG, 40, True),
+    exercise("Barbell Bent Over Row", "back", GYM, 1, KG, 50, True, (SPINE,)),
+    exercise("Pull-Up", "back", PULL_UP_BAR, 1, compound=True),
+    exercise("Single-Arm Dumbbell Row", "back", DUMBBELLS, 0, KG, 18, True),
+    exercise("Kettlebell Single-Arm Row", "back", KETTLEBELLS, 0, KG, 16, True),
+    exercise("Negative Pull-Up", "back", PULL_UP_BAR, 0, compound=True),
+    exercise("Resistance Band Seated Row", "back", BANDS, 0, BAND, compound=True),
+    exercise("Inverted Row", "back biceps", BODYWEIGHT, 0, compound=True),
+    # rear delts
+    exercise("Face Pull", "rear_delts", GYM, 0, KG, 15),
+    exercise("Dumbbell Reverse Fly", "rear_delts", DUMBBELLS, 0, KG_PAIR, 5),
+    exercise("Resistance Band Pull-Apart", "rear_delts", BANDS, 0, BAND),
+    exercise("Prone Y Raise", "rear_delts", BODYWEIGHT, 0),
+    exercise("Superman Hold", "back rear_delts", BODYWEIGHT, 0, HOLD),
+    # biceps
+    exercise("Barbell Biceps Curl", "biceps", GYM, 0, KG, 25),
+    exercise("Dumbbell Biceps Curl", "biceps", DUMBBELLS, 0, KG_PAIR, 10),
+    exercise("Dumbbell Hammer Curl", "biceps", DUMBBELLS, 0, KG_PAIR, 10),
+    exercise("Kettlebell Biceps Curl", "biceps", KETTLEBELLS, 0, KG, 12),
+    exercise("Resistance Band Biceps Curl", "biceps", BANDS, 0, BAND),
+    exercise("Chin-Up", "biceps back", PULL_UP_BAR, 2, compound=True),
+    # quads
+    exercise("Barbell Back Squat", "quads", GYM, 1, KG, 60, True, (KNEE, SPINE)),
+    exercise("Leg Press", "quads", GYM, 0, KG, 100, True),
+    exercise("Goblet Squat", "quads", DUMBBELLS, 0, KG, 20, True, (KNEE,)),
+    exercise("Kettlebell Goblet Squat", "quads", KETTLEBELLS, 0, KG, 16, True, (KNEE,)),
+    exercise("Leg Extension", "quads", GYM, 0, KG, 35, restrictions=(KNEE,)),
+    exercise("Resistance Band Squat", "quads", BANDS, 0, BAND, compound=True, restrictions=(KNEE,)),
+    exercise("Box Squat", "quads", BODYWEIGHT, 0, compound=True),
+    exercise("Bodyweight Squat", "quads", BODYWEIGHT, 0, compound=True, restrictions=(KNEE,)),
+    exercise("Wall Sit", "quads", BODYWEIGHT, 0, HOLD),
+    # hinge (hamstrings, glutes, lower back)
+    exercise("Romanian Deadlift", "hinge hamstrings", GYM, 1, KG, 60, True, (SPINE,)),
+    exercise("Hip Thrust", "hinge glutes", GYM, 0, KG, 60, True),
+    exercise("Dumbbell Romanian Deadlift", "hinge hamstrings", DUMBBELLS, 0, KG_PAIR, 16, True, (SPINE,)),
+    exercise("Kettlebell Swing", "hinge glutes", KETTLEBELLS, 1, KG, 16, True, (SPINE,)),
+    exercise("Back Extension", "hinge", GYM, 0),
+    exercise("Resistance Band Good Morning", "hinge hamstrings", BANDS, 0, BAND, compound=True),
+    exercise("Glute Bridge", "hinge glutes", BODYWEIGHT, 0, compound=True),
+    exercise("Lying Leg Curl", "hamstrings", GYM, 0, KG, 30),
+    exercise("Single-Leg Romanian Deadlift", "hamstrings unilateral", BODYWEIGHT, 1),
+    exercise("Single-Leg Glute Bridge", "glutes hamstrings", BODYWEIGHT, 0),
+    exercise("Cable Glute Kickback", "glutes", GYM, 0, KG, 10),
+    exercise("Resistance Band Glute Kickback", "glutes", BANDS, 0, BAND),
+    # single-leg work
+    exercise("Bulgarian Split Squat", "unilateral", DUMBBELLS, 1, KG_PAIR, 10, restrictions=(KNEE,)),
+    exercise("Dumbbell Walking Lunge", "unilateral", DUMBBELLS, 0, KG_PAIR, 10, restrictions=(KNEE,)),
+    exercise("Dumbbell Step-Up", "unilateral", DUMBBELLS, 0, KG_PAIR, 8),
+    exercise("Reverse Lunge", "unilateral", BODYWEIGHT, 0, restrictions=(KNEE,)),
+    exercise("Step-Up", "unilateral", BODYWEIGHT, 0),
+    # calves
+    exercise("Standing Calf Raise", "calves", GYM, 0, KG, 40),
+    exercise("Dumbbell Calf Raise", "calves", DUMBBELLS, 0, KG_PAIR, 12),
+    exercise("Single-Leg Calf Raise", "calves", BODYWEIGHT, 0),
+    # core
+    exercise("Cable Crunch", "core", GYM, 1, KG, 25),
+    exercise("Hanging Knee Raise", "core", PULL_UP_BAR, 1),
+    exercise("Pallof Press", "core", BANDS, 0, BAND),
+    exercise("Dead Bug", "core", BODYWEIGHT, 0),
+    exercise("Plank", "core", BODYWEIGHT, 0, HOLD),
+    exercise("Bicycle Crunch", "core", BODYWEIGHT, 0),
+    exercise("Plank Shoulder Tap", "shoulders core", BODYWEIGHT, 0),
+)
+
+
+def index_by_tag(exercises) -> dict[str, tuple[Exercise, ...]]:
+    index: dict[str, list[Exercise]] = {}
+    for item in exercises:
+        for tag in item.tags:
+            index.setdefault(tag, []).append(item)
+    return {tag: tuple(items) for tag, items in index.items()}
+
+
+EXERCISES_BY_TAG = index_by_tag(EXERCISES)
+
+# sessions as (tag, compound) slots; the focus names match the model's plans
+SESSIONS = {
+    "Push": (("chest", True), ("shoulders", True), ("chest", True), ("shoulders", False), ("triceps", False)),
+    "Pull": (("back", True), ("back", True), ("rear_delts", False), ("biceps", False), ("core", False)),
+    "Legs": (("quads", True), ("hinge", True), ("unilateral", False), ("hamstrings", False), ("calves", False)),
+    "Upper Body": (("chest", True), ("back", True), ("shoulders", True), ("back", True), ("biceps", False), ("triceps", False)),
+    "Lower Body": (("quads", True), ("hinge", True), ("unilateral", False), ("glutes", False), ("core", False)),
+    "Full Body": (("quads", True), ("chest", True), ("back", True), ("hinge", True), ("shoulders", False), ("core", False)),
+}
+
+# weekly split by number of training days (a 7th available day stays a rest day)
+SPLITS = {
+    1: ("Full Body",),
+    2: ("Full Body", "Full Body"),
+    3: ("Push", "Pull", "Legs"),
+    4: ("Upper Body", "Lower Body", "Upper Body", "Lower Body"),
+    5: ("Push", "Pull", "Legs", "Upper Body", "Full Body"),
+    6: ("Push", "Pull", "Legs", "Push", "Pull", "Legs"),
+}
+
+LOWER_FOCUS = frozenset({"Legs", "Lower Body"})
+
+WARM_UPS = {
+    "upper": ("Arm circles and shoulder rolls", "3 min"),
+    "lower": ("Leg swings and hip circles", "3 min"),
+    "full": ("Inchworms and world's greatest stretch", "3 min"),
+}
+# cardio part of the warm-up, by where the user trains
+WARM_UP_CARDIO = {
+    "gym": ("Light rowing machine", "5 min"),
+    "home": ("Marching in place and jumping jacks", "5 min"),
+}
+COOLDOWNS = {
+    "Push": (("Chest and shoulder stretch", "3 min"), ("Triceps stretch", "2 min")),
+    "Pull": (("Upper back stretch", "3 min"), ("Biceps and forearm stretch", "2 min")),
+    "Legs": (("Quad and hamstring stretch", "3 min"), ("Hip flexor and calf stretch", "2 min")),
+    "Upper Body": (("Chest and upper back stretch", "3 min"), ("Arm stretch", "2 min")),
+    "Lower Body": (("Quad and hamstring stretch", "3 min"), ("Glute and hip flexor stretch", "2 min")),
+    "Full Body": (("Full body stretch", "3 min"), ("Child's pose and deep breathing", "2 min")),
+}
+
+# per fitness level: (sets, compound reps, isolation reps, compound rest, isolation rest, load factor)
+LEVEL_PRESCRIPTIONS = (
+    (2, "10-15", "12-15", "90s", "60s", 0.7),
+    (3, "8-12", "12-15", "90s", "60s", 1.0),
+    (4, "6-10", "10-12", "150s", "90s", 1.3),
+)
+# per progression phase (sets added, load factor); phases as in sherlock_ai.context.PHASES
+PHASE_PRESCRIPTIONS = {
+    "base": (0, 1.0),
+    "increase": (1, 1.1),
+    "peak": (1, 1.2),
+    "maintain": (1, 1.2),
+    "deload": (-1, 0.75),
+}
+MAX_SETS = 5
+BAND_BY_LEVEL = ("Light band", "Medium band", "Heavy band")
+HOLD_SECONDS = ("20-30s", "30-45s", "45-60s")
+
+# phrases in the user's notes that rule out exercises with a restriction tag
+RESTRICTION_KEYWORDS = {
+    "knee": KNEE,
+    "knees": KNEE,
+    "acl": KNEE,
+    "meniscus": KNEE,
+    "lower back": SPINE,
+    "back pain": SPINE,
+    "back injury": SPINE,
+    "spine": SPINE,
+    "herniated": SPINE,
+    "sciatica": SPINE,
+    "shoulder": OVERHEAD,
+    "shoulders": OVERHEAD,
+    "rotator cuff": OVERHEAD,
+}
@@ -0,0 +1,212 @@
+"""
+Rule-based plan generator that runs in-process, without the LLM.
+
+Builds the same 30-day plan shape the model returns from the exercise
+library: a weekly split chosen by the number of available days, exercises
+picked by equipment, location, fitness level and limitations named in the
+notes, and the same progression phases the prompts ask for. Deterministic
+and fast (well under a millisecond per plan), so it can answer directly
+when a user picks it or stand in when the model is slow or down.
+"""
+import re
+from datetime import date, timedelta
+
+from sherlock_ai.context import phase_of
+from sherlock_ai.exercise_library import (
+    BAND, BAND_BY_LEVEL, BODYWEIGHT, COOLDOWNS, EXERCISES_BY_TAG, GYM, GYM_EQUIPMENT, HOLD, HOLD_SECONDS,
+    LEVEL_PRESCRIPTIONS, LEVELS, LOWER_FOCUS, MAX_SETS, NONE, PHASE_PRESCRIPTIONS, RESTRICTION_KEYWORDS,
+    RESTRICTION_LABELS, SESSIONS, SPLITS, WARM_UP_CARDIO, WARM_UPS, Exercise
+)
+from sherlock_ai.model import WorkoutPlan, WorkoutPlanDay
+from sherlock_ai.repair import TOTAL_DAYS
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+# used when the profile has no available days
+DEFAULT_DAYS = ("monday", "wednesday", "friday")
+GYM_LOCATIONS = ("gym workout", "both home and gym")
+MIN_EXERCISES = 4
+
+# minutes per working set including rest, and for warm-up plus cooldown
+SET_MINUTES = 2.5
+FIXED_MINUTES = 13
+
+
+def training_weekdays(days_availability: list | None) -> list[int]:
+    """Weekday numbers (0 = Monday) to train on, at most one rest day a week."""
+    days = {day.lower() for day in days_availability or []} & set(WEEKDAYS) or set(DEFAULT_DAYS)
+    return [WEEKDAYS.index(day) for day in WEEKDAYS if day in days][:max(SPLITS)]
+
+
+def available_equipment(user_dict: dict) -> set[str]:
+    equipment = {item.lower() for item in user_dict.get("equipmentAvailability") or []} | {BODYWEIGHT}
+    if (user_dict.get("workoutLocation") or "").lower() in GYM_LOCATIONS or GYM in equipment:
+        equipment |= GYM_EQUIPMENT
+    return equipment
+
+
+def restrictions_from_notes(notes: str | None) -> set[str]:
+    text = " ".join(re.findall(r"[a-z]+", (notes or "").lower()))
+    return {tag for phrase, tag in RESTRICTION_KEYWORDS.items() if re.search(rf"\b{phrase}\b", text)}
+
+
+def level_index(fitness_level: str | None) -> int:
+    level = (fitness_level or "").lower()
+    return LEVELS.index(level) if level in LEVELS else 0
+
+
+def load_factor(user_dict: dict, level: int) -> float:
+    factor = LEVEL_PRESCRIPTIONS[level][5]
+    if (user_dict.get("gender") or "").lower() == "female":
+        factor *= 0.65
+    if (user_dict.get("age") or 0) >= 60:
+        factor *= 0.8
+    return factor
+
+
+def round_load(kg: float) -> float:
+    return max(1, round(kg)) if kg < 10 else round(kg / 2.5) * 2.5
+
+
+def format_kg(kg: float) -> str:
+    return f"{kg:g}"
+
+
+class SessionPicker:
+    """Exercise choice for one profile, memoized per (focus, variant)."""
+
+    def __init__(self, equipment: set[str], level: int, restrictions: set[str]):
+        self.equipment = equipment
+        self.level = level
+        self.restrictions = restrictions
+        self.sessions: dict[tuple[str, int], list[tuple[Exercise, bool]]] = {}
+
+    def candidates(self, tag: str, compound: bool) -> list[Exercise]:
+        allowed = [
+            item for item in EXERCISES_BY_TAG.get(tag, ())
+            if item.equipment in self.equipment and item.level <= self.level and not item.restrictions & self.restrictions
+        ]
+        # compound slots take compounds first, accessory slots isolation work first
+        return sorted(allowed, key=lambda item: item.compound != compound)
+
+    def session(self, focus: str, variant: int) -> list[tuple[Exercise, bool]]:
+        """(exercise, compound slot) pairs. Variant 1 swaps the accessories for their next option."""
+        key = (focus, variant)
+        if key not in self.sessions:
+            chosen: list[tuple[Exercise, bool]] = []
+            for tag, compound in SESSIONS[focus]:
+                options = [item for item in self.candidates(tag, compound) if item not in (picked for picked, _ in chosen)]
+                if options:
+                    index = variant if not compound and len(options) > variant else 0
+                    chosen.append((options[index], compound))
+            for item in self.candidates("core", False):
+                if len(chosen) >= MIN_EXERCISES:
+                    break
+                if item not in (picked for picked, _ in chosen):
+                    chosen.append((item, False))
+            self.sessions[key] = chosen
+        return self.sessions[key]
+
+
+def prescribe(item: Exercise, compound: bool, level: int, phase: str, factor: float) -> dict:
+    base_sets, compound_reps, isolation_reps, compound_rest, isolation_rest, _ = LEVEL_PRESCRIPTIONS[level]
+    extra_sets, phase_factor = PHASE_PRESCRIPTIONS[phase]
+    sets = base_sets if compound else min(base_sets, 3)
+    prescription = {
+        "name": item.name,
+        "sets": min(MAX_SETS, max(2, sets + extra_sets)),
+        "reps": compound_reps if compound else isolation_reps,
+        "rest": compound_rest if compound else isolation_rest,
+        "estimated_weight": "bodyweight",
+    }
+    if item.load == HOLD:
+        prescription["reps"] = HOLD_SECONDS[level]
+    elif item.load == BAND:
+        prescription["estimated_weight"] = BAND_BY_LEVEL[min(level + (phase_factor > 1), len(BAND_BY_LEVEL) - 1)]
+    elif item.load != NONE:
+        top = round_load(item.base_kg * factor * phase_factor)
+        bottom = round_load(top * 0.75)
+        weight = format_kg(top) if bottom >= top else f"{format_kg(bottom)}-{format_kg(top)}"
+        # the kg load kinds double as the unit suffix
+        prescription["estimated_weight"] = f"{weight}{item.load}"
+    if phase == "peak" and level > 0 and not compound:
+        prescription["notes"] = "Drop set on the last set"
+    elif phase == "deload":
+        prescription["notes"] = "Lighter week, focus on form"
+    return prescription
+
+
+def build_workout(focus: str, exercises: list[dict], gym: bool) -> dict:
+    region = "lower" if focus in LOWER_FOCUS else "full" if focus == "Full Body" else "upper"
+    warm_ups = (WARM_UPS[region], WARM_UP_CARDIO["gym" if gym else "home"])
+    working_sets = sum(exercise["sets"] for exercise in exercises)
+    minutes = round((FIXED_MINUTES + working_sets * SET_MINUTES) / 5) * 5
+    return {
+        "warm_up": [{"name": name, "duration": duration} for name, duration in warm_ups],
+        "exercises": exercises,
+        "cooldown": [{"name": name, "duration": duration} for name, duration in COOLDOWNS[focus]],
+        "estimated_duration": f"{minutes} min",
+        "focus": focus,
+    }
+
+
+def bmi_summary(user_dict: dict) -> str:
+    weight, height = user_dict.get("weight"), user_dict.get("height")
+    if not weight or not height:
+        return ""
+    bmi = weight / ((height / 100) ** 2)
+    category = "underweight" if bmi < 18.5 else "normal" if bmi < 25 else "overweight" if bmi < 30 else "obese"
+    return f"BMI: {bmi:.1f} ({category}). "
+
+
+def coach_notes(user_dict: dict, split: dict[int, str], restrictions: set[str]) -> str:
+    overview = ", ".join(f"{WEEKDAYS[weekday][:3].title()} {focus}" for weekday, focus in split.items())
+    notes = (
+        f"{bmi_summary(user_dict)}Split: {overview}. "
+        "Progression: base (days 1-7), +10% load and a set (8-14), +20% with drop sets for advanced (15-20), "
+        "hold that level (21-28, accessories rotate), deload -25% (29-30). Log actuals and add weight when you hit the top of the rep range. "
+        "Nutrition: protein at every meal (eggs, chicken, fish, lentils, greek yogurt). "
+        "Supplements: whey protein if busy, a multivitamin. "
+        "Recovery: sleep 7-9h, drink 2.5-3.5L water a day, stretch after every session."
+    )
+    if restrictions:
+        spared = " and ".join(sorted(RESTRICTION_LABELS[tag] for tag in restrictions))
+        notes += f" Following your notes, exercises that strain the {spared} were left out."
+    return notes
+
+
+def generate_local_plan(user_dict: dict) -> WorkoutPlan:
+    """Full 30-day plan for a profile (a user_to_dict() dict plus start_date)."""
+    start = date.fromisoformat(user_dict["start_date"])
+    level = level_index(user_dict.get("fitnessLevel"))
+    restrictions = restrictions_from_notes(user_dict.get("notes"))
+    equipment = available_equipment(user_dict)
+    picker = SessionPicker(equipment, level, restrictions)
+    factor = load_factor(user_dict, level)
+
+    weekdays = training_weekdays(user_dict.get("daysAvailability"))
+    split = dict(zip(weekdays, SPLITS[len(weekdays)]))
+
+    days: list[WorkoutPlanDay] = []
+    for number in range(1, TOTAL_DAYS + 1):
+        day_date = start + timedelta(days=number - 1)
+        focus = split.get(day_date.weekday())
+        if focus is None:
+            days.append({"day": number, "date": day_date.isoformat(), "type": "rest"})
+            continue
+        phase = phase_of(number)
+        session = picker.session(focus, 1 if phase == "maintain" else 0)
+        exercises = [prescribe(item, compound, level, phase, factor) for item, compound in session]
+        days.append({
+            "day": number,
+            "date": day_date.isoformat(),
+            "type": "workout",
+            "workout": build_workout(focus, exercises, GYM in equipment),
+        })
+
+    return {
+        "user_id": str(user_dict.get("id")),
+        "start_date": start.isoformat(),
+        "total_days": TOTAL_DAYS,
+        "notes_from_coach": coach_notes(user_dict, split, restrictions),
+        "plan": days,
+    }
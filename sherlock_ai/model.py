@@ -1,7 +1,25 @@
 from models.request_reseponse_models import UserDetails
-from openai import OpenAI
-import os, asyncio, json
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import httpx
+import os, asyncio, time
+from datetime import date
+import orjson
+from contextlib import aclosing
+from typing import Awaitable, Callable, TypedDict
 from config.my_logger import get_logger
+from sherlock_ai.backends import (
+    BACKEND_RECORD, BACKEND_REPLAY, BACKEND_SYNTHETIC, BACKENDS, Completion, CompletionRequest, LLMBackend,
+    OpenRouterBackend, RecordingBackend, ReplayBackend, SyntheticBackend, is_retryable
+)
+from sherlock_ai.compact import WIRE_COMPACT, WIRE_FORMATS, WIRE_VERBOSE, compact_part, expand_part, stream_day_expander
+from sherlock_ai.context import CONTEXT_COMPACT, CONTEXT_MODES, SKELETON_HEADER, SUMMARY_HEADER, summarize_parts
+from sherlock_ai.prompt_registry import PromptParts, PromptRegistry, COACH_NOTES_PLACEHOLDER, MISSING_DAYS_PLACEHOLDER
+from sherlock_ai.repair import assemble_plan, collect_plan_days, describe_days
+from sherlock_ai.routing import LatencyBudgetExceeded, ModelRouter
+from sherlock_ai.schema import SchemaViolation, response_schema
+from sherlock_ai.streaming import StreamingPlanParser
+from sherlock_ai.usage import CallRecord, PlanUsage, cached_tokens, call_cost, current_plan_usage, record_call
+from utils.metrics import register_metrics_source
 logger = get_logger(__name__,"sherlock_ai")
 
 from config.env_vars import load_config
@@ -10,91 +28,185 @@ load_config()
 OPEN_ROUTER_API_KEY = os.getenv("OPEN_ROUTER_API_KEY")
 OPEN_ROUTER_API_BASE_URL = os.getenv("OPEN_ROUTER_API_BASE_URL")
 OPEN_ROUTER_MODEL_NAME = os.getenv("OPEN_ROUTER_MODEL_NAME")
+# max LLM calls in flight per process, extra calls wait as coroutines
+SHERLOCK_AI_MAX_CONCURRENCY = int(os.getenv("SHERLOCK_AI_MAX_CONCURRENCY", "32"))
+# size of the keep-alive pool to OpenRouter
+SHERLOCK_AI_MAX_CONNECTIONS = int(os.getenv("SHERLOCK_AI_MAX_CONNECTIONS", "64"))
+# seconds to wait for a single completion
+SHERLOCK_AI_TIMEOUT = float(os.getenv("SHERLOCK_AI_TIMEOUT", "180"))
+# stream completions and validate them against the response schema as they arrive
+SHERLOCK_AI_STREAMING = os.getenv("SHERLOCK_AI_STREAMING", "false").lower() == "true"
+# repair calls allowed per plan for days that came back missing, duplicated or invalid
+SHERLOCK_AI_REPAIR_ATTEMPTS = int(os.getenv("SHERLOCK_AI_REPAIR_ATTEMPTS", "2"))
+# how parts 2 and 3 see earlier parts: "full" chat history or a "compact" summary
+SHERLOCK_AI_CONTEXT_MODE = os.getenv("SHERLOCK_AI_CONTEXT_MODE", "full").lower()
+# "chained" generates the parts one after another, "parallel" outlines the plan
+# in one short call and then generates all three parts concurrently from it
+SHERLOCK_AI_GENERATION_MODE = os.getenv("SHERLOCK_AI_GENERATION_MODE", "chained").lower()
+# what the model writes plan days in: "verbose" JSON, or the "compact" format
+# (names listed once, short keys, see sherlock_ai/compact.py) expanded here
+SHERLOCK_AI_WIRE_FORMAT = os.getenv("SHERLOCK_AI_WIRE_FORMAT", "verbose").lower()
+# where completions come from: "openrouter", "record" (openrouter, saving every exchange),
+# "replay" (saved exchanges, no network) or "synthetic" (local engine answers, no network)
+SHERLOCK_AI_BACKEND = os.getenv("SHERLOCK_AI_BACKEND", "openrouter").lower()
+# directory record mode writes exchanges to and replay mode reads them from
+SHERLOCK_AI_RECORDINGS_DIR = os.getenv("SHERLOCK_AI_RECORDINGS_DIR", "recordings")
+# replay at this multiple of the recorded latency, 0 answers instantly
+SHERLOCK_AI_REPLAY_SPEED = float(os.getenv("SHERLOCK_AI_REPLAY_SPEED", "1"))
+# synthetic mode: median seconds per call, lognormal sigma of the latency, share of calls that fail
+SHERLOCK_AI_SYNTHETIC_LATENCY = float(os.getenv("SHERLOCK_AI_SYNTHETIC_LATENCY", "20"))
+SHERLOCK_AI_SYNTHETIC_JITTER = float(os.getenv("SHERLOCK_AI_SYNTHETIC_JITTER", "0.5"))
+SHERLOCK_AI_SYNTHETIC_FAILURE_RATE = float(os.getenv("SHERLOCK_AI_SYNTHETIC_FAILURE_RATE", "0"))
+# seed for synthetic latency and failures, unset for a different run every time
+SHERLOCK_AI_SYNTHETIC_SEED = os.getenv("SHERLOCK_AI_SYNTHETIC_SEED")
+# extra attempts for a call that failed transiently (connection, timeout, 408/409/429/5xx)
+SHERLOCK_AI_MAX_RETRIES = int(os.getenv("SHERLOCK_AI_MAX_RETRIES", "2"))
+# seconds before the first retry, doubled for each further one
+SHERLOCK_AI_RETRY_BACKOFF = float(os.getenv("SHERLOCK_AI_RETRY_BACKOFF", "1"))
+# USD per million tokens, used for the cost of calls the API doesn't price itself
+SHERLOCK_AI_PROMPT_PRICE = float(os.getenv("SHERLOCK_AI_PROMPT_PRICE", "0"))
+SHERLOCK_AI_COMPLETION_PRICE = float(os.getenv("SHERLOCK_AI_COMPLETION_PRICE", "0"))
+# USD per million prompt tokens served from the provider's prompt cache
+SHERLOCK_AI_CACHED_PROMPT_PRICE = float(os.getenv("SHERLOCK_AI_CACHED_PROMPT_PRICE", str(SHERLOCK_AI_PROMPT_PRICE)))
+# mark the shared prompt prefixes with cache_control breakpoints, for providers
+# that only cache explicitly (Anthropic, Gemini); OpenAI-style APIs cache on their own
+SHERLOCK_AI_PROMPT_CACHE_CONTROL = os.getenv("SHERLOCK_AI_PROMPT_CACHE_CONTROL", "false").lower() == "true"
+# per-phase model, latency budget (seconds) and faster fallback model, as
+# "part1=...,part2=...,default=..." maps (see sherlock_ai/routing.py)
+SHERLOCK_AI_MODEL_ROUTES = os.getenv("SHERLOCK_AI_MODEL_ROUTES")
+SHERLOCK_AI_LATENCY_BUDGETS = os.getenv("SHERLOCK_AI_LATENCY_BUDGETS")
+SHERLOCK_AI_FALLBACK_MODELS = os.getenv("SHERLOCK_AI_FALLBACK_MODELS")
+
+# Shared by every SherlockAI instance so connections (and TLS sessions) are reused
+# across plan jobs instead of being rebuilt per client.
+http_client = DefaultAsyncHttpxClient(
+    limits=httpx.Limits(
+        max_connections=SHERLOCK_AI_MAX_CONNECTIONS,
+        max_keepalive_connections=SHERLOCK_AI_MAX_CONNECTIONS,
+        keepalive_expiry=60
+    ),
+    timeout=httpx.Timeout(SHERLOCK_AI_TIMEOUT, connect=10.0)
+)
+generation_semaphore = asyncio.Semaphore(SHERLOCK_AI_MAX_CONCURRENCY)
+
+# day ranges generated by each chained call, in order
+PLAN_PARTS = ("1-10", "11-20", "21-30")
+
+ProgressCallback = Callable[[dict], Awaitable[None]]
+# awaited with each finished day object while a part is still streaming
+DayCallback = Callable[[dict], Awaitable[None]]
+
+
+class WorkoutPlanDay(TypedDict, total=False):
+    day: int
+    date: str
+    type: str
+    workout: dict  # only on workout days
+
+
+class WorkoutPlan(TypedDict):
+    user_id: int | str
+    start_date: str
+    total_days: int
+    notes_from_coach: str
+    plan: list[WorkoutPlanDay]
+
+
+def strip_markdown_fence(content: str) -> str:
+    """Remove a ```json ... ``` wrapper the model sometimes puts around its answer."""
+    content = content.strip()
+    if content.startswith('```json'):
+        content = content[7:]
+    elif content.startswith('```'):
+        content = content[3:]
+    if content.endswith('```'):
+        content = content[:-3]
+    return content.strip()
+
+
+def parse_model_json(content: str) -> dict:
+    """Parse a model answer once; everything downstream works on the parsed dict."""
+    return orjson.loads(strip_markdown_fence(content))
+
+
+def compact_json(value) -> str:
+    """Whitespace-free JSON text, for feeding a parsed part back to the model."""
+    return orjson.dumps(value).decode()
+
+
+class PlanProgress:
+    """Days and parts finished so far for one plan, in any completion order."""
 
-class SherlockAI:
     def __init__(self):
-        self.client = OpenAI(
-            base_url=OPEN_ROUTER_API_BASE_URL,
-            api_key=OPEN_ROUTER_API_KEY
-        )
+        self.days = [0] * len(PLAN_PARTS)
+        self.parts_completed = 0
+
+    def day_done(self, part: int):
+        self.days[part - 1] += 1
+
+    def part_done(self, part: int, days: int):
+        self.days[part - 1] = days
+        self.parts_completed += 1
+
+    def snapshot(self, days: str | None = None) -> dict:
+        return {
+            "parts_completed": self.parts_completed,
+            "total_parts": len(PLAN_PARTS),
+            "days": days,
+            "days_completed": sum(self.days),
+            "total_days": 30
+        }
+
+
+class PartialAnswer(Exception):
+    """A part that failed midway. `days` holds the days it completed before failing."""
+
+    def __init__(self, message: str, days: list[dict]):
+        super().__init__(message)
+        self.days = days
+
+
+async def close_http_client():
+    """Close the shared connection pool. Call once on app shutdown."""
+    await http_client.aclose()
+
+def make_backend(name: str = SHERLOCK_AI_BACKEND) -> LLMBackend:
+    """The completion backend configured by SHERLOCK_AI_BACKEND (OpenRouter for unknown names)."""
+    if name not in BACKENDS:
+        logger.error(f"Unknown SHERLOCK_AI_BACKEND {name!r}, using openrouter")
+    if name == BACKEND_REPLAY:
+        return ReplayBackend(SHERLOCK_AI_RECORDINGS_DIR, SHERLOCK_AI_REPLAY_SPEED)
+    if name == BACKEND_SYNTHETIC:
+        seed = int(SHERLOCK_AI_SYNTHETIC_SEED) if SHERLOCK_AI_SYNTHETIC_SEED else None
+        return SyntheticBackend(SHERLOCK_AI_SYNTHETIC_LATENCY, SHERLOCK_AI_SYNTHETIC_JITTER, SHERLOCK_AI_SYNTHETIC_FAILURE_RATE, seed)
+
+    openrouter = OpenRouterBackend(AsyncOpenAI(
+        base_url=OPEN_ROUTER_API_BASE_URL,
+        api_key=OPEN_ROUTER_API_KEY,
+        http_client=http_client,
+        # SherlockAI retries (and counts the retries) itself
+        max_retries=0
+    ))
+    if name == BACKEND_RECORD:
+        return RecordingBackend(openrouter, SHERLOCK_AI_RECORDINGS_DIR)
+    return openrouter
+
+class SherlockAI:
+    def __init__(self, registry: PromptRegistry | None = None, backend: LLMBackend | None = None):
+        self.backend = backend or make_backend()
         self.model_name = OPEN_ROUTER_MODEL_NAME
-        self.thirty_day_workout_plan_prompt_template = self.load_thirty_day_workout_plan_prompt_template()
-        self.json_response_schema_template = self.load_json_response_schema_template()
-        self.firstpart_workout_prompt_template = self.load_firstpart_workout_prompt_template()
-        self.secondpart_workout_prompt_template = self.load_secondpart_workout_prompt_template()
-        self.thirdpart_workout_prompt_template = self.load_thirdpart_workout_prompt_template()
-        self.sample_ai_json_response = self.load_sample_ai_json_response()
-
-    def load_sample_ai_json_response(self) -> str:
-        sample_res = os.path.join(os.path.dirname(__file__), 'response_format', 'sample-workout-program-res.json')
-        try:
-            with open(sample_res, 'r') as file:
-                json_str = file.read()
-                # json_data = json.loads(json_str)
-            return json_str
-        except FileNotFoundError:
-            logger.error(f"LOADING JSON SCHEMA:: file not found. file path: {sample_res}")
-            # handle the error as needed
-            return {"status" : "error", "message": "JSON response schema file not found."}
-
-
-    def load_thirty_day_workout_plan_prompt_template(self) -> str:
-        # Placeholder for loading the actual prompt template
-        prompt_path = os.path.join(os.path.dirname(__file__), 'prompts', 'workout_plan_prompt.txt')
-        try:
-            with open(prompt_path, 'r') as file:
-                prompt_template = file.read()
-            return prompt_template
-        except FileNotFoundError:
-            logger.error("Prompt template file not found.")
-            # handle the error as needed
-            return {"status" : "error", "message": "Prompt template file not found."}
-        
-    def load_json_response_schema_template(self) -> str:
-        prompt_path = os.path.join(os.path.dirname(__file__), 'response_format', 'workout_plan_schema.json')
-        try:
-            with open(prompt_path, 'r') as file:
-                json_str = file.read()
-                # json_data = json.loads(json_str)
-            return json_str
-        except FileNotFoundError:
-            logger.error(f"LOADING JSON SCHEMA:: file not found. file path: {prompt_path}")
-            # handle the error as needed
-            return {"status" : "error", "message": "JSON response schema file not found."}
-        
-    def load_firstpart_workout_prompt_template(self) -> str:
-        prompt_path = os.path.join(os.path.dirname(__file__), 'prompts', 'firstpart_workout_prompt.txt')
-        try:
-            with open(prompt_path, 'r') as file:
-                prompt_template = file.read()
-            return prompt_template
-        except FileNotFoundError:
-            logger.error("LOADING FIRST PART WORKOUT:: file not found.")
-            return {"status" : "error", "message": "First workout prompt template file not found."}
-
-    def load_secondpart_workout_prompt_template(self) -> str:
-        prompt_path = os.path.join(os.path.dirname(__file__), 'prompts', 'secondpart_workout_prompt.txt')
-        try:
-            with open(prompt_path, 'r') as file:
-                prompt_template = file.read()
-            return prompt_template
-        except FileNotFoundError:
-            logger.error("LOADING SECOND PART WORKOUT:: file not found.")
-            # handle the error as needed
-            return {"status" : "error", "message": "Second workout prompt template file not found."}
-        
-    def load_thirdpart_workout_prompt_template(self) -> str:
-        prompt_path = os.path.join(os.path.dirname(__file__), 'prompts', 'thirdpart_workout_prompt.txt')
-        try:
-            with open(prompt_path, 'r') as file:
-                prompt_template = file.read()
-            return prompt_template
-        except FileNotFoundError:
-            logger.error("LOADING THIRD PART WORKOUT:: file not found.")
-            # handle the error as needed
-            return {"status" : "error", "message": "Third workout prompt template file not found."}
-        
-    
+        self.router = ModelRouter.from_env(
+            OPEN_ROUTER_MODEL_NAME, SHERLOCK_AI_MODEL_ROUTES, SHERLOCK_AI_LATENCY_BUDGETS, SHERLOCK_AI_FALLBACK_MODELS
+        )
+        register_metrics_source("model_routing", self.router.stats)
+        self.registry = registry or PromptRegistry()
+        self.context_mode = SHERLOCK_AI_CONTEXT_MODE if SHERLOCK_AI_CONTEXT_MODE in CONTEXT_MODES else "full"
+        self.generation_mode = SHERLOCK_AI_GENERATION_MODE
+        self.cache_control = SHERLOCK_AI_PROMPT_CACHE_CONTROL
+        self.wire_format = SHERLOCK_AI_WIRE_FORMAT if SHERLOCK_AI_WIRE_FORMAT in WIRE_FORMATS else WIRE_VERBOSE
+        # registry name -> (source it was parsed from, parsed schema)
+        self._schemas: dict[str, tuple[str, dict]] = {}
+
     def convert_userdetails_to_text(self, user_details: UserDetails) -> str:
         return f"""
             id: {user_details.id}
@@ -114,7 +226,6 @@ class SherlockAI:
     def convert_user_dict_to_text(self, user_dict: dict) -> str:
         return f"""
             id: {user_dict.get('id')}
-            Name: {user_dict.get('name')}
             Age: {user_dict.get('age')}
             Gender: {user_dict.get('gender')}
             Weight: {user_dict.get('weight')}
@@ -128,12 +239,8 @@ class SherlockAI:
             Start Date: {user_dict.get('start_date')}
             """
 
-    def get_minified_json(self, content: str) -> str:
-        """Minify JSON (removes \n/whitespace)."""
-        parsed = json.loads(content)
-        return json.dumps(parsed, separators=(',', ':'), ensure_ascii=False)
-    
-    def merge_workout_parts(self, part1: dict, part2: dict, part3: dict) -> dict:
+    @staticmethod
+    def merge_workout_parts(part1: dict, part2: dict, part3: dict) -> WorkoutPlan:
         """Merge 3 partials into full 30-day plan."""
         full = {
             "user_id": part1["user_id"],
@@ -148,59 +255,52 @@ class SherlockAI:
         return full
     
     # def generate_workout_plan_test(self, user_details: UserDetails) -> str:
-    def generate_workout_plan(self, user_details: dict) -> str:
+    async def generate_workout_plan(
+        self,
+        user_details: dict,
+        on_progress: ProgressCallback | None = None,
+        on_day: DayCallback | None = None,
+        usage: PlanUsage | None = None
+    ) -> WorkoutPlan:
         """
-        Orchestrates 3 parts → merges → returns full minified JSON.
-        Call THIS instead of individual funcs.
+        Orchestrates 3 parts → merges → returns the full plan as a dict.
+        Call THIS instead of individual funcs. Each answer is parsed once and
+        only re-serialized (compactly) where it's fed back as chat context.
+        `on_progress` is awaited with a progress dict after each part.
+        In parallel mode the parts are generated concurrently from an outline.
+        In streaming mode it's also awaited after every day, and `on_day`
+        gets each day object as soon as it has been generated.
+        Every LLM call made for the plan is recorded in `usage`.
         """
+        usage_token = current_plan_usage.set(usage)
         try:
             # user_text = self.convert_userdetails_to_text(user_details)
             user_text = self.convert_user_dict_to_text(user_details)
-            response_schema = self.json_response_schema_template
+            compact = self.wire_format == WIRE_COMPACT
+            prompt1 = self.registry.render_parts("firstpart_workout_prompt", user_text, compact)
+            prompt2 = self.registry.render_parts("secondpart_workout_prompt", user_text, compact)
+            prompt3 = self.registry.render_parts("thirdpart_workout_prompt", user_text, compact)
 
             logger.info("TEST WORKOUT PLAN GENERATION")
-            logger.info(f"AIIII: P1:: {self.firstpart_workout_prompt_template.replace('INPUT_JSON_HERE', user_text).replace('INPUT_JSON_RESPONSE_SCHEMA', response_schema)}")
-            logger.info(f"AIIII: P2:: {self.secondpart_workout_prompt_template.replace('INPUT_JSON_HERE', user_text).replace('INPUT_JSON_RESPONSE_SCHEMA', response_schema)}")
-            logger.info(f"AIIII: P3:: {self.thirdpart_workout_prompt_template.replace('INPUT_JSON_HERE', user_text).replace('INPUT_JSON_RESPONSE_SCHEMA', response_schema)}")
+            logger.info(f"AIIII: P1:: {prompt1.text()}")
+            logger.info(f"AIIII: P2:: {prompt2.text()}")
+            logger.info(f"AIIII: P3:: {prompt3.text()}")
             logger.info(f"MANDONG USER TEXT: {user_text}")
             logger.info(f"MANDONG USER DICTIONARY: {user_details}")
             # return "test"
             
-            messages1 = [
-                {"role": "system", "content": "You are a fitness expert..."},
-                {"role": "user", "content": self.firstpart_workout_prompt_template.replace("INPUT_JSON_HERE", user_text).replace("INPUT_JSON_RESPONSE_SCHEMA", response_schema)}
-            ]
-            
-            # Part 1: Days 1-10
-            part1_raw = self._call_api(user_text, messages1, is_first=True)
-            part1 = json.loads(part1_raw)
-            logger.info(f"Part1: {len(part1['plan'])} days OK")
+            prompts = [prompt1, prompt2, prompt3]
+            progress = PlanProgress()
 
-            # Part 2: Days 11-20 (chain part1)
-            messages2 = [
-                {"role": "system", "content": "You are a fitness expert..."},
-                {"role": "user", "content": self.firstpart_workout_prompt_template.replace("INPUT_JSON_HERE", user_text).replace("INPUT_JSON_RESPONSE_SCHEMA", response_schema)},
-                {"role": "assistant", "content": part1_raw},
-                {"role": "user", "content": self.secondpart_workout_prompt_template.replace("INPUT_JSON_HERE", user_text).replace("INPUT_JSON_RESPONSE_SCHEMA", response_schema)}
-            ]
-            part2_raw = self._call_api_messages(messages2)
-            part2 = json.loads(part2_raw)
-            logger.info(f"Part2: {len(part2['plan'])} days OK")
-
-            # Part 3: Days 21-30 (chain part1+2)
-            messages3 = messages2 + [
-                {"role": "assistant", "content": part2_raw},
-                {"role": "user", "content": self.thirdpart_workout_prompt_template.replace("INPUT_JSON_HERE", user_text).replace("INPUT_JSON_RESPONSE_SCHEMA", response_schema)}
-            ]
-            part3_raw = self._call_api_messages(messages3)
-            part3 = json.loads(part3_raw)
-            logger.info(f"Part3: {len(part3['plan'])} days OK")
+            if self.generation_mode == "parallel":
+                part1, part2, part3 = await self._generate_parts_parallel(user_details, user_text, prompts, progress, on_progress, on_day)
+            else:
+                part1, part2, part3 = await self._generate_parts_chained(user_details, prompts, progress, on_progress, on_day)
 
-            # MERGE & RETURN
-            full_plan = self.merge_workout_parts(part1, part2, part3)
-            full_json = self.get_minified_json(json.dumps(full_plan))  # Minified string
+            # MERGE (regenerating only bad days) & RETURN
+            full_plan = await self._merge_with_repair(user_text, part1, part2, part3)
             logger.info(f"FULL PLAN: 30 days merged!")
-            return full_json
+            return full_plan
 
         except Exception as e:
             logger.error(f"Full plan gen failed: {e}")
@@ -208,61 +308,286 @@ class SherlockAI:
             if "404" in error_str:
                 raise Exception("The AI service is currently unavailable. Please try again later.")
             raise Exception(f"AI Service Error: {str(e)}")
+        finally:
+            current_plan_usage.reset(usage_token)
         
-    def _call_api(self, user_text: str, prompt_template: str, is_first: bool = False) -> str:
-        """Helper: Single API call with schema."""
-        # prompt = prompt_template.replace("INPUT_JSON_HERE", user_text)
-        # Remove schema placeholder if using response_format (prompts now schema-free)
-        # prompt = prompt.replace("INPUT_JSON_RESPONSE_SCHEMA", "")
-        
-        # messages = [
-        #     {"role": "system", "content": "You are a fitness expert who creates personalized workout plans."},
-        #     {"role": "user", "content": prompt}
-        # ]
-        
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=prompt_template,
-            temperature=0.1
-        )
-        
-        content = response.choices[0].message.content
-        
-        # DIAGNOSTIC LOGGING:
-        logger.info(f"=== API RESPONSE DEBUG ===")
-        logger.info(f"Content type: {type(content)}")
-        logger.info(f"Content is None: {content is None}")
-        logger.info(f"Content length: {len(content) if content else 0}")
-        logger.info(f"First 500 chars: {content[:500] if content else 'EMPTY/NONE'}")
-        logger.info(f"Full response object: {response}")
-        
-        if content.strip().startswith('```'):
-            # Remove ```json or ``` from start and ``` from end
-            content = content.strip()
-            if content.startswith('```json'):
-                content = content[7:]  # Remove ```json
-            elif content.startswith('```'):
-                content = content[3:]   # Remove ```
-            
-            if content.endswith('```'):
-                content = content[:-3]  # Remove trailing ```
-            
-            content = content.strip()
-            logger.info(f"Stripped markdown wrapper. New length: {len(content)}")
-    
-        minified = self.get_minified_json(content)
-        logger.info(f"API Response: {minified[:200]}...")  # Log snippet
-        return minified
-
-    def _call_api_messages(self, messages: list) -> str:
-        """Helper for chained calls."""
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            # response_format=self.json_response_schema_template,  # ENABLED!
-            temperature=0.1
-        )
-        content = response.choices[0].message.content
+    async def _generate_parts_chained(self, user_details, prompts, progress, on_progress, on_day) -> list[dict]:
+        # Part 1: Days 1-10 (a failed part 1 leaves its days to repair like the others)
+        part1 = await self._call_part(self.part_messages(prompts, []), on_day=self._day_handler(1, progress, on_progress, on_day), call="part1")
+        part1 = self._with_header(part1, user_details)
+        logger.info(f"Part1: {len(part1['plan'])} days OK")
+        await self._part_done(1, part1, progress, on_progress)
+
+        # Part 2: Days 11-20 (chain part1)
+        part2 = await self._call_part(self.part_messages(prompts, [part1]), on_day=self._day_handler(2, progress, on_progress, on_day), call="part2")
+        logger.info(f"Part2: {len(part2['plan'])} days OK")
+        await self._part_done(2, part2, progress, on_progress)
+
+        # Part 3: Days 21-30 (chain part1+2)
+        part3 = await self._call_part(self.part_messages(prompts, [part1, part2]), on_day=self._day_handler(3, progress, on_progress, on_day), call="part3")
+        logger.info(f"Part3: {len(part3['plan'])} days OK")
+        await self._part_done(3, part3, progress, on_progress)
+        return [part1, part2, part3]
+
+    async def _generate_parts_parallel(self, user_details, user_text, prompts, progress, on_progress, on_day) -> list[dict]:
+        """
+        One short outline call, then all three parts at once, each prompted
+        with the same outline instead of the previous part's answer. Falls
+        back to the chained mode if the outline can't be produced.
+        """
+        try:
+            skeleton = await self._complete_json([
+                {"role": "system", "content": "You are a fitness expert..."},
+                self._user_message(self.registry.render_parts("skeleton_workout_prompt", user_text))
+            ], call="skeleton")
+        except Exception as e:
+            logger.error(f"Skeleton call failed, generating parts in sequence: {e}")
+            return await self._generate_parts_chained(user_details, prompts, progress, on_progress, on_day)
+        logger.info(f"Skeleton: split {skeleton.get('split')}")
+
+        outline = compact_json(skeleton)
+
+        async def generate(part: int) -> dict:
+            messages = [
+                {"role": "system", "content": "You are a fitness expert..."},
+                self._user_message(prompts[part - 1].extended(f"\n\n{SKELETON_HEADER}\n{outline}"))
+            ]
+            answer = await self._call_part(messages, on_day=self._day_handler(part, progress, on_progress, on_day), call=f"part{part}")
+            logger.info(f"Part{part}: {len(answer['plan'])} days OK")
+            await self._part_done(part, answer, progress, on_progress)
+            return answer
+
+        tasks = [asyncio.create_task(generate(part)) for part in range(1, len(PLAN_PARTS) + 1)]
+        try:
+            part1, part2, part3 = await asyncio.gather(*tasks)
+        except BaseException:
+            # e.g. the job was cancelled from a progress callback: stop the other parts' calls too
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return [self._with_header(part1, user_details, skeleton), part2, part3]
+
+    @staticmethod
+    def _with_header(part1: dict, user_details: dict, outline: dict | None = None) -> dict:
+        """
+        Part 1 with the plan header the merge and repair stages rely on. The
+        user id and start date come from the request (every day is checked
+        against that date); the coach notes from part 1, or from the outline
+        if part 1 failed.
+        """
+        outline = outline or {}
+        return {
+            **part1,
+            "user_id": str(user_details.get("id")),
+            "start_date": user_details.get("start_date") or part1.get("start_date") or outline.get("start_date"),
+            "notes_from_coach": part1.get("notes_from_coach") or outline.get("notes_from_coach", "")
+        }
+
+    async def _part_done(self, part: int, answer: dict, progress: PlanProgress, on_progress: ProgressCallback | None):
+        progress.part_done(part, len(answer["plan"]))
+        await self._report_progress(on_progress, progress, days=PLAN_PARTS[part - 1])
+
+    async def _report_progress(self, on_progress: ProgressCallback | None, progress: PlanProgress, days: str | None = None):
+        if on_progress is None:
+            return
+        try:
+            await on_progress(progress.snapshot(days))
+        except Exception as e:
+            # progress is best effort, never fail the plan over it
+            logger.error(f"Progress callback failed: {e}")
+
+    def part_messages(self, prompts: list[PromptParts], previous_parts: list[dict]) -> list[dict]:
+        """
+        Chat messages for the next part. In full mode every earlier prompt and
+        answer is replayed; in compact mode the next prompt alone carries a
+        summary of the earlier answers.
+        """
+        system = {"role": "system", "content": "You are a fitness expert..."}
+        prompt = prompts[len(previous_parts)]
+        previous_parts = self._checked_parts(previous_parts)
+        if self.context_mode == CONTEXT_COMPACT and previous_parts:
+            summary = compact_json(summarize_parts(previous_parts))
+            return [system, self._user_message(prompt.extended(f"\n\n{SUMMARY_HEADER}\n{summary}"))]
+
+        messages = [system]
+        for earlier_prompt, part in zip(prompts, previous_parts):
+            # earlier answers are replayed in the format the model was asked for
+            answer = compact_part(part) if self.wire_format == WIRE_COMPACT else part
+            messages.append(self._user_message(earlier_prompt))
+            messages.append({"role": "assistant", "content": compact_json(answer)})
+        messages.append(self._user_message(prompt))
+        return messages
+
+    def _checked_parts(self, parts: list[dict]) -> list[dict]:
+        """
+        Earlier parts with only the days that pass the day checks, for
+        replaying or summarizing them to the next part. The dropped days are
+        asked for again by the repair stage, like any other bad day.
+        """
+        if not parts:
+            return parts
+        day_schema = self._part_schema()["properties"]["plan"]["items"]
+        start_date = parts[0].get("start_date")
+        try:
+            date.fromisoformat(start_date)
+        except (TypeError, ValueError):
+            # nothing to check the days' dates against
+            return [{**part, "plan": []} for part in parts]
+        checked = []
+        for part in parts:
+            good, _ = collect_plan_days(part.get("plan", []), day_schema, start_date)
+            checked.append({**part, "plan": [good[number] for number in sorted(good)]})
+        return checked
+
+    def _user_message(self, prompt: PromptParts) -> dict:
+        """
+        The prompt as a user message, shared prefix first. With cache_control
+        on, the prefix is its own text part marked as a cache breakpoint
+        (at most three per request, within Anthropic's limit of four).
+        """
+        if not self.cache_control or not prompt.prefix:
+            return {"role": "user", "content": prompt.text()}
+        return {"role": "user", "content": [
+            {"type": "text", "text": prompt.prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt.suffix},
+        ]}
+
+    async def _call_part(self, messages: list, on_day: DayCallback | None = None, call: str = "part") -> dict:
+        """
+        A part that may fail without failing the plan: whatever days it
+        produced are kept and the rest are left to the repair stage.
+        """
+        try:
+            return await self._call_api_messages(messages, on_day=on_day, call=call)
+        except Exception as e:
+            days = e.days if isinstance(e, PartialAnswer) else []
+            logger.error(f"Part failed with {len(days)} days done, leaving the rest to repair: {e}")
+            return {"plan": days}
+
+    async def _merge_with_repair(self, user_text: str, part1: dict, part2: dict, part3: dict) -> WorkoutPlan:
+        """
+        Merge the parts day by day. Days that are missing, duplicated or fail
+        the schema are asked for again in one small call listing just those
+        days, up to SHERLOCK_AI_REPAIR_ATTEMPTS times.
+        """
+        day_schema = self._part_schema()["properties"]["plan"]["items"]
+        start_date = part1["start_date"]
+        days, needed = collect_plan_days(part1["plan"] + part2["plan"] + part3["plan"], day_schema, start_date)
+
+        attempts = 0
+        while needed and attempts < SHERLOCK_AI_REPAIR_ATTEMPTS:
+            attempts += 1
+            logger.info(f"REPAIR:: attempt {attempts}, regenerating days {needed}")
+            prompt = self.registry.render_parts("repair_workout_prompt", user_text, self.wire_format == WIRE_COMPACT)
+            suffix = (
+                prompt.suffix
+                .replace(COACH_NOTES_PLACEHOLDER, part1.get("notes_from_coach", ""))
+                .replace(MISSING_DAYS_PLACEHOLDER, describe_days(start_date, needed))
+            )
+            messages = [
+                {"role": "system", "content": "You are a fitness expert..."},
+                self._user_message(prompt._replace(suffix=suffix))
+            ]
+            try:
+                answer = await self._complete_json(messages, call="repair")
+            except Exception as e:
+                logger.error(f"REPAIR:: attempt {attempts} failed: {e}")
+                continue
+            if self.wire_format == WIRE_COMPACT:
+                answer = expand_part(answer, start_date)
+            repaired, needed = collect_plan_days(answer.get("plan", []), day_schema, start_date, wanted=needed)
+            days.update(repaired)
+
+        if needed:
+            raise ValueError(f"Merge failed: days {needed} missing or invalid")
+        return assemble_plan(part1, days)
+
+    def _day_handler(self, part: int, progress: PlanProgress, on_progress: ProgressCallback | None, on_day: DayCallback | None) -> DayCallback:
+        """Per-day callback for a streamed part: forwards the day and reports day-level progress."""
+        async def handle(day: dict):
+            progress.day_done(part)
+            if on_day is not None:
+                try:
+                    await on_day(day)
+                except Exception as e:
+                    logger.error(f"Day callback failed: {e}")
+            await self._report_progress(on_progress, progress, days=PLAN_PARTS[part - 1])
+
+        return handle
+
+    def _part_schema(self, name: str = "json_response_schema") -> dict:
+        """Parsed response schema, re-parsed only when the registry reloads it."""
+        source = self.registry.get(name)
+        cached = self._schemas.get(name)
+        if cached is None or cached[0] is not source:
+            cached = self._schemas[name] = (source, response_schema(orjson.loads(source)))
+        return cached[1]
+
+    def _wire_schema(self) -> dict:
+        """Schema of the answers as the model writes them."""
+        if self.wire_format == WIRE_COMPACT:
+            return self._part_schema("json_compact_response_schema")
+        return self._part_schema()
+
+    async def _call_api_messages(self, messages: list, on_day: DayCallback | None = None, call: str = "part") -> dict:
+        """Helper for chained calls. Returns the parsed answer."""
+        if SHERLOCK_AI_STREAMING:
+            return await self._stream_api_messages(messages, on_day, call)
+        answer = await self._complete_json(messages, call)
+        return expand_part(answer) if self.wire_format == WIRE_COMPACT else answer
+
+    def _request(self, messages: list, model: str) -> CompletionRequest:
+        return CompletionRequest(model=model, messages=messages, temperature=0.1)
+
+    @staticmethod
+    def _time_left(started: float, budget: float | None) -> float | None:
+        return None if budget is None else budget - (time.perf_counter() - started)
+
+    def _over_budget(self, call: str, request: CompletionRequest, started: float, retries: int, budget: float,
+                     usage: dict | None = None, ttft: float | None = None) -> LatencyBudgetExceeded:
+        exceeded = LatencyBudgetExceeded(f"{call} on {request.model} ran over its {budget:g}s budget")
+        self._record_call(call, request, started, retries, usage, ttft, error=exceeded)
+        return exceeded
+
+    def _record_call(self, call: str, request: CompletionRequest, started: float, retries: int,
+                     usage: dict | None = None, ttft: float | None = None, error: Exception | None = None):
+        usage = usage or {}
+        record_call(CallRecord(
+            call=call,
+            model=request.model,
+            backend=self.backend.name,
+            seconds=round(time.perf_counter() - started, 3),
+            retries=retries,
+            ttft=round(ttft, 3) if ttft is not None else None,
+            prompt_tokens=usage.get("prompt_tokens"),
+            cached_tokens=cached_tokens(usage),
+            completion_tokens=usage.get("completion_tokens"),
+            cost=call_cost(usage, SHERLOCK_AI_PROMPT_PRICE, SHERLOCK_AI_COMPLETION_PRICE, SHERLOCK_AI_CACHED_PROMPT_PRICE),
+            error=str(error) if error is not None else None
+        ))
+
+    async def _retry_after(self, call: str, retries: int, error: Exception):
+        delay = SHERLOCK_AI_RETRY_BACKOFF * 2 ** (retries - 1)
+        logger.warning(f"{call} call failed ({error}), retry {retries}/{SHERLOCK_AI_MAX_RETRIES} in {delay:g}s")
+        await asyncio.sleep(delay)
+
+    async def _complete_json(self, messages: list, call: str) -> dict:
+        """
+        One non-streamed completion from the phase's routed model, parsed.
+        If the route's latency budget runs out, the call is made again on
+        its fallback model, without a budget.
+        """
+        route = self.router.route(call)
+        try:
+            completion = await self._complete(self._request(messages, route.model), call, route.budget)
+        except LatencyBudgetExceeded as e:
+            self.router.budget_exceeded(call, fell_back=route.fallback is not None)
+            if route.fallback is None:
+                raise
+            logger.warning(f"{e}, asking {route.fallback}")
+            completion = await self._complete(self._request(messages, route.fallback), call, None)
+        content = completion.content
         
         # DIAGNOSTIC LOGGING:
         logger.info(f"=== API RESPONSE DEBUG ===")
@@ -270,25 +595,117 @@ class SherlockAI:
         logger.info(f"Content is None: {content is None}")
         logger.info(f"Content length: {len(content) if content else 0}")
         logger.info(f"First 500 chars: {content[:500] if content else 'EMPTY/NONE'}")
-        logger.info(f"Full response object: {response}")
-        
-        if content.strip().startswith('```'):
-            # Remove ```json or ``` from start and ``` from end
-            content = content.strip()
-            if content.startswith('```json'):
-                content = content[7:]  # Remove ```json
-            elif content.startswith('```'):
-                content = content[3:]   # Remove ```
-            
-            if content.endswith('```'):
-                content = content[:-3]  # Remove trailing ```
-            
-            content = content.strip()
-            logger.info(f"Stripped markdown wrapper. New length: {len(content)}")
-        
-        return self.get_minified_json(content)
+
+        return parse_model_json(content)
+
+    async def _complete(self, request: CompletionRequest, call: str, budget: float | None) -> Completion:
+        """One completion, retried on transient errors while the budget lasts."""
+        started = time.perf_counter()
+        retries = 0
+        while True:
+            try:
+                async with generation_semaphore:
+                    completion = await asyncio.wait_for(self.backend.complete(request), self._time_left(started, budget))
+                break
+            except Exception as e:
+                if budget is not None and isinstance(e, TimeoutError):
+                    raise self._over_budget(call, request, started, retries, budget) from e
+                if retries < SHERLOCK_AI_MAX_RETRIES and is_retryable(e):
+                    retries += 1
+                    await self._retry_after(call, retries, e)
+                    continue
+                self._record_call(call, request, started, retries, error=e)
+                raise
+        self._record_call(call, request, started, retries, usage=completion.usage)
+        return completion
+
+    async def _stream_api_messages(self, messages: list, on_day: DayCallback | None, call: str) -> dict:
+        """
+        Streamed variant of _call_api_messages. The answer is parsed and
+        checked against the response schema while it arrives; on the first
+        violation the stream is closed (stopping generation) and
+        PartialAnswer is raised with the days finished before it. A stream
+        that fails transiently before any text arrived is retried, one that
+        runs over the route's latency budget before any text arrived is
+        asked of the fallback model instead.
+        """
+        route = self.router.route(call)
+        try:
+            parser = await self._stream(self._request(messages, route.model), on_day, call, route.budget)
+        except LatencyBudgetExceeded as e:
+            self.router.budget_exceeded(call, fell_back=route.fallback is not None)
+            if route.fallback is None:
+                raise PartialAnswer(str(e), []) from e
+            logger.warning(f"{e}, asking {route.fallback}")
+            parser = await self._stream(self._request(messages, route.fallback), on_day, call, None)
+
+        try:
+            part = parser.finish()
+        except SchemaViolation as e:
+            raise PartialAnswer(str(e), parser.days) from e
+        logger.info(f"Streamed answer: {len(parser.text)} chars, {len(parser.days)} days")
+        return expand_part(part) if self.wire_format == WIRE_COMPACT else part
+
+    async def _stream(self, request: CompletionRequest, on_day: DayCallback | None, call: str, budget: float | None) -> StreamingPlanParser:
+        """
+        The streamed answer fed through a parser. Raises LatencyBudgetExceeded
+        if the budget ran out before any text, PartialAnswer if it ran out
+        (or the stream failed) after some.
+        """
+        started = time.perf_counter()
+        retries = 0
+        while True:
+            expand_day = stream_day_expander if self.wire_format == WIRE_COMPACT else None
+            parser = StreamingPlanParser(self._wire_schema(), expand_day=expand_day)
+            usage: dict = {}
+            ttft = None
+
+            async def read():
+                nonlocal ttft
+                async with generation_semaphore:
+                    # closing the stream (on a violation or timeout too) stops the generation
+                    async with aclosing(self.backend.stream(request, usage)) as stream:
+                        async for text in stream:
+                            if ttft is None:
+                                ttft = time.perf_counter() - started
+                            for day in parser.feed(text):
+                                if on_day is not None:
+                                    await on_day(day)
+
+            try:
+                await asyncio.wait_for(read(), self._time_left(started, budget))
+                break
+            except SchemaViolation as e:
+                self._record_call(call, request, started, retries, usage, ttft, error=e)
+                logger.error(f"Streamed answer rejected after {len(parser.text)} chars: {e}")
+                raise PartialAnswer(str(e), parser.days) from e
+            except Exception as e:
+                if budget is not None and isinstance(e, TimeoutError):
+                    exceeded = self._over_budget(call, request, started, retries, budget, usage, ttft)
+                    if not parser.text:
+                        raise exceeded from e
+                    # days already handed to on_day are kept, the repair stage does the rest
+                    self.router.budget_exceeded(call, fell_back=False)
+                    raise PartialAnswer(str(exceeded), parser.days) from e
+                if not parser.text and retries < SHERLOCK_AI_MAX_RETRIES and is_retryable(e):
+                    retries += 1
+                    await self._retry_after(call, retries, e)
+                    continue
+                self._record_call(call, request, started, retries, usage, ttft, error=e)
+                raise PartialAnswer(str(e), parser.days) from e
+        self._record_call(call, request, started, retries, usage, ttft)
+        return parser
 
     async def get_sample_ai_json_response(self) -> str:
         # i want to add a delay here for 1 min
         await asyncio.sleep(20)
-        return self.sample_ai_json_response
\ No newline at end of file
+        return self.registry.get("sample_ai_json_response")
+
+_sherlock_ai: SherlockAI | None = None
+
+def get_sherlock_ai() -> SherlockAI:
+    """Process-wide SherlockAI, built on first use (or at app startup)."""
+    global _sherlock_ai
+    if _sherlock_ai is None:
+        _sherlock_ai = SherlockAI()
+    return _sherlock_ai
@@ -0,0 +1,170 @@
+import os, asyncio, hashlib
+from typing import NamedTuple
+from config.my_logger import get_logger
+logger = get_logger(__name__, "prompt_registry")
+
+from config.env_vars import load_config
+load_config()
+
+# seconds between checks for edited template files, 0 turns hot reload off
+SHERLOCK_AI_TEMPLATE_RELOAD_INTERVAL = float(os.getenv("SHERLOCK_AI_TEMPLATE_RELOAD_INTERVAL", "10"))
+
+BASE_DIR = os.path.dirname(__file__)
+
+# template name -> path relative to the sherlock_ai package
+TEMPLATE_FILES = {
+    "thirty_day_workout_plan_prompt": os.path.join("prompts", "workout_plan_prompt.txt"),
+    "firstpart_workout_prompt": os.path.join("prompts", "firstpart_workout_prompt.txt"),
+    "secondpart_workout_prompt": os.path.join("prompts", "secondpart_workout_prompt.txt"),
+    "thirdpart_workout_prompt": os.path.join("prompts", "thirdpart_workout_prompt.txt"),
+    "repair_workout_prompt": os.path.join("prompts", "repair_workout_prompt.txt"),
+    "skeleton_workout_prompt": os.path.join("prompts", "skeleton_workout_prompt.txt"),
+    "json_response_schema": os.path.join("response_format", "workout_plan_schema.json"),
+    "json_compact_response_schema": os.path.join("response_format", "workout_plan_compact_schema.json"),
+    "compact_format_instructions": os.path.join("response_format", "compact_format.txt"),
+    "sample_ai_json_response": os.path.join("response_format", "sample-workout-program-res.json"),
+}
+
+# templates served by render(); the response schema (or, for the compact wire
+# format, the compact instructions and schema) is baked in at load time where referenced
+SCHEMA_TEMPLATES = (
+    "thirty_day_workout_plan_prompt",
+    "firstpart_workout_prompt",
+    "secondpart_workout_prompt",
+    "thirdpart_workout_prompt",
+    "repair_workout_prompt",
+    "skeleton_workout_prompt",
+)
+
+USER_PLACEHOLDER = "INPUT_JSON_HERE"
+SCHEMA_PLACEHOLDER = "INPUT_JSON_RESPONSE_SCHEMA"
+# repair prompt only
+COACH_NOTES_PLACEHOLDER = "INPUT_COACH_NOTES_HERE"
+MISSING_DAYS_PLACEHOLDER = "INPUT_MISSING_DAYS_HERE"
+# everything per user or per call comes after this line, so the text before it
+# is byte-identical for every user and can be served from the provider's prompt cache
+INPUT_MARKER = "### Input ###"
+
+
+class PromptParts(NamedTuple):
+    prefix: str  # instructions, rules and schema, the same for every user
+    suffix: str  # the user profile and other per-call data
+
+    def text(self) -> str:
+        return self.prefix + self.suffix
+
+    def extended(self, extra: str) -> "PromptParts":
+        return PromptParts(self.prefix, self.suffix + extra)
+
+
+def split_at_input(text: str) -> tuple[str, str]:
+    prefix, marker, rest = text.partition(INPUT_MARKER)
+    return (prefix, marker + rest) if marker else ("", text)
+
+
+class PromptRegistry:
+    """
+    In-memory store of SherlockAI prompt templates and response formats.
+
+    Files are read once, the response schema is substituted into the prompt
+    templates at load time, and `watch()` swaps in a fresh copy when a file
+    changes on disk. Lookups never touch the filesystem.
+    """
+
+    def __init__(self, base_dir: str = BASE_DIR, files: dict = TEMPLATE_FILES):
+        self.base_dir = base_dir
+        self.files = files
+        self.templates: dict[str, str] = {}
+        self.rendered: dict[str, str] = {}
+        self.split: dict[str, tuple[str, str]] = {}
+        self.split_compact: dict[str, tuple[str, str]] = {}
+        self.mtimes: dict[str, float] = {}
+        # digest of every template, changes whenever any prompt or schema is edited
+        self.version = ""
+        self.load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.base_dir, self.files[name])
+
+    def _read_mtimes(self) -> dict[str, float]:
+        mtimes = {}
+        for name in self.files:
+            try:
+                mtimes[name] = os.path.getmtime(self._path(name))
+            except OSError:
+                mtimes[name] = 0.0
+        return mtimes
+
+    def load(self):
+        """(Re)load every template. A file that can't be read keeps its previous content."""
+        # snapshot mtimes first so an edit made mid-load is picked up on the next check
+        mtimes = self._read_mtimes()
+        templates = dict(self.templates)
+        for name in self.files:
+            path = self._path(name)
+            try:
+                with open(path, 'r') as file:
+                    templates[name] = file.read()
+            except OSError as e:
+                logger.error(f"LOADING TEMPLATE:: {name} could not be read. file path: {path}. error: {e}")
+                templates.setdefault(name, "")
+
+        schema = templates.get("json_response_schema", "")
+        rendered = {
+            name: templates[name].replace(SCHEMA_PLACEHOLDER, schema)
+            for name in SCHEMA_TEMPLATES if name in templates
+        }
+
+        compact_schema = templates.get("compact_format_instructions", "").replace(
+            SCHEMA_PLACEHOLDER, templates.get("json_compact_response_schema", "")
+        )
+        rendered_compact = {
+            name: templates[name].replace(SCHEMA_PLACEHOLDER, compact_schema)
+            for name in SCHEMA_TEMPLATES if name in templates
+        }
+        split = {name: split_at_input(text) for name, text in rendered.items()}
+        split_compact = {name: split_at_input(text) for name, text in rendered_compact.items()}
+
+        digest = hashlib.sha256()
+        for name in sorted(templates):
+            digest.update(templates[name].encode())
+
+        # build new dicts and swap them in so readers never see a partially filled one
+        self.templates, self.rendered, self.split, self.split_compact = templates, rendered, split, split_compact
+        self.version = digest.hexdigest()[:16]
+        self.mtimes = mtimes
+        logger.info(f"LOADING TEMPLATE:: loaded {len(templates)} templates")
+
+    def get(self, name: str) -> str:
+        """Raw file content, e.g. the JSON schema or the sample response."""
+        return self.templates[name]
+
+    def render(self, name: str, user_text: str) -> str:
+        """Prompt with the schema already in place and the user profile substituted."""
+        return self.rendered[name].replace(USER_PLACEHOLDER, user_text)
+
+    def render_parts(self, name: str, user_text: str, compact: bool = False) -> PromptParts:
+        """
+        render() split into the prefix shared by all users and the per-user
+        suffix. `compact` asks for answers in the compact wire format.
+        """
+        prefix, suffix = (self.split_compact if compact else self.split)[name]
+        return PromptParts(prefix, suffix.replace(USER_PLACEHOLDER, user_text))
+
+    def reload_if_changed(self) -> bool:
+        if self._read_mtimes() == self.mtimes:
+            return False
+        logger.info("LOADING TEMPLATE:: change detected on disk, reloading")
+        self.load()
+        return True
+
+    async def watch(self, interval: float = SHERLOCK_AI_TEMPLATE_RELOAD_INTERVAL):
+        """Poll template mtimes off the event loop and reload on change. Runs until cancelled."""
+        if interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except Exception as e:
+                logger.error(f"LOADING TEMPLATE:: reload failed: {e}")
@@ -0,0 +1,70 @@
+"""
+Day-level bookkeeping for assembling a 30-day plan out of model answers.
+
+Instead of accepting or rejecting the merged plan as a whole, every day is
+checked on its own. Good days are kept; the numbers of missing, duplicated
+or invalid days are what the repair call asks the model for again.
+"""
+from datetime import date, timedelta
+
+from config.my_logger import get_logger
+from sherlock_ai.schema import SchemaViolation, validate
+
+logger = get_logger(__name__, "sherlock_ai")
+
+TOTAL_DAYS = 30
+
+
+def expected_date(start_date: str, day_number: int) -> str:
+    return (date.fromisoformat(start_date) + timedelta(days=day_number - 1)).isoformat()
+
+
+def check_day(day: dict, day_schema: dict, start_date: str) -> None:
+    """Schema plus the checks the schema can't express. Raises SchemaViolation."""
+    path = ("plan", day.get("day"))
+    validate(day, day_schema, path)
+    if day["type"] == "workout" and "workout" not in day:
+        raise SchemaViolation(path, "workout day without a workout")
+    if day["date"] != expected_date(start_date, day["day"]):
+        raise SchemaViolation(path, f"date {day['date']} should be {expected_date(start_date, day['day'])}")
+
+
+def collect_plan_days(days: list, day_schema: dict, start_date: str, wanted=range(1, TOTAL_DAYS + 1)) -> tuple[dict[int, dict], list[int]]:
+    """
+    Keep the first valid copy of each wanted day number.
+    Returns the good days by number and the wanted numbers still missing.
+    """
+    wanted = list(wanted)
+    wanted_numbers = set(wanted)
+    good: dict[int, dict] = {}
+    for day in days:
+        number = day.get("day") if isinstance(day, dict) else None
+        if number not in wanted_numbers:
+            logger.info(f"REPAIR:: dropping unexpected day {number!r}")
+            continue
+        if number in good:
+            logger.info(f"REPAIR:: dropping duplicate of day {number}")
+            continue
+        try:
+            check_day(day, day_schema, start_date)
+        except SchemaViolation as e:
+            logger.info(f"REPAIR:: invalid day {number}: {e}")
+            continue
+        good[number] = day
+    return good, [number for number in wanted if number not in good]
+
+
+def describe_days(start_date: str, day_numbers: list[int]) -> str:
+    """The day list substituted into the repair prompt."""
+    return "\n".join(f"- day {number}: {expected_date(start_date, number)}" for number in day_numbers)
+
+
+def assemble_plan(part1: dict, days: dict[int, dict]) -> dict:
+    """Full plan from the first part's header and a complete set of days."""
+    return {
+        "user_id": part1["user_id"],
+        "start_date": part1["start_date"],
+        "total_days": TOTAL_DAYS,
+        "notes_from_coach": part1.get("notes_from_coach", ""),  # Only from part1
+        "plan": [days[number] for number in range(1, TOTAL_DAYS + 1)]
+    }
@@ -0,0 +1,100 @@
+"""
+Per-phase model routing.
+
+Every LLM call of a plan has a phase label ("part1", "part2", "part3",
+"skeleton", "repair"). A route gives the phase its model, an optional
+latency budget in seconds, and the faster model to ask instead when the
+budget runs out. Routes come from three env maps of "phase=value" pairs
+separated by commas, for example
+
+    SHERLOCK_AI_MODEL_ROUTES="part1=anthropic/claude-sonnet-4,part2=google/gemini-2.5-flash,part3=google/gemini-2.5-flash"
+    SHERLOCK_AI_LATENCY_BUDGETS="part2=45,part3=45,repair=30"
+    SHERLOCK_AI_FALLBACK_MODELS="default=google/gemini-2.5-flash-lite"
+
+"default" applies to phases without an entry of their own. Phases without a
+route use OPEN_ROUTER_MODEL_NAME with no budget, as before.
+"""
+from dataclasses import dataclass
+
+from config.my_logger import get_logger
+
+logger = get_logger(__name__, "sherlock_ai")
+
+PHASES = ("part1", "part2", "part3", "skeleton", "repair")
+DEFAULT_PHASE = "default"
+
+
+class LatencyBudgetExceeded(Exception):
+    """The routed model didn't answer within the phase's latency budget."""
+
+
+@dataclass(frozen=True)
+class Route:
+    model: str
+    budget: float | None = None    # seconds for the whole call, retries included
+    fallback: str | None = None    # model asked instead when the budget runs out
+
+
+def parse_phase_map(value: str | None, name: str) -> dict[str, str]:
+    """'part1=a,part2=b' -> {"part1": "a", "part2": "b"}. Malformed entries are logged and skipped."""
+    routes = {}
+    for entry in (value or "").split(","):
+        if not entry.strip():
+            continue
+        phase, _, setting = entry.partition("=")
+        phase, setting = phase.strip().lower(), setting.strip()
+        if phase not in PHASES + (DEFAULT_PHASE,) or not setting:
+            logger.error(f"Ignoring {name} entry {entry.strip()!r}")
+            continue
+        routes[phase] = setting
+    return routes
+
+
+class ModelRouter:
+    def __init__(self, default_model: str, models: dict[str, str] | None = None,
+                 budgets: dict[str, float] | None = None, fallbacks: dict[str, str] | None = None):
+        models, budgets, fallbacks = models or {}, budgets or {}, fallbacks or {}
+        self.routes: dict[str, Route] = {}
+        for phase in PHASES:
+            model = models.get(phase) or models.get(DEFAULT_PHASE) or default_model
+            budget = budgets.get(phase, budgets.get(DEFAULT_PHASE)) or None
+            fallback = fallbacks.get(phase) or fallbacks.get(DEFAULT_PHASE)
+            if fallback == model:
+                fallback = None
+            self.routes[phase] = Route(model, budget, fallback)
+        self.default = Route(models.get(DEFAULT_PHASE) or default_model)
+        self.over_budget: dict[str, int] = {}
+        self.fallbacks: dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls, default_model: str, models: str | None, budgets: str | None, fallbacks: str | None) -> "ModelRouter":
+        parsed_budgets = {}
+        for phase, seconds in parse_phase_map(budgets, "latency budget").items():
+            try:
+                parsed_budgets[phase] = float(seconds)
+            except ValueError:
+                logger.error(f"Ignoring latency budget {phase}={seconds!r}")
+        return cls(
+            default_model,
+            parse_phase_map(models, "model route"),
+            parsed_budgets,
+            parse_phase_map(fallbacks, "fallback model"),
+        )
+
+    def route(self, phase: str) -> Route:
+        return self.routes.get(phase, self.default)
+
+    def budget_exceeded(self, phase: str, fell_back: bool):
+        self.over_budget[phase] = self.over_budget.get(phase, 0) + 1
+        if fell_back:
+            self.fallbacks[phase] = self.fallbacks.get(phase, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "routes": {
+                phase: {"model": route.model, "budget": route.budget, "fallback": route.fallback}
+                for phase, route in self.routes.items()
+            },
+            "over_budget": dict(self.over_budget),
+            "fallbacks": dict(self.fallbacks),
+        }
@@ -0,0 +1,101 @@
+"""
+Validation of model output against response_format/workout_plan_schema.json.
+
+Covers the JSON Schema keywords that schema uses (type, properties, required,
+additionalProperties, items, minItems, maxItems, enum, const, pattern), which
+keeps it dependency free and cheap enough to run on every streamed value.
+"""
+import re
+from functools import lru_cache
+
+# JSON Schema type -> check on the parsed Python value
+TYPE_CHECKS = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+
+
+class SchemaViolation(ValueError):
+    """Model output that doesn't match the response schema."""
+
+    def __init__(self, path: tuple, message: str):
+        self.path = path
+        super().__init__(f"{format_path(path)}: {message}")
+
+
+def format_path(path: tuple) -> str:
+    return "$" + "".join(f"[{part}]" if isinstance(part, int) else f".{part}" for part in path)
+
+
+@lru_cache(maxsize=64)
+def _compile(pattern: str) -> re.Pattern:
+    return re.compile(pattern)
+
+
+def response_schema(response_format: dict) -> dict:
+    """The JSON Schema inside a response_format document (or the document itself if it's bare)."""
+    return response_format.get("schema", response_format)
+
+
+def child_schema(schema: dict, key, path: tuple) -> dict:
+    """Schema for a property (str key) or array item (int key); raises on a property the schema forbids."""
+    if isinstance(key, int):
+        return schema.get("items", {})
+    properties = schema.get("properties", {})
+    if key in properties:
+        return properties[key]
+    if schema.get("additionalProperties", True) is False:
+        raise SchemaViolation(path, f"unexpected property '{key}'")
+    return {}
+
+
+def check_type(value, schema: dict, path: tuple) -> None:
+    expected = schema.get("type")
+    if expected is not None and not TYPE_CHECKS[expected](value):
+        raise SchemaViolation(path, f"expected {expected}, got {type(value).__name__}")
+
+
+def check_scalar(value, schema: dict, path: tuple) -> None:
+    """Type, enum, const and pattern of a single value (no recursion)."""
+    check_type(value, schema, path)
+    if "enum" in schema and value not in schema["enum"]:
+        raise SchemaViolation(path, f"{value!r} not one of {schema['enum']}")
+    if "const" in schema and value != schema["const"]:
+        raise SchemaViolation(path, f"expected {schema['const']!r}, got {value!r}")
+    if "pattern" in schema and isinstance(value, str) and not _compile(schema["pattern"]).search(value):
+        raise SchemaViolation(path, f"{value!r} does not match {schema['pattern']}")
+
+
+def check_required(keys, schema: dict, path: tuple) -> None:
+    missing = [key for key in schema.get("required", ()) if key not in keys]
+    if missing:
+        raise SchemaViolation(path, f"missing {', '.join(missing)}")
+
+
+def check_max_items(count: int, schema: dict, path: tuple) -> None:
+    if "maxItems" in schema and count > schema["maxItems"]:
+        raise SchemaViolation(path, f"more than {schema['maxItems']} items")
+
+
+def check_min_items(count: int, schema: dict, path: tuple) -> None:
+    if "minItems" in schema and count < schema["minItems"]:
+        raise SchemaViolation(path, f"fewer than {schema['minItems']} items")
+
+
+def validate(value, schema: dict, path: tuple = ()) -> None:
+    """Validate a whole parsed value, raising SchemaViolation at the first problem."""
+    check_scalar(value, schema, path)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            validate(item, child_schema(schema, key, path), path + (key,))
+        check_required(value, schema, path)
+    elif isinstance(value, list):
+        check_min_items(len(value), schema, path)
+        check_max_items(len(value), schema, path)
+        for index, item in enumerate(value):
+            validate(item, child_schema(schema, index, path), path + (index,))
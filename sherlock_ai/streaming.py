@@ -0,0 +1,273 @@
+"""
+Incremental parsing of a streamed plan part.
+
+StreamingPlanParser is fed completion text as it arrives. It tracks the JSON
+structure and checks it against the response schema on the fly: an unknown
+property, a value of the wrong type or a bad enum is reported as soon as it's
+seen instead of after the whole part has been generated. Every finished day
+object in "plan" is handed back from feed() right away, passed through
+`expand_day` first when one is given (compact wire format).
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+import orjson
+
+from sherlock_ai.schema import (
+    SchemaViolation, check_max_items, check_min_items, check_required, check_scalar, child_schema
+)
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+STRING_STOP = re.compile(r'["\\]')
+LITERAL_END = re.compile(r"[,\]}\s]")
+LITERAL_START = "-0123456789tfn"
+
+# text allowed around the JSON document (a markdown fence)
+ALLOWED_PREFIXES = ("", "```", "```json")
+ALLOWED_SUFFIXES = ("", "```")
+# give up looking for the opening brace after this much text
+MAX_PREFIX_LENGTH = 32
+
+# parser states
+PREFIX = "prefix"
+VALUE = "value"
+VALUE_OR_END = "value_or_end"
+KEY = "key"
+KEY_OR_END = "key_or_end"
+COLON = "colon"
+COMMA_OR_END = "comma_or_end"
+STRING = "string"
+LITERAL = "literal"
+DONE = "done"
+
+
+@dataclass
+class Frame:
+    kind: str  # "object" or "array"
+    schema: dict
+    path: tuple
+    start: int
+    keys: set = field(default_factory=set)
+    count: int = 0
+    key: str | None = None
+
+
+class StreamingPlanParser:
+    def __init__(self, schema: dict, days_key: str = "plan", expand_day: Callable[[dict, dict], dict] | None = None):
+        self.schema = schema
+        self.days_key = days_key
+        # called with each finished day and the top-level values parsed before it
+        self.expand_day = expand_day
+        self.text = ""
+        self.pos = 0
+        self.state = PREFIX
+        self.stack: list[Frame] = []
+        self.token_start = 0
+        self.string_is_key = False
+        self.value_schema = schema
+        self.value_path: tuple = ()
+        self.root_span: tuple[int, int] | None = None
+        # every day completed so far, kept even if a later violation aborts the stream
+        self.days: list[dict] = []
+        # finished top-level values other than the days, e.g. start_date
+        self.header: dict = {}
+
+    def feed(self, chunk: str) -> list[dict]:
+        """Consume more completion text. Returns the day objects completed by it."""
+        self.text += chunk
+        done = len(self.days)
+        while self._step():
+            pass
+        return self.days[done:]
+
+    def finish(self) -> dict:
+        """Check the stream ended with a complete document and return it parsed."""
+        if self.state != DONE:
+            raise SchemaViolation(self._path(), "response ended before the JSON document was complete")
+        suffix = self.text[self.root_span[1]:].strip()
+        if suffix not in ALLOWED_SUFFIXES:
+            raise SchemaViolation((), f"unexpected text after the JSON document: {suffix[:40]!r}")
+        return orjson.loads(self.text[self.root_span[0]:self.root_span[1]])
+
+    def _path(self) -> tuple:
+        return self.stack[-1].path if self.stack else ()
+
+    def _skip_whitespace(self) -> bool:
+        self.pos = WHITESPACE.match(self.text, self.pos).end()
+        return self.pos < len(self.text)
+
+    def _step(self) -> bool:
+        """Advance by one token. Returns False when more text is needed."""
+        if self.state == PREFIX:
+            return self._read_prefix()
+        if self.state == STRING:
+            return self._read_string()
+        if self.state == LITERAL:
+            return self._read_literal()
+        if self.state == DONE:
+            self.pos = len(self.text)
+            return False
+        if not self._skip_whitespace():
+            return False
+
+        char = self.text[self.pos]
+        frame = self.stack[-1]
+        if self.state in (VALUE, VALUE_OR_END):
+            if char == "]" and self.state == VALUE_OR_END:
+                return self._close(frame)
+            if self.state == VALUE_OR_END:
+                self._next_item(frame)
+            return self._begin_value(char)
+        if self.state in (KEY, KEY_OR_END):
+            if char == "}" and self.state == KEY_OR_END:
+                return self._close(frame)
+            if char != '"':
+                raise SchemaViolation(frame.path, f"expected a property name, got {char!r}")
+            self.string_is_key = True
+            self.token_start = self.pos
+            self.pos += 1
+            self.state = STRING
+            return True
+        if self.state == COLON:
+            if char != ":":
+                raise SchemaViolation(frame.path, f"expected ':', got {char!r}")
+            self.pos += 1
+            self.state = VALUE
+            return True
+        # COMMA_OR_END
+        if char == ",":
+            self.pos += 1
+            if frame.kind == "object":
+                self.state = KEY
+            else:
+                self._next_item(frame)
+                self.state = VALUE
+            return True
+        if char == ("}" if frame.kind == "object" else "]"):
+            return self._close(frame)
+        raise SchemaViolation(frame.path, f"expected ',' or end of {frame.kind}, got {char!r}")
+
+    def _read_prefix(self) -> bool:
+        start = self.text.find("{", self.pos)
+        if start == -1:
+            if len(self.text) > MAX_PREFIX_LENGTH:
+                raise SchemaViolation((), f"response does not start with a JSON object: {self.text[:40]!r}")
+            return False
+        prefix = self.text[:start].strip()
+        if prefix not in ALLOWED_PREFIXES:
+            raise SchemaViolation((), f"unexpected text before the JSON document: {prefix[:40]!r}")
+        self.pos = start
+        return self._begin_value("{")
+
+    def _next_item(self, frame: Frame):
+        frame.count += 1
+        check_max_items(frame.count, frame.schema, frame.path)
+        index = frame.count - 1
+        self.value_schema = child_schema(frame.schema, index, frame.path)
+        self.value_path = frame.path + (index,)
+
+    def _expect_type(self, kind: str):
+        expected = self.value_schema.get("type")
+        if expected is not None and expected != kind:
+            raise SchemaViolation(self.value_path, f"expected {expected}, got {kind}")
+
+    def _begin_value(self, char: str) -> bool:
+        if char == "{" or char == "[":
+            kind = "object" if char == "{" else "array"
+            self._expect_type(kind)
+            self.stack.append(Frame(kind, self.value_schema, self.value_path, self.pos))
+            self.pos += 1
+            self.state = KEY_OR_END if kind == "object" else VALUE_OR_END
+            return True
+        if char == '"':
+            self._expect_type("string")
+            self.string_is_key = False
+            self.state = STRING
+        elif char in LITERAL_START:
+            self.state = LITERAL
+        else:
+            raise SchemaViolation(self.value_path, f"unexpected character {char!r}")
+        if not self.stack:
+            raise SchemaViolation((), "response is not a JSON object")
+        self.token_start = self.pos
+        self.pos += 1
+        return True
+
+    def _read_string(self) -> bool:
+        while True:
+            match = STRING_STOP.search(self.text, self.pos)
+            if match is None:
+                self.pos = len(self.text)
+                return False
+            if match.group() == "\\":
+                if match.end() >= len(self.text):
+                    # wait for the escaped character
+                    self.pos = match.start()
+                    return False
+                self.pos = match.end() + 1
+                continue
+            self.pos = match.end()
+            value = orjson.loads(self.text[self.token_start:self.pos])
+            if self.string_is_key:
+                self._set_key(value)
+            else:
+                self._end_value(value)
+            return True
+
+    def _read_literal(self) -> bool:
+        match = LITERAL_END.search(self.text, self.pos)
+        if match is None:
+            # a literal can't end the document, its container still has to close
+            self.pos = len(self.text)
+            return False
+        self.pos = match.start()
+        token = self.text[self.token_start:self.pos]
+        try:
+            value = orjson.loads(token)
+        except orjson.JSONDecodeError:
+            raise SchemaViolation(self.value_path, f"invalid literal {token!r}")
+        self._end_value(value)
+        return True
+
+    def _set_key(self, key: str):
+        frame = self.stack[-1]
+        self.value_schema = child_schema(frame.schema, key, frame.path)
+        self.value_path = frame.path + (key,)
+        frame.key = key
+        self.state = COLON
+
+    def _end_value(self, value):
+        check_scalar(value, self.value_schema, self.value_path)
+        if len(self.value_path) == 1:
+            self.header[self.value_path[0]] = value
+        self._after_value()
+
+    def _after_value(self):
+        if not self.stack:
+            self.state = DONE
+            return
+        frame = self.stack[-1]
+        if frame.kind == "object":
+            frame.keys.add(frame.key)
+        self.state = COMMA_OR_END
+
+    def _close(self, frame: Frame) -> bool:
+        if frame.kind == "object":
+            check_required(frame.keys, frame.schema, frame.path)
+        else:
+            check_min_items(frame.count, frame.schema, frame.path)
+        self.stack.pop()
+        self.pos += 1
+
+        if len(frame.path) == 2 and frame.path[0] == self.days_key and frame.kind == "object":
+            day = orjson.loads(self.text[frame.start:self.pos])
+            self.days.append(self.expand_day(day, self.header) if self.expand_day else day)
+        elif len(frame.path) == 1 and frame.path[0] != self.days_key:
+            self.header[frame.path[0]] = orjson.loads(self.text[frame.start:self.pos])
+        if not self.stack:
+            self.root_span = (frame.start, self.pos)
+
+        # restore the schema/path of the closed value for the parent's bookkeeping
+        self.value_schema, self.value_path = frame.schema, frame.path
+        self._after_value()
+        return True
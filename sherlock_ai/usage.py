@@ -0,0 +1,145 @@
+"""
+Token, latency, retry and cost accounting for LLM calls.
+
+SherlockAI records one CallRecord per completion call. Records go to the
+process-wide LLMStats (exported under "llm" by GET /metrics) and to the
+PlanUsage of the plan being generated, if any, which ends up on the job row.
+"""
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+
+from utils.metrics import register_metrics_source
+
+# latencies kept per (call, model) for the percentiles in /metrics
+RECENT_CALLS = 500
+
+
+@dataclass
+class CallRecord:
+    call: str                  # "part1", "part2", "part3", "skeleton" or "repair"
+    model: str
+    backend: str
+    seconds: float
+    retries: int = 0
+    ttft: float | None = None  # seconds to the first streamed text, None when not streamed
+    prompt_tokens: int | None = None
+    cached_tokens: int | None = None  # prompt tokens the provider served from its prompt cache
+    completion_tokens: int | None = None
+    cost: float | None = None  # USD
+    error: str | None = None
+
+
+def cached_tokens(usage: dict) -> int | None:
+    """Cached prompt tokens as OpenAI-style APIs (and OpenRouter) report them."""
+    details = usage.get("prompt_tokens_details") or {}
+    return details.get("cached_tokens")
+
+
+def call_cost(usage: dict, prompt_price: float, completion_price: float, cached_price: float | None = None) -> float | None:
+    """USD for a call: the API's own figure if it reports one, else from per-million-token prices."""
+    if usage.get("cost") is not None:
+        return float(usage["cost"])
+    if not (prompt_price or completion_price) or "prompt_tokens" not in usage:
+        return None
+    cached = cached_tokens(usage) or 0
+    prompt_cost = (usage["prompt_tokens"] - cached) * prompt_price + cached * (prompt_price if cached_price is None else cached_price)
+    return (prompt_cost + usage.get("completion_tokens", 0) * completion_price) / 1_000_000
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+class PlanUsage:
+    """The calls made for one plan."""
+
+    def __init__(self):
+        self.calls: list[CallRecord] = []
+        self.started = time.perf_counter()
+
+    def add(self, record: CallRecord):
+        self.calls.append(record)
+
+    def summary(self) -> dict:
+        """Totals plus one compact entry per call, stored on the job."""
+        return {
+            "calls": len(self.calls),
+            "failed_calls": sum(record.error is not None for record in self.calls),
+            "retries": sum(record.retries for record in self.calls),
+            "prompt_tokens": sum(record.prompt_tokens or 0 for record in self.calls),
+            "cached_tokens": sum(record.cached_tokens or 0 for record in self.calls),
+            "completion_tokens": sum(record.completion_tokens or 0 for record in self.calls),
+            "cost": round(sum(record.cost or 0 for record in self.calls), 6),
+            "llm_seconds": round(sum(record.seconds for record in self.calls), 3),
+            "wall_seconds": round(time.perf_counter() - self.started, 3),
+            "detail": [
+                {key: value for key, value in asdict(record).items() if value is not None}
+                for record in self.calls
+            ],
+        }
+
+
+class LLMStats:
+    """Per (call, model) totals since the process started."""
+
+    def __init__(self):
+        self.totals: dict[tuple[str, str], dict] = {}
+        self.latencies: dict[tuple[str, str], deque] = {}
+        self.ttfts: dict[tuple[str, str], deque] = {}
+
+    def add(self, record: CallRecord):
+        key = (record.call, record.model)
+        totals = self.totals.setdefault(key, {
+            "calls": 0, "errors": 0, "retries": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0,
+            "cost": 0.0, "seconds": 0.0
+        })
+        totals["calls"] += 1
+        totals["errors"] += record.error is not None
+        totals["retries"] += record.retries
+        totals["prompt_tokens"] += record.prompt_tokens or 0
+        totals["cached_tokens"] += record.cached_tokens or 0
+        totals["completion_tokens"] += record.completion_tokens or 0
+        totals["cost"] += record.cost or 0
+        totals["seconds"] += record.seconds
+        self.latencies.setdefault(key, deque(maxlen=RECENT_CALLS)).append(record.seconds)
+        if record.ttft is not None:
+            self.ttfts.setdefault(key, deque(maxlen=RECENT_CALLS)).append(record.ttft)
+
+    def stats(self) -> dict:
+        calls = {}
+        for (call, model), totals in self.totals.items():
+            latencies = self.latencies.get((call, model), ())
+            ttfts = self.ttfts.get((call, model), ())
+            calls[f"{call}:{model}"] = {
+                **totals,
+                "cost": round(totals["cost"], 6),
+                "seconds": round(totals["seconds"], 3),
+                "p50_seconds": round(percentile(latencies, 0.5), 3),
+                "p99_seconds": round(percentile(latencies, 0.99), 3),
+                "p50_ttft": round(percentile(ttfts, 0.5), 3) if ttfts else None,
+            }
+        return {
+            "calls": sum(totals["calls"] for totals in self.totals.values()),
+            "prompt_tokens": sum(totals["prompt_tokens"] for totals in self.totals.values()),
+            "cached_tokens": sum(totals["cached_tokens"] for totals in self.totals.values()),
+            "completion_tokens": sum(totals["completion_tokens"] for totals in self.totals.values()),
+            "cost": round(sum(totals["cost"] for totals in self.totals.values()), 6),
+            "by_call": calls,
+        }
+
+
+llm_stats = LLMStats()
+register_metrics_source("llm", llm_stats.stats)
+
+# usage of the plan being generated in the current task (and the tasks it gathers)
+current_plan_usage: ContextVar[PlanUsage | None] = ContextVar("current_plan_usage", default=None)
+
+
+def record_call(record: CallRecord):
+    llm_stats.add(record)
+    usage = current_plan_usage.get()
+    if usage is not None:
+        usage.add(record)
@@ -0,0 +1,93 @@
+import pytest
+
+from sherlock_ai.compact import compact_part, expand_day, expand_part, stream_day_expander
+from sherlock_ai.schema import SchemaViolation
+
+NAMES = ["Arm Circles", "Barbell Back Squat", "Quad Stretch"]
+START = "2025-11-18"
+
+
+def compact_day(**overrides) -> dict:
+    day = {"d": 3, "f": "Lower Body", "m": "55 min", "wu": [[0, "2 min"]],
+           "x": [[1, 4, "8-12", "90s", "40-50kg", "Drop set on the last set"]] * 4, "cd": [[2, "1 min"]]}
+    day.update(overrides)
+    return day
+
+
+def test_round_trip(part):
+    compact = compact_part(part)
+    assert "names" in compact
+    assert expand_part(compact) == part
+
+
+def test_expand_workout_day():
+    day = expand_day(compact_day(), NAMES, START)
+    assert day["day"] == 3
+    assert day["date"] == "2025-11-20"
+    assert day["type"] == "workout"
+    assert day["workout"]["warm_up"] == [{"name": "Arm Circles", "duration": "2 min"}]
+    assert day["workout"]["exercises"][0] == {
+        "name": "Barbell Back Squat", "sets": 4, "reps": "8-12", "rest": "90s",
+        "estimated_weight": "40-50kg", "notes": "Drop set on the last set"
+    }
+    assert day["workout"]["cooldown"] == [{"name": "Quad Stretch", "duration": "1 min"}]
+
+
+def test_expand_rest_day():
+    assert expand_day({"d": 6}, NAMES, START) == {"day": 6, "date": "2025-11-23", "type": "rest"}
+
+
+def test_verbose_day_passes_through(part):
+    assert expand_day(part["plan"][0], [], START) is part["plan"][0]
+
+
+@pytest.mark.parametrize("index", [3, 99, -1, True, "1", 1.0, None])
+@pytest.mark.parametrize("field", ["wu", "x", "cd"])
+def test_name_index_out_of_range(field, index):
+    day = compact_day()
+    day[field] = [[index] + day[field][0][1:]] + day[field][1:]
+    with pytest.raises(SchemaViolation, match="is not in names"):
+        expand_day(day, NAMES, START)
+
+
+def test_malformed_rows():
+    with pytest.raises(SchemaViolation, match="expected \\[name index, duration\\]"):
+        expand_day(compact_day(wu=[[0]]), NAMES, START)
+    with pytest.raises(SchemaViolation, match="expected \\[name index, sets"):
+        expand_day(compact_day(x=[[1, 4, "8-12"]]), NAMES, START)
+
+
+def test_day_without_number():
+    with pytest.raises(SchemaViolation, match="without a day number"):
+        expand_day({"x": []}, NAMES, START)
+
+
+def test_expand_part_drops_bad_days():
+    answer = {"start_date": START, "names": NAMES, "plan": [compact_day(d=1), compact_day(d=2, x=[[7, 4, "8", "60s", "bodyweight"]]), {"d": 3}]}
+    expanded = expand_part(answer)
+    assert "names" not in expanded
+    assert [day["day"] for day in expanded["plan"]] == [1, 3]
+
+
+def test_expand_part_start_date_from_caller():
+    # repair answers don't repeat the start date
+    expanded = expand_part({"names": NAMES, "plan": [{"d": 2}]}, start_date=START)
+    assert expanded["plan"][0]["date"] == "2025-11-19"
+
+
+def test_stream_day_expander_needs_header():
+    with pytest.raises(SchemaViolation, match="must come before"):
+        stream_day_expander({"d": 1}, {"start_date": START})
+    assert stream_day_expander({"d": 1}, {"start_date": START, "names": NAMES})["date"] == START
+
+
+def test_compact_part_skips_what_it_cannot_refer_to(part):
+    del part["plan"][0]["workout"]["exercises"][0]["name"]
+    del part["plan"][1]["workout"]["warm_up"][0]["duration"]
+    part["plan"][2]["workout"]["cooldown"] = None
+    del part["plan"][5]["day"]
+    compact = compact_part(part)
+    assert len(compact["plan"]) == 9
+    assert len(compact["plan"][0]["x"]) == len(part["plan"][0]["workout"]["exercises"]) - 1
+    assert compact["plan"][1]["wu"][0][1] == ""
+    assert compact["plan"][2]["cd"] == []
@@ -0,0 +1,57 @@
+import orjson
+import pytest
+
+from sherlock_ai.compact import WIRE_COMPACT
+from sherlock_ai.context import CONTEXT_COMPACT, SUMMARY_HEADER, summarize_parts
+
+PART_PROMPTS = ("firstpart_workout_prompt", "secondpart_workout_prompt", "thirdpart_workout_prompt")
+
+
+def malformed(part: dict) -> dict:
+    """The part with a day missing its date, a day with an impossible date and an exercise without a name."""
+    del part["plan"][1]["date"]
+    part["plan"][2]["date"] = "2025-13-40"
+    del part["plan"][3]["workout"]["exercises"][0]["name"]
+    return part
+
+
+def test_summarize_parts(part):
+    summary = summarize_parts([part])
+    assert summary["start_date"] == part["start_date"]
+    assert summary["days_done"] == "1-10"
+    assert summary["rest_weekdays"] == ["Sun", "Mon"]
+    assert summary["last_workouts"][-1][0] == 10
+
+
+def test_summarize_parts_skips_malformed_days(part):
+    summary = summarize_parts([malformed(part)])
+    assert [workout[0] for workout in summary["last_workouts"]] == [8, 9, 10]
+    focus = part["plan"][3]["workout"]["focus"]
+    assert None not in summary["exercises"][focus]
+    assert summarize_parts([{"plan": [None, "day", {"day": "1"}]}])["days_done"] == ""
+
+
+@pytest.mark.parametrize("context_mode", ["full", CONTEXT_COMPACT])
+def test_part_messages_drop_invalid_days(sherlock, part, context_mode):
+    sherlock.context_mode = context_mode
+    prompts = [sherlock.registry.render_parts(name, "user", False) for name in PART_PROMPTS]
+    bad_days = {2, 3, 4}
+    messages = sherlock.part_messages(prompts, [malformed(part)])
+
+    if context_mode == CONTEXT_COMPACT:
+        assert len(messages) == 2
+        summary = orjson.loads(messages[1]["content"].split(SUMMARY_HEADER, 1)[1])
+        days = {workout[0] for workout in summary["last_workouts"]}
+    else:
+        days = {day["day"] for day in orjson.loads(messages[2]["content"])["plan"]}
+        assert days == set(range(1, 11)) - bad_days
+    assert not days & bad_days
+
+
+def test_part_messages_compact_wire_format(sherlock, part):
+    sherlock.wire_format = WIRE_COMPACT
+    prompts = [sherlock.registry.render_parts(name, "user", True) for name in PART_PROMPTS]
+    messages = sherlock.part_messages(prompts, [malformed(part)])
+    replayed = orjson.loads(messages[2]["content"])
+    assert "names" in replayed
+    assert [day["d"] for day in replayed["plan"]] == [1, 5, 6, 7, 8, 9, 10]
@@ -0,0 +1,102 @@
+import asyncio
+
+import orjson
+import pytest
+
+import sherlock_ai.model as model
+from sherlock_ai.backends import SyntheticBackend
+from sherlock_ai.model import SherlockAI
+
+USER = {
+    "id": 7, "gender": "male", "age": 30, "weight": 80.0, "height": 180,
+    "fitnessLevel": "beginner", "fitnessGoal": "lose weight", "workoutLocation": "home workout",
+    "daysAvailability": ["monday", "wednesday", "friday"], "equipmentAvailability": ["dumbells"],
+    "notes": "", "start_date": "2025-11-18"
+}
+
+
+class BrokenFirstPart(SyntheticBackend):
+    """Synthetic answers, except that part 1 gets `break_part` applied to it."""
+
+    def __init__(self, break_part):
+        super().__init__(latency=0, jitter=0, failure_rate=0, seed=1)
+        self.break_part = break_part
+
+    def _answer(self, request) -> str:
+        content = super()._answer(request)
+        answer = orjson.loads(content)
+        if answer.get("part_days") == "1-10":
+            return self.break_part(answer)
+        return content
+
+
+def invalid_day(answer: dict) -> str:
+    answer["plan"][3]["type"] = "nap"
+    return orjson.dumps(answer).decode()
+
+
+def not_json(answer: dict) -> str:
+    return "Sorry, I can't do that."
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("break_part", [invalid_day, not_json])
+@pytest.mark.parametrize("generation_mode", ["chained", "parallel"])
+def test_bad_first_part_is_repaired(monkeypatch, streaming, break_part, generation_mode):
+    monkeypatch.setattr(model, "SHERLOCK_AI_STREAMING", streaming)
+    sherlock = SherlockAI(backend=BrokenFirstPart(break_part))
+    sherlock.generation_mode = generation_mode
+    streamed = []
+
+    async def on_day(day):
+        streamed.append(day["day"])
+
+    plan = asyncio.run(sherlock.generate_workout_plan(dict(USER), on_day=on_day))
+    assert plan["user_id"] == "7"
+    assert plan["start_date"] == USER["start_date"]
+    assert [day["day"] for day in plan["plan"]] == list(range(1, 31))
+    assert plan["plan"][3]["type"] in ("workout", "rest")
+    if streaming and break_part is invalid_day:
+        # the days streamed before the bad one were kept
+        assert {1, 2, 3} <= set(streamed)
+
+
+class Stopped(BaseException):
+    """Stands in for JobCancelled, which a progress callback raises when the job is gone."""
+
+
+class SlowLaterParts(SyntheticBackend):
+    """Part 1 answers at once, parts 2 and 3 take a long time."""
+
+    def __init__(self):
+        super().__init__(latency=0, jitter=0, failure_rate=0, seed=1)
+        self.cancelled = []
+
+    async def complete(self, request):
+        completion = await super().complete(request)
+        part_days = orjson.loads(completion.content).get("part_days")
+        if part_days in ("11-20", "21-30"):
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                self.cancelled.append(part_days)
+                raise
+        return completion
+
+
+def test_parallel_parts_stop_when_one_is_cancelled():
+    backend = SlowLaterParts()
+    sherlock = SherlockAI(backend=backend)
+    sherlock.generation_mode = "parallel"
+
+    async def on_progress(progress):
+        raise Stopped()
+
+    async def generate():
+        with pytest.raises(Stopped):
+            await asyncio.wait_for(sherlock.generate_workout_plan(dict(USER), on_progress=on_progress), 10)
+        # nothing left running once the plan has failed
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(generate()) == []
+    assert sorted(backend.cancelled) == ["11-20", "21-30"]
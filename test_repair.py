@@ -0,0 +1,82 @@
+from sherlock_ai.repair import assemble_plan, collect_plan_days, describe_days, expected_date
+
+PART_DAYS = range(1, 11)
+
+
+def test_expected_date():
+    assert expected_date("2025-12-30", 1) == "2025-12-30"
+    assert expected_date("2025-12-30", 3) == "2026-01-01"
+
+
+def test_all_days_good(part, day_schema):
+    good, missing = collect_plan_days(part["plan"], day_schema, part["start_date"], PART_DAYS)
+    assert missing == []
+    assert [good[number] for number in PART_DAYS] == part["plan"]
+
+
+def test_missing_days(part, day_schema):
+    days = [day for day in part["plan"] if day["day"] not in (3, 7)]
+    good, missing = collect_plan_days(days, day_schema, part["start_date"], PART_DAYS)
+    assert missing == [3, 7]
+    assert sorted(good) == [1, 2, 4, 5, 6, 8, 9, 10]
+
+
+def test_duplicate_keeps_first_copy(part, day_schema):
+    copy = dict(part["plan"][3], workout={**part["plan"][3]["workout"], "focus": "Second copy"})
+    good, missing = collect_plan_days(part["plan"] + [copy], day_schema, part["start_date"], PART_DAYS)
+    assert missing == []
+    assert good[4] is part["plan"][3]
+
+
+def test_invalid_copy_replaced_by_later_valid_one(part, day_schema):
+    broken = dict(part["plan"][3], type="nap")
+    days = [broken] + part["plan"]
+    good, missing = collect_plan_days(days, day_schema, part["start_date"], PART_DAYS)
+    assert missing == []
+    assert good[4] is part["plan"][3]
+
+
+def test_misdated_day(part, day_schema):
+    part["plan"][4]["date"] = expected_date(part["start_date"], 6)
+    good, missing = collect_plan_days(part["plan"], day_schema, part["start_date"], PART_DAYS)
+    assert missing == [5]
+    assert 5 not in good
+
+
+def test_workout_day_without_workout(part, day_schema):
+    del part["plan"][0]["workout"]
+    _, missing = collect_plan_days(part["plan"], day_schema, part["start_date"], PART_DAYS)
+    assert missing == [1]
+
+
+def test_schema_violation_inside_day(part, day_schema):
+    part["plan"][1]["workout"]["exercises"][0]["sets"] = "4"
+    _, missing = collect_plan_days(part["plan"], day_schema, part["start_date"], PART_DAYS)
+    assert missing == [2]
+
+
+def test_unexpected_days_dropped(part, day_schema):
+    days = part["plan"] + [dict(part["plan"][0], day=31), {"date": part["start_date"]}, "day 12", None]
+    good, missing = collect_plan_days(days, day_schema, part["start_date"], PART_DAYS)
+    assert missing == []
+    assert sorted(good) == list(PART_DAYS)
+
+
+def test_repair_answer_only_fills_wanted_days(part, day_schema):
+    # a repair answer that also resends a day nobody asked for
+    good, missing = collect_plan_days(part["plan"][2:5], day_schema, part["start_date"], wanted=[3, 5, 9])
+    assert sorted(good) == [3, 5]
+    assert missing == [9]
+
+
+def test_describe_days():
+    assert describe_days("2025-11-18", [2, 14]) == "- day 2: 2025-11-19\n- day 14: 2025-12-01"
+
+
+def test_assemble_plan(part, day_schema):
+    days = {number: dict(part["plan"][(number - 1) % 10], day=number) for number in range(1, 31)}
+    plan = assemble_plan(part, days)
+    assert plan["total_days"] == 30
+    assert plan["notes_from_coach"] == part["notes_from_coach"]
+    assert [day["day"] for day in plan["plan"]] == list(range(1, 31))
+    assert "part_days" not in plan
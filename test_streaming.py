@@ -0,0 +1,168 @@
+import orjson
+import pytest
+
+from sherlock_ai.compact import compact_part, stream_day_expander
+from sherlock_ai.schema import SchemaViolation
+from sherlock_ai.streaming import StreamingPlanParser
+
+
+def dumps(value) -> str:
+    return orjson.dumps(value).decode()
+
+
+def parse(schema: dict, chunks, **kwargs) -> tuple[StreamingPlanParser, list[dict], dict]:
+    parser = StreamingPlanParser(schema, **kwargs)
+    days = []
+    for chunk in chunks:
+        days.extend(parser.feed(chunk))
+    return parser, days, parser.finish()
+
+
+def chunked(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100_000])
+def test_any_chunk_size(part_schema, part, size):
+    _, days, result = parse(part_schema, chunked(dumps(part), size))
+    assert result == part
+    assert days == part["plan"]
+
+
+def test_split_at_every_position(part_schema, part):
+    # escapes, a \u sequence, a multi-byte character and multi-digit numbers around the split
+    part["notes_from_coach"] = 'Say \\"go\\" twice.\n\tRest é — ESCAPED done'
+    part["plan"] = part["plan"][:1] + [dict(part["plan"][5], day=number) for number in range(2, 11)]
+    part["plan"][0]["workout"]["exercises"][0]["sets"] = 12345
+    text = dumps(part).replace("ESCAPED", "\\u0041")
+    part["notes_from_coach"] = part["notes_from_coach"].replace("ESCAPED", "A")
+
+    for position in range(len(text) + 1):
+        _, days, result = parse(part_schema, [text[:position], text[position:]])
+        assert result == part, position
+        assert len(days) == 10, position
+
+
+def test_split_inside_escape(part_schema, part):
+    part["notes_from_coach"] = 'a\\"b'
+    text = dumps(part)
+    split = text.index("\\\\") + 1
+    parser = StreamingPlanParser(part_schema)
+    parser.feed(text[:split])
+    assert "notes_from_coach" not in parser.header
+    parser.feed(text[split:])
+    assert parser.finish()["notes_from_coach"] == 'a\\"b'
+
+
+def test_number_split_across_chunks(part_schema, part):
+    text = dumps(part)
+    split = text.index('"total_days":30') + len('"total_days":3')
+    parser = StreamingPlanParser(part_schema)
+    parser.feed(text[:split])
+    # 3 would violate "const": 30, so the literal must wait for its end
+    assert "total_days" not in parser.header
+    parser.feed(text[split:])
+    assert parser.header["total_days"] == 30
+
+
+def test_day_handed_back_when_it_closes(part_schema, part):
+    text = dumps(part)
+    first_day = dumps(part["plan"][0])
+    end = text.index(first_day) + len(first_day)
+    parser = StreamingPlanParser(part_schema)
+    assert parser.feed(text[:end - 1]) == []
+    assert parser.feed(text[end - 1:end]) == [part["plan"][0]]
+
+
+@pytest.mark.parametrize("before, after", [
+    ("```json\n", "\n```"),
+    ("```\n", "\n```"),
+    ("  \n", "\n"),
+])
+def test_fenced_output(part_schema, part, before, after):
+    text = before + dumps(part) + after
+    _, days, result = parse(part_schema, chunked(text, 5))
+    assert result == part
+    assert len(days) == 10
+
+
+def test_text_before_document(part_schema, part):
+    with pytest.raises(SchemaViolation, match="before the JSON document"):
+        StreamingPlanParser(part_schema).feed("Here is your plan: " + dumps(part))
+
+
+def test_no_document_at_all(part_schema):
+    with pytest.raises(SchemaViolation, match="does not start with a JSON object"):
+        StreamingPlanParser(part_schema).feed("I'm sorry, I can't help with that request today.")
+
+
+def test_text_after_document(part_schema, part):
+    parser = StreamingPlanParser(part_schema)
+    parser.feed(dumps(part) + "\n```\nHope this helps!")
+    with pytest.raises(SchemaViolation, match="after the JSON document"):
+        parser.finish()
+
+
+def test_truncated_document(part_schema, part):
+    text = dumps(part)
+    parser = StreamingPlanParser(part_schema)
+    parser.feed(text[:len(text) // 2])
+    with pytest.raises(SchemaViolation, match="ended before"):
+        parser.finish()
+
+
+def violation_prefix(text: str, marker: str) -> str:
+    """The text up to and including `marker`, i.e. all a model would have sent when the violation shows."""
+    return text[:text.index(marker) + len(marker)]
+
+
+def test_unknown_property_raised_early(part_schema, part):
+    part["plan"][2]["mood"] = "great"
+    text = dumps(part)
+    parser = StreamingPlanParser(part_schema)
+    with pytest.raises(SchemaViolation, match="mood") as error:
+        parser.feed(violation_prefix(text, '"mood"'))
+    assert error.value.path == ("plan", 2)
+    # the days finished before the violation are kept
+    assert parser.days == part["plan"][:2]
+
+
+def test_wrong_type_raised_early(part_schema, part):
+    part["plan"][0]["workout"]["exercises"][1]["sets"] = "4"
+    text = dumps(part)
+    parser = StreamingPlanParser(part_schema)
+    with pytest.raises(SchemaViolation, match="expected integer"):
+        parser.feed(violation_prefix(text, '"sets":"'))
+    assert parser.days == []
+
+
+def test_bad_enum_raised_early(part_schema, part):
+    part["plan"][1]["type"] = "nap"
+    text = dumps(part)
+    with pytest.raises(SchemaViolation):
+        StreamingPlanParser(part_schema).feed(violation_prefix(text, '"nap"'))
+
+
+def test_too_many_days_raised_early(part_schema, part):
+    part["plan"].append(dict(part["plan"][-1], day=11))
+    text = dumps(part)
+    eleventh = text.rindex('{"day":11')
+    parser = StreamingPlanParser(part_schema)
+    with pytest.raises(SchemaViolation):
+        parser.feed(text[:eleventh + 1])
+    assert len(parser.days) == 10
+
+
+def test_compact_days_expanded_as_they_stream(compact_schema, part):
+    text = dumps(compact_part(part))
+    _, days, _ = parse(compact_schema, chunked(text, 3), expand_day=stream_day_expander)
+    assert days == part["plan"]
+
+
+def test_compact_names_after_plan(compact_schema, part):
+    compact = compact_part(part)
+    names = compact.pop("names")
+    plan = compact.pop("plan")
+    text = dumps({**compact, "plan": plan, "names": names})
+    with pytest.raises(SchemaViolation, match="must come before"):
+        StreamingPlanParser(compact_schema, expand_day=stream_day_expander).feed(text)
@@ -0,0 +1,20 @@
+from services.workout_cache import serialize_workout_response
+from services.workout_persistence import workout_program_snapshot
+
+
+def jsonb_order(value):
+    """Objects with their keys in the order Postgres stores JSONB keys in (shortest first)."""
+    if isinstance(value, dict):
+        return {key: jsonb_order(value[key]) for key in sorted(value, key=lambda key: (len(key), key))}
+    if isinstance(value, list):
+        return [jsonb_order(item) for item in value]
+    return value
+
+
+def test_warm_body_matches_body_rebuilt_from_rows(part):
+    part.pop("part_days")
+    warm = serialize_workout_response(workout_program_snapshot(1, 7, part, engine="ai"))
+    stored = workout_program_snapshot(1, 7, part, engine="ai")
+    for day in stored.days:
+        day.workout_details = jsonb_order(day.workout_details)
+    assert serialize_workout_response(stored) == warm
@@ -1,5 +1,4 @@
 from datetime import datetime, timedelta, timezone
-from passlib.context import CryptContext
 import jwt, os
 
 from config.env_vars import load_config
@@ -12,8 +11,6 @@ ALGORITHM = os.getenv("ALGORITHM")
 
 logger = get_logger(__name__, "helpers")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -33,9 +30,6 @@ def get_email_from_token(token: str) -> str | None:
         logger.error(f"Error decoding JWT token: {e}")
         return None
 
-def hash_password(password: str, pwd_context: CryptContext = pwd_context) -> str:
-    return pwd_context.hash(password)
-
 def user_to_dict(user) -> dict:
     """
     Converts a User SQLAlchemy model instance to a dictionary, 
@@ -116,23 +110,62 @@ def workout_program_to_dict(workout_program) -> dict:
     # Sort days by sequence to ensure order
     sorted_days = sorted(workout_program.days, key=lambda x: x.day_sequence) if workout_program.days else []
 
-    plan = []
-    for day in sorted_days:
-        day_dict = {
-            "day": day.day_sequence,
-            "date": day.date.strftime("%Y-%m-%d") if day.date else None,
-            "type": day.workout_day_type.value if day.workout_day_type else None
-        }
-        if day.workout_details:
-            day_dict["workout"] = day.workout_details
-        
-        plan.append(day_dict)
+    plan = [workout_day_to_dict(day) for day in sorted_days]
 
     return {
         "id": workout_program.id,
         "user_id": workout_program.user_id,
         "start_date": workout_program.start_date.strftime("%Y-%m-%d") if workout_program.start_date else None,
         "total_days": workout_program.total_days,
+        "version": workout_program.version,
+        "engine": workout_program.engine,
         "notes_from_coach": workout_program.notes_from_coach,
         "plan": plan
-    }
\ No newline at end of file
+    }
+
+def workout_day_to_dict(day) -> dict:
+    """Converts a WorkoutDay to the day shape of a plan, workout details included."""
+    day_dict = {
+        "day": day.day_sequence,
+        "date": day.date.strftime("%Y-%m-%d") if day.date else None,
+        "type": day.workout_day_type.value if day.workout_day_type else None
+    }
+    if day.workout_details:
+        day_dict["workout"] = day.workout_details
+    return day_dict
+
+def workout_day_summary_to_dict(row) -> dict:
+    """
+    Converts a day summary row (WorkoutService.get_workout_days with
+    details=False) to a dictionary: the day without its exercises.
+    """
+    day_dict = {
+        "day": row.day_sequence,
+        "date": row.date.strftime("%Y-%m-%d") if row.date else None,
+        "type": row.workout_day_type.value if row.workout_day_type else None
+    }
+    if row.focus is not None or row.exercise_count is not None:
+        day_dict["focus"] = row.focus
+        day_dict["estimated_duration"] = row.estimated_duration
+        day_dict["exercise_count"] = row.exercise_count
+    return day_dict
+
+def workout_job_to_dict(job) -> dict:
+    """
+    Converts a WorkoutJob SQLAlchemy model instance to a dictionary.
+    """
+    if not job:
+        return {}
+
+    return {
+        "job_id": job.id,
+        "status": job.status.value if job.status else None,
+        "attempts": job.attempts,
+        "priority": job.priority,
+        "error": job.error,
+        "progress": job.progress,
+        "workout_program_id": job.workout_program_id,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
@@ -0,0 +1,49 @@
+"""
+Helpers for ETag / If-None-Match handling.
+"""
+from datetime import date
+import hashlib
+import json
+from fastapi import Request, Response
+
+# clients must revalidate, but may keep the body and send If-None-Match
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def workout_program_etag(workout_program_id: int, version: int) -> str:
+    """Strong ETag for a program, known without loading its days."""
+    return f'"wp-{workout_program_id}-{version}"'
+
+
+def workout_days_etag(workout_program_id: int, version: int, start: date, end: date, details: bool) -> str:
+    """Strong ETag for a range of a program's days, known without loading them."""
+    return f'"wd-{workout_program_id}-{version}-{start:%Y%m%d}-{end:%Y%m%d}-{"f" if details else "s"}"'
+
+
+def content_etag(content: dict) -> str:
+    """Strong ETag from the response body itself."""
+    body = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str)
+    return f'"{hashlib.sha256(body.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match uses weak comparison, so a W/ prefix on either side is ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == bare for candidate in if_none_match.split(","))
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Conditional requests are only honoured for GET/HEAD."""
+    return request.method in ("GET", "HEAD") and etag_matches(request.headers.get("if-none-match"), etag)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL})
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
@@ -0,0 +1,26 @@
+"""
+Tiny in-process metrics registry.
+
+Components register a function returning a dict of their current numbers;
+GET /metrics returns all of them as one JSON document.
+"""
+from typing import Callable
+
+from config.my_logger import get_logger
+
+logger = get_logger(__name__, "metrics")
+
+metrics_sources: dict[str, Callable[[], dict]] = {}
+
+def register_metrics_source(name: str, collect: Callable[[], dict]) -> None:
+    metrics_sources[name] = collect
+
+def collect_metrics() -> dict:
+    snapshot = {}
+    for name, collect in metrics_sources.items():
+        try:
+            snapshot[name] = collect()
+        except Exception as e:
+            logger.error(f"Error collecting metrics from {name}: {e}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
@@ -0,0 +1,124 @@
+"""
+Password hashing off the event loop.
+
+bcrypt is deliberately slow (~250 ms at the default cost), so hashing and
+verification run on a small dedicated thread pool (bcrypt releases the
+GIL). A cap on pending work turns a login storm into quick 503s instead
+of an ever-growing queue.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+import asyncio, os, time
+
+from config.env_vars import load_config
+from config.my_logger import get_logger
+from utils.metrics import register_metrics_source
+
+load_config()
+logger = get_logger(__name__, "passwords")
+
+# bcrypt cost. hashes made with any other cost are transparently rehashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# threads doing bcrypt work
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# hash/verify calls allowed to wait or run at once before new ones are rejected
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    # any hash outside [min, max] is reported by verify_and_update as needing a rehash
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash/verify calls are already pending."""
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        context: CryptContext = pwd_context,
+        max_workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING
+    ):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.peak_pending = 0
+        self.rejected = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.compute_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many password operations pending")
+
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        submitted = time.perf_counter()
+        timings = {}
+
+        def timed():
+            started = time.perf_counter()
+            timings["wait"] = started - submitted
+            try:
+                return fn(*args)
+            finally:
+                timings["compute"] = time.perf_counter() - started
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, timed)
+        finally:
+            self.pending -= 1
+            self.wait_seconds += timings.get("wait", 0.0)
+            self.compute_seconds += timings.get("compute", 0.0)
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(self.context.hash, password)
+        self.hashed += 1
+        return hashed
+
+    async def verify_and_update(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """
+        Check `password` against `hashed`. The second value is a fresh hash when
+        the stored one was made with a different cost and should be replaced.
+        """
+        valid, new_hash = await self._run(self.context.verify_and_update, password, hashed)
+        self.verified += 1
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        completed = self.hashed + self.verified
+        return {
+            "rounds": BCRYPT_ROUNDS,
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "rejected": self.rejected,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed,
+            "avg_compute_ms": round(self.compute_seconds / completed * 1000, 2) if completed else 0.0,
+            "avg_wait_ms": round(self.wait_seconds / completed * 1000, 2) if completed else 0.0
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# one pool per process
+password_hasher = PasswordHasher()
+register_metrics_source("password_hasher", password_hasher.stats)
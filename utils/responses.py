@@ -0,0 +1,27 @@
+"""
+Response classes used by every router.
+
+JSON is encoded with orjson (several times faster than the stdlib encoder
+on large payloads like a 30-day program). Import JSONResponse from here
+rather than from fastapi.responses.
+"""
+from fastapi.responses import ORJSONResponse, Response
+import orjson
+
+
+class JSONResponse(ORJSONResponse):
+    """Drop-in replacement for fastapi.responses.JSONResponse."""
+
+
+class RawJSONResponse(Response):
+    """Body that is already serialized JSON bytes, sent as-is."""
+    media_type = "application/json"
+
+
+def dump_json(content) -> bytes:
+    """
+    Canonical JSON bytes for a cached body. Keys are sorted because JSONB
+    reorders object keys: a body built from a freshly generated plan and one
+    rebuilt from the stored rows must be byte-identical under the same ETag.
+    """
+    return orjson.dumps(content, option=orjson.OPT_SORT_KEYS)
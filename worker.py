@@ -0,0 +1,82 @@
+"""
+Workout plan generation worker.
+
+Claims queued jobs from fitness.workout_jobs and generates their plans.
+Run as many of these as needed, on any host that can reach the database:
+
+    python worker.py
+
+Once workers are running, set WORKOUT_JOB_INLINE=false on the API
+processes so they only enqueue.
+"""
+import asyncio, os, signal, socket
+
+from config.env_vars import load_config
+from config.my_logger import get_logger
+from db.session_manager import session_manager
+from services.jobs import JobService
+from services.workouts import run_next_job
+from sherlock_ai.model import close_http_client, get_sherlock_ai
+
+load_config()
+logger = get_logger(__name__, "worker")
+
+# jobs generated at the same time by this process (they are I/O bound, so coroutines not threads)
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+# seconds to wait before polling again when the queue is empty
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+# seconds between sweeps for jobs orphaned by a crashed worker
+WORKER_STALE_SWEEP_INTERVAL = float(os.getenv("WORKER_STALE_SWEEP_INTERVAL", "60"))
+
+
+async def wait_or_stop(stop: asyncio.Event, timeout: float):
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def job_loop(worker_id: str, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            claimed = await run_next_job(worker_id)
+        except Exception as e:
+            logger.error(f"WORKER {worker_id}:: error running job: {e}")
+            claimed = False
+        if not claimed:
+            await wait_or_stop(stop, WORKER_POLL_INTERVAL)
+
+
+async def stale_job_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        async with session_manager.async_session() as session:
+            await JobService(session).requeue_stale_jobs()
+        await wait_or_stop(stop, WORKER_STALE_SWEEP_INTERVAL)
+
+
+async def main():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    ai = get_sherlock_ai()
+    template_watcher = asyncio.create_task(ai.registry.watch())
+
+    worker_name = f"worker-{socket.gethostname()}-{os.getpid()}"
+    logger.info(f"WORKER:: {worker_name} starting with concurrency {WORKER_CONCURRENCY}")
+
+    # in-flight jobs are allowed to finish after a stop signal
+    await asyncio.gather(
+        stale_job_loop(stop),
+        *(job_loop(f"{worker_name}-{i}", stop) for i in range(WORKER_CONCURRENCY))
+    )
+
+    template_watcher.cancel()
+    await close_http_client()
+    await session_manager.engine.dispose()
+    logger.info(f"WORKER:: {worker_name} stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())